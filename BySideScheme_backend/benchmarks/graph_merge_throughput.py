@@ -0,0 +1,139 @@
+"""
+图谱写入吞吐基准：对比逐条事务写入与按组 UNWIND 批量写入 (GraphEngine.merge_to_graph)。
+
+用法（先启动 docker-compose.yml 中的 Neo4j）：
+    docker compose up -d
+    python benchmarks/graph_merge_throughput.py --facts 200
+
+每条模拟事实包含 8 个实体、12 条关系，与一次典型抽取结果规模相当。
+基准数据写入独立的 user_id（bench_*），结束后自动清理。
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# GraphEngine 初始化时会创建 LLM 客户端（不发起请求），基准中不需要真实 key
+os.environ.setdefault("SILICONFLOW_API_KEY", "benchmark-placeholder")
+
+from src.core.graph_engine import GraphEngine  # noqa: E402
+from src.core.graph_schema import VALID_RELATION_TYPES  # noqa: E402
+from src.core.neo4j_client import Neo4jClient  # noqa: E402
+
+ENTITY_TYPES = ["Person", "Person", "Person", "Person", "Event", "Project", "Resource", "Organization"]
+
+
+def _make_fact(rng: random.Random, pool_size: int):
+    entities = []
+    for etype in ENTITY_TYPES:
+        entities.append(
+            {
+                "name": f"{etype}_{rng.randrange(pool_size)}",
+                "type": etype,
+                "properties": {"description": "benchmark entity"},
+            }
+        )
+    rel_types = sorted(VALID_RELATION_TYPES)
+    relations = []
+    for _ in range(12):
+        source, target = rng.sample(entities, 2)
+        relations.append(
+            {
+                "source": source["name"],
+                "target": target["name"],
+                "type": rng.choice(rel_types),
+                "properties": {
+                    "weight": round(rng.random(), 2),
+                    "sentiment": rng.choice(["positive", "negative", "neutral"]),
+                    "confidence": round(rng.random(), 2),
+                    "evidence": f"evidence {rng.randrange(10_000)}",
+                },
+            }
+        )
+    return {"entities": entities, "relations": relations}
+
+
+def _legacy_merge(neo4j: Neo4jClient, user_id: str, extracted):
+    """逐实体/逐关系各开一个写事务（批量化之前的写法）。"""
+    now_iso = datetime.now(timezone.utc).isoformat()
+    for entity in extracted["entities"]:
+        props = dict(entity.get("properties", {}), updated_at=now_iso, user_id=user_id, name=entity["name"])
+        neo4j.run_write(
+            f"MERGE (n:{entity['type']} {{user_id: $user_id, name: $name}}) "
+            f"ON CREATE SET n += $props, n.created_at = $now ON MATCH SET n += $props",
+            {"user_id": user_id, "name": entity["name"], "props": props, "now": now_iso},
+        )
+    for rel in extracted["relations"]:
+        props = rel["properties"]
+        neo4j.run_write(
+            f"MATCH (s {{user_id: $user_id, name: $source}}) "
+            f"MATCH (t {{user_id: $user_id, name: $target}}) "
+            f"MERGE (s)-[r:{rel['type']}]->(t) "
+            f"ON CREATE SET r.weight = $weight, r.sentiment = $sentiment, r.confidence = $confidence, "
+            f"r.evidence = [$evidence], r.created_at = $now, r.updated_at = $now "
+            f"ON MATCH SET r.weight = $weight, r.sentiment = $sentiment, r.confidence = $confidence, "
+            f"r.evidence = CASE WHEN $evidence IN r.evidence THEN r.evidence ELSE r.evidence + $evidence END, "
+            f"r.updated_at = $now",
+            {
+                "user_id": user_id,
+                "source": rel["source"],
+                "target": rel["target"],
+                "weight": props["weight"],
+                "sentiment": props["sentiment"],
+                "confidence": props["confidence"],
+                "evidence": props["evidence"],
+                "now": now_iso,
+            },
+        )
+
+
+def _run(label: str, facts, merge_fn, user_id: str):
+    latencies = []
+    started = time.perf_counter()
+    for fact in facts:
+        t0 = time.perf_counter()
+        merge_fn(user_id, fact)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    items = sum(len(f["entities"]) + len(f["relations"]) for f in facts)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<22}{len(facts) / elapsed:>10.1f}{items / elapsed:>12.1f}{p50:>10.1f}{p95:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--facts", type=int, default=200)
+    parser.add_argument("--pool-size", type=int, default=50, help="每类实体的名称池大小，越小越容易命中已有节点")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    neo4j = Neo4jClient()
+    engine = GraphEngine(neo4j)
+    rng = random.Random(args.seed)
+    facts = [_make_fact(rng, args.pool_size) for _ in range(args.facts)]
+
+    legacy_user = f"bench_legacy_{uuid.uuid4().hex[:8]}"
+    batched_user = f"bench_batched_{uuid.uuid4().hex[:8]}"
+
+    print(f"facts={args.facts} (8 entities + 12 relations each)")
+    print(f"{'mode':<22}{'facts/s':>10}{'items/s':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    try:
+        # merge_to_graph 会改写 properties，两种模式各用一份独立副本
+        _run("per-item transactions", copy.deepcopy(facts), lambda u, f: _legacy_merge(neo4j, u, f), legacy_user)
+        _run("batched UNWIND", copy.deepcopy(facts), engine.merge_to_graph, batched_user)
+    finally:
+        for user_id in (legacy_user, batched_user):
+            neo4j.run_write("MATCH (n {user_id: $user_id}) DETACH DELETE n", {"user_id": user_id})
+        neo4j.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+记忆向量库量化基准：对比 float32 与 int8 标量量化（带 rescore）的召回率与延迟。
+
+用法（需要一个独立运行的 Qdrant 服务，本地文件模式不支持索引与量化）：
+    docker run -p 6333:6333 qdrant/qdrant
+    python benchmarks/memory_vector_quantization.py --url http://localhost:6333 --points 1000000
+
+说明：
+- 向量维度默认 1024，与 BAAI/bge-m3 一致
+- 数据模拟多租户共享集合：每个点带 user_id / category / created_ts payload
+- 召回率以同一集合上的精确检索 (exact=True) 结果为基准，统计 recall@k
+- 依赖 numpy（仅基准脚本需要）
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+CATEGORIES = ["narrative", "political", "career_state", "commitment", "conversation"]
+
+
+def _make_vectors(rng: np.random.Generator, count: int, dims: int, centers: np.ndarray) -> np.ndarray:
+    # 围绕若干中心生成带噪声的向量，比纯随机向量更接近真实 embedding 分布
+    idx = rng.integers(0, len(centers), size=count)
+    vectors = centers[idx] + 0.35 * rng.standard_normal((count, dims)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def _create_collection(client: QdrantClient, name: str, dims: int, quantized: bool):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    quantization_config = None
+    if quantized:
+        quantization_config = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    client.create_collection(
+        collection_name=name,
+        vectors_config=models.VectorParams(size=dims, distance=models.Distance.COSINE, on_disk=True),
+        quantization_config=quantization_config,
+    )
+    client.create_payload_index(name, "user_id", models.PayloadSchemaType.KEYWORD)
+    client.create_payload_index(name, "category", models.PayloadSchemaType.KEYWORD)
+    client.create_payload_index(name, "created_ts", models.PayloadSchemaType.INTEGER)
+
+
+def _upload(client: QdrantClient, name: str, args, centers: np.ndarray):
+    rng = np.random.default_rng(args.seed)
+    now = int(time.time())
+    uploaded = 0
+    started = time.perf_counter()
+    while uploaded < args.points:
+        batch = min(args.batch_size, args.points - uploaded)
+        vectors = _make_vectors(rng, batch, args.dims, centers)
+        users = rng.integers(0, args.users, size=batch)
+        cats = rng.integers(0, len(CATEGORIES), size=batch)
+        ages = rng.integers(0, 180 * 86400, size=batch)
+        points = [
+            models.PointStruct(
+                id=str(uuid.uuid4()),
+                vector=vectors[i].tolist(),
+                payload={
+                    "user_id": f"user_{users[i]}",
+                    "category": CATEGORIES[cats[i]],
+                    "created_ts": int(now - ages[i]),
+                },
+            )
+            for i in range(batch)
+        ]
+        client.upsert(collection_name=name, points=points, wait=False)
+        uploaded += batch
+        if uploaded % (args.batch_size * 50) == 0:
+            print(f"  [{name}] uploaded {uploaded}/{args.points}")
+    print(f"  [{name}] upload done in {time.perf_counter() - started:.1f}s")
+
+
+def _wait_indexed(client: QdrantClient, name: str):
+    while True:
+        info = client.get_collection(name)
+        if info.status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(2)
+
+
+def _run_queries(client: QdrantClient, name: str, queries, filters, limit: int, exact: bool, rescore: bool):
+    latencies = []
+    results = []
+    params = models.SearchParams(
+        exact=exact,
+        quantization=models.QuantizationSearchParams(rescore=rescore, oversampling=2.0),
+    )
+    for vector, flt in zip(queries, filters):
+        started = time.perf_counter()
+        hits = client.query_points(
+            collection_name=name,
+            query=vector.tolist(),
+            query_filter=flt,
+            limit=limit,
+            search_params=params,
+        ).points
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([h.id for h in hits])
+    return results, np.array(latencies)
+
+
+def _recall(truth, found) -> float:
+    total = sum(len(t) for t in truth)
+    if not total:
+        return 1.0
+    hit = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hit / total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-upload", action="store_true", help="复用上一次上传的集合")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.url, timeout=120)
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((64, args.dims)).astype(np.float32)
+
+    collections = {"bench_mem_float32": False, "bench_mem_int8": True}
+    if not args.skip_upload:
+        for name, quantized in collections.items():
+            _create_collection(client, name, args.dims, quantized)
+            _upload(client, name, args, centers)
+    for name in collections:
+        _wait_indexed(client, name)
+
+    query_rng = np.random.default_rng(args.seed + 1)
+    queries = _make_vectors(query_rng, args.queries, args.dims, centers)
+    filters = [
+        models.Filter(
+            must=[
+                models.FieldCondition(key="user_id", match=models.MatchValue(value=f"user_{query_rng.integers(0, args.users)}")),
+                models.FieldCondition(key="category", match=models.MatchValue(value=CATEGORIES[query_rng.integers(0, len(CATEGORIES))])),
+            ]
+        )
+        for _ in range(args.queries)
+    ]
+
+    truth, _ = _run_queries(client, "bench_mem_float32", queries, filters, args.limit, exact=True, rescore=False)
+
+    print(f"\npoints={args.points} dims={args.dims} queries={args.queries} limit={args.limit}")
+    print(f"{'mode':<28}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    runs = [
+        ("float32 hnsw", "bench_mem_float32", False),
+        ("int8 hnsw (no rescore)", "bench_mem_int8", False),
+        ("int8 hnsw + rescore", "bench_mem_int8", True),
+    ]
+    for label, name, rescore in runs:
+        found, lat = _run_queries(client, name, queries, filters, args.limit, exact=False, rescore=rescore)
+        print(f"{label:<28}{_recall(truth, found):>10.4f}{np.percentile(lat, 50):>10.2f}{np.percentile(lat, 95):>10.2f}")
+
+    # 粗略估算常驻内存的向量体积
+    float_bytes = args.points * args.dims * 4
+    int8_bytes = args.points * args.dims
+    print(f"\nvector RAM estimate: float32={float_bytes / 2**30:.2f} GiB, int8={int8_bytes / 2**30:.2f} GiB")
+
+
+if __name__ == "__main__":
+    main()
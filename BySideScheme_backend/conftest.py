@@ -0,0 +1,7 @@
+import logging
+
+# test_autogen_config.py 是连接真实 LLM 接口的手动脚本，不作为单元测试收集
+collect_ignore = ["test_autogen_config.py"]
+
+# 先给全局 logger 挂上 NullHandler，src.core.logger 检测到已有 handler 后不再写 logs/app.log
+logging.getLogger("BySideScheme").addHandler(logging.NullHandler())
@@ -4,6 +4,7 @@ from src.core.memory import MemoryManager
 from src.core.decision import DecisionEngine
 from src.core.generator import NarrativeGenerator
 from src.services.advisor import AdvisorService
+from src.services.bulk_import import BulkImportService
 from src.api.schemas import FactInput, SituationUpdate, MemoryQuery
 from src.core.situation import SituationModel, Stakeholder
 from src.core.database import DatabaseManager
@@ -23,7 +24,7 @@ logging.getLogger("autogen.oai.client").addFilter(APIKeyWarningFilter())
 # 加载环境变量
 load_dotenv()
 
-from src.api.routers import simulator, feedback, graph
+from src.api.routers import simulator, feedback, graph, imports
 
 from contextlib import asynccontextmanager
 
@@ -36,6 +37,7 @@ class ServiceContainer:
         self.advisor_service = None
         self.db = None
         self.graph_engine = None
+        self.bulk_import = None
 
     def initialize(self):
         logger.info("Initializing Services...")
@@ -44,15 +46,17 @@ class ServiceContainer:
         self.decision_engine = DecisionEngine()
         self.narrative_generator = NarrativeGenerator()
 
-        # 初始化图谱引擎（可选：如果 Neo4j 未配置则跳过）
+        # 初始化图谱引擎：GRAPH_BACKEND=neo4j（默认）| embedded | auto（Neo4j 不可用时退回进程内存储）
+        # 存储延迟连接：Neo4j 暂不可用时服务照常启动，图谱写入暂存到发件箱，后台重连成功后按顺序回放
+        backend = os.getenv("GRAPH_BACKEND", "neo4j").lower()
         try:
-            from src.core.neo4j_client import Neo4jClient
+            if backend not in ("neo4j", "auto", "embedded"):
+                raise ValueError(f"Unknown GRAPH_BACKEND: {backend}")
             from src.core.graph_engine import GraphEngine
-            neo4j_client = Neo4jClient()
-            self.graph_engine = GraphEngine(neo4j_client)
+            self.graph_engine = GraphEngine(lambda: self._create_graph_store(backend), db=self.db)
             logger.info("GraphEngine initialized successfully.")
         except Exception as e:
-            logger.warning(f"GraphEngine initialization skipped (Neo4j may not be configured): {e}")
+            logger.warning(f"GraphEngine initialization skipped (graph backend '{backend}' unavailable): {e}")
             self.graph_engine = None
 
         self.advisor_service = AdvisorService(
@@ -61,21 +65,45 @@ class ServiceContainer:
             self.narrative_generator,
             graph_engine=self.graph_engine
         )
+        self.bulk_import = BulkImportService(self.db, self.memory_manager, self.graph_engine)
         logger.info("Services Initialized.")
 
+    @staticmethod
+    def _create_graph_store(backend: str):
+        if backend in ("neo4j", "auto"):
+            try:
+                from src.core.neo4j_client import Neo4jClient
+                from src.core.graph_migrations import run_migrations
+                from src.core.graph_store import Neo4jGraphStore
+                neo4j_client = Neo4jClient()
+                try:
+                    run_migrations(neo4j_client)
+                except Exception as e:
+                    logger.error(f"Graph migrations failed (will retry on next startup): {e}", exc_info=True)
+                return Neo4jGraphStore(neo4j_client)
+            except Exception as e:
+                if backend == "neo4j":
+                    raise
+                logger.warning(f"Neo4j unavailable, falling back to embedded graph store: {e}")
+        elif backend != "embedded":
+            raise ValueError(f"Unknown GRAPH_BACKEND: {backend}")
+        from src.core.embedded_graph_store import EmbeddedGraphStore
+        return EmbeddedGraphStore()
+
 container = ServiceContainer()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     container.initialize()
+    # 继续上次退出时未完成的批量导入作业
+    container.bulk_import.resume_pending()
     logger.info("Application startup complete.")
     yield
     # Shutdown
     if container.graph_engine:
         try:
-            from src.core.neo4j_client import Neo4jClient
-            Neo4jClient().close()
+            await container.graph_engine.store.aclose()
         except Exception:
             pass
     logger.info("Application shutdown.")
@@ -101,10 +129,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 响应压缩：安装了 brotli-asgi 时优先 br（不支持时自动回落 gzip），否则使用 gzip
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_SIZE)
+except ImportError:
+    from fastapi.middleware.gzip import GZipMiddleware
+    app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_SIZE)
+
 # 注册子路由
 app.include_router(simulator.router, dependencies=[Depends(require_api_key)])
 app.include_router(feedback.router, dependencies=[Depends(require_api_key)])
 app.include_router(graph.router, dependencies=[Depends(require_api_key)])
+app.include_router(imports.router, dependencies=[Depends(require_api_key)])
 
 def get_advisor_service():
     if not container.advisor_service:
@@ -117,6 +155,20 @@ async def root():
     logger.info("Root endpoint accessed.")
     return {"message": "Welcome to BySideScheme API. Stay safe in the workplace!"}
 
+@app.get("/system/metrics")
+async def get_system_metrics(_: None = Depends(require_api_key)):
+    """
+    运行时指标（缓存命中率等）
+    """
+    metrics = {}
+    if container.memory_manager:
+        metrics["memory_search_cache"] = container.memory_manager.search_cache_stats()
+    if container.graph_engine:
+        metrics["graph_read_cache"] = container.graph_engine.read_cache_stats()
+        metrics["graph_writes"] = container.graph_engine.write_stats()
+        metrics["graph_outbox"] = container.graph_engine.outbox_stats()
+    return metrics
+
 @app.post("/situation/update")
 async def update_situation(input_data: SituationUpdate, _: None = Depends(require_api_key)):
     """
@@ -230,7 +282,7 @@ async def delete_memory(user_id: str, memory_id: str, _: None = Depends(require_
     删除单条记忆
     """
     logger.info(f"Deleting memory {memory_id} for user {user_id}")
-    container.memory_manager.delete_memory(memory_id)
+    container.memory_manager.delete_memory(memory_id, user_id=user_id)
     return {"message": f"Memory {memory_id} deleted"}
 
 @app.delete("/memory/{user_id}")
@@ -1,13 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Any, Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Literal, Optional, Union
 
+from src.core.graph_codec import dumps, encode_compact, iter_json
 from src.core.graph_engine import GraphEngine
+from src.core.graph_store import is_unavailable
 from src.core.neo4j_client import Neo4jClient
 from src.core.logger import logger
 
 router = APIRouter(prefix="/graph", tags=["graph"])
 
+# 紧凑格式下关系数达到该值时改为分块流式输出
+GRAPH_STREAM_MIN_EDGES = int(os.getenv("GRAPH_STREAM_MIN_EDGES", "5000"))
+
 
 # ------------------------------------------------------------------
 # Request / Response schemas
@@ -26,21 +38,55 @@ class GraphNodeResponse(BaseModel):
 
 
 class GraphEdgeResponse(BaseModel):
+    id: Optional[str] = None
     source: str
     target: str
     type: str
     weight: float
     sentiment: str
     confidence: float
-    evidence: List[str]
+    evidence: List[str]  # 最近几条证据
+    evidence_count: int = 0  # 证据总数，完整历史见 /edge/{edge_id}/evidence
 
 
 class GraphDataResponse(BaseModel):
+    version: int = 0
+    nodes: List[GraphNodeResponse]
+    edges: List[GraphEdgeResponse]
+
+
+class EntityNeighborhoodResponse(BaseModel):
     nodes: List[GraphNodeResponse]
     edges: List[GraphEdgeResponse]
+    depth: int
+    truncated: bool = False
+
+
+class GraphAsOfResponse(GraphDataResponse):
+    as_of: str  # 查询时间点（UTC），关系不含 evidence 原文
+
+
+class GraphDeltaResponse(GraphDataResponse):
+    since: int
+    reset: bool
+    removed_nodes: List[str]
+
+
+class EvidenceItem(BaseModel):
+    text: str
+    created_at: str
+
+
+class EdgeEvidenceResponse(BaseModel):
+    edge_id: str
+    total: int
+    offset: int
+    limit: int
+    items: List[EvidenceItem]
 
 
 class GraphChangeResponse(BaseModel):
+    seq: int
     change_type: str
     description: str
     timestamp: str
@@ -48,7 +94,23 @@ class GraphChangeResponse(BaseModel):
 
 class KeyPlayerResponse(BaseModel):
     name: str
-    centrality: int
+    centrality: float  # PageRank 相对值，排名第一的节点为 1
+    pagerank: float = 0.0
+    betweenness: float = 0.0
+    influence: float = 0.0  # 带符号影响力 [-1, 1]：正为被重要人物支持，负为被反对
+    degree: int = 0
+
+
+class GraphClearJobResponse(BaseModel):
+    user_id: str
+    status: str  # clearing / completed / cancelled / failed
+    relations: int  # 已删除的关系数
+    entities: int
+    evidence: int
+    batches: int
+    error: Optional[str] = None
+    started_at: str
+    finished_at: Optional[str] = None
 
 
 class GraphInsightsResponse(BaseModel):
@@ -61,6 +123,11 @@ class GraphInsightsResponse(BaseModel):
 # Helper: 获取 GraphEngine 实例
 # ------------------------------------------------------------------
 
+def _error_status(error: Exception) -> int:
+    """图存储暂时不可达时返回 503（写入会暂存到发件箱，读取可稍后重试），其它错误 500。"""
+    return 503 if is_unavailable(error) else 500
+
+
 def _get_graph_engine() -> GraphEngine:
     """
     从全局 ServiceContainer 获取 GraphEngine。
@@ -72,84 +139,211 @@ def _get_graph_engine() -> GraphEngine:
     return container.graph_engine
 
 
+def _parse_as_of(value: str) -> str:
+    """ISO 8601 时间（不带时区时按 UTC）→ UTC ISO 字符串，与变更日志时间戳格式一致。"""
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid as_of timestamp: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
 # ------------------------------------------------------------------
 # Endpoints
 # ------------------------------------------------------------------
 
-@router.get("/{user_id}", response_model=GraphDataResponse)
-async def get_graph(user_id: str, engine: GraphEngine = Depends(_get_graph_engine)):
+@router.get("/{user_id}", response_model=Union[GraphDeltaResponse, GraphAsOfResponse, GraphDataResponse])
+async def get_graph(
+    user_id: str,
+    request: Request,
+    response: Response,
+    since: Optional[int] = None,
+    as_of: Optional[str] = None,
+    format: Literal["full", "compact"] = "full",
+    engine: GraphEngine = Depends(_get_graph_engine),
+):
     """
-    获取用户完整图谱数据（用于前端可视化）
+    获取用户图谱数据（用于前端可视化）
+    - 响应头 ETag 为图谱版本号，请求带 If-None-Match 且版本未变时返回 304
+    - since: 上次同步的版本号，传入时只返回此后新增/更新/删除的节点与关系
+    - as_of: ISO 8601 时间，返回该时刻的图谱快照（由最近的检查点 + 变更记录回放得到，不含 evidence 原文）
+    - format=compact: 列式紧凑格式（字符串驻留 + 并行数组，不含 evidence 原文），
+      跳过响应模型校验直接编码；关系数超过 GRAPH_STREAM_MIN_EDGES 时分块流式输出
     """
-    logger.info(f"Fetching graph data for user {user_id}")
+    logger.info(f"Fetching graph data for user {user_id} (since={since}, as_of={as_of}, format={format})")
+    suffix = "-compact" if format == "compact" else ""
+    as_of_iso = _parse_as_of(as_of) if as_of else None
     try:
-        data = engine.get_graph_data(user_id)
+        if as_of_iso is not None:
+            data = await run_in_threadpool(engine.get_graph_as_of, user_id, as_of_iso)
+            etag = f'"{data["version"]}@{as_of_iso}{suffix}"'
+        else:
+            etag = f'"{await engine.aget_change_seq(user_id)}{suffix}"'
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+
+            if since is not None:
+                data = await engine.aget_graph_delta(user_id, since)
+            else:
+                data = await engine.aget_graph_data(user_id)
+            etag = f'"{data["version"]}{suffix}"'
+
+        if format == "compact":
+            compact = encode_compact(data)
+            headers = {"ETag": etag}
+            if len(data["edges"]) >= GRAPH_STREAM_MIN_EDGES:
+                return StreamingResponse(iter_json(compact), media_type="application/json", headers=headers)
+            return Response(content=dumps(compact), media_type="application/json", headers=headers)
+
+        response.headers["ETag"] = etag
         return data
     except Exception as e:
         logger.error(f"Error fetching graph for user {user_id}: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+
+
+@router.get("/{user_id}/edge/{edge_id}/evidence", response_model=EdgeEvidenceResponse)
+async def get_edge_evidence(
+    user_id: str,
+    edge_id: str,
+    offset: int = 0,
+    limit: int = 20,
+    engine: GraphEngine = Depends(_get_graph_engine),
+):
+    """
+    按关系 id 分页获取完整证据历史（新的在前）
+    图数据中的关系只带最近几条 evidence 与 evidence_count
+    """
+    try:
+        page = await engine.aget_edge_evidence(user_id, edge_id, offset=offset, limit=limit)
+    except Exception as e:
+        logger.error(f"Error fetching evidence for edge {edge_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail=f"Edge {edge_id} not found")
+    return {"edge_id": edge_id, **page}
 
 
-@router.get("/{user_id}/entity/{entity_name}", response_model=GraphDataResponse)
+@router.get("/{user_id}/entity/{entity_name}", response_model=EntityNeighborhoodResponse)
 async def get_entity_detail(
     user_id: str,
     entity_name: str,
     depth: int = 2,
+    max_nodes: Optional[int] = None,
+    max_edges: Optional[int] = None,
     engine: GraphEngine = Depends(_get_graph_engine),
 ):
     """
     获取指定实体的邻域子图
+    - depth / max_nodes / max_edges 超过服务端上限时按上限处理，被截断时 truncated=true
     """
     logger.info(f"Fetching entity '{entity_name}' neighborhood for user {user_id} (depth={depth})")
     try:
-        data = engine.get_entity_neighborhood(user_id, entity_name, depth=depth)
+        data = await run_in_threadpool(
+            engine.get_entity_neighborhood,
+            user_id,
+            entity_name,
+            depth=depth,
+            max_nodes=max_nodes,
+            max_edges=max_edges,
+        )
         return data
     except Exception as e:
         logger.error(f"Error fetching entity detail: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+
+
+def _extract_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    extracted = result["extracted"]
+    # 图存储暂不可达时抽取结果已暂存到发件箱，恢复后自动写入
+    queued = bool(result["report"] and result["report"].get("queued"))
+    return {
+        "message": f"抽取完成：{len(extracted['entities'])} 个实体，{len(extracted['relations'])} 条关系"
+        + ("（图谱暂不可用，已暂存，恢复后自动写入）" if queued else ""),
+        "extracted": extracted,
+        "chunks": result["chunks"],
+        "elapsed": result["elapsed"],
+        "queued": queued,
+    }
 
 
 @router.post("/{user_id}/extract")
 async def extract_graph(
     user_id: str,
     request: GraphExtractRequest,
+    stream: bool = False,
     engine: GraphEngine = Depends(_get_graph_engine),
 ):
     """
     手动触发实体关系抽取并写入图谱
+    - 长文本按句切成重叠分块并行抽取，合并去重后一次写入
+    - stream=true: 以 SSE 推送进度（progress 事件每块一条），最后推送 result 与 done
     """
     logger.info(f"Manual graph extraction for user {user_id}, text length={len(request.text)}")
-    try:
-        extracted = engine.process_fact(
-            user_id=user_id,
-            fact=request.text,
-            situation_context=request.situation_context or "",
-        )
-        return {
-            "message": f"抽取完成：{len(extracted['entities'])} 个实体，{len(extracted['relations'])} 条关系",
-            "extracted": extracted,
-        }
-    except Exception as e:
-        logger.error(f"Error during graph extraction: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    situation_context = request.situation_context or ""
+
+    if not stream:
+        try:
+            result = await run_in_threadpool(
+                engine.process_document, user_id, request.text, situation_context
+            )
+            return _extract_result(result)
+        except Exception as e:
+            logger.error(f"Error during graph extraction: {e}", exc_info=True)
+            raise HTTPException(status_code=_error_status(e), detail=str(e))
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def on_progress(event: Dict[str, Any]):
+        # 在抽取线程中调用，转交给事件循环
+        loop.call_soon_threadsafe(queue.put_nowait, ("progress", event))
+
+    async def runner():
+        try:
+            result = await run_in_threadpool(
+                engine.process_document, user_id, request.text, situation_context, on_progress
+            )
+            await queue.put(("result", _extract_result(result)))
+        except Exception as e:
+            logger.error(f"Error during graph extraction: {e}", exc_info=True)
+            await queue.put(("error", {"error": str(e)}))
+        await queue.put(("done", {}))
+
+    async def event_gen():
+        task = asyncio.create_task(runner())
+        while True:
+            event, data = await queue.get()
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            if event == "done":
+                break
+        await task
+
+    return StreamingResponse(event_gen(), media_type="text/event-stream")
 
 
 @router.get("/{user_id}/changes", response_model=List[GraphChangeResponse])
 async def get_graph_changes(
     user_id: str,
     hours: int = 24,
+    since_seq: Optional[int] = None,
+    limit: int = 500,
     engine: GraphEngine = Depends(_get_graph_engine),
 ):
     """
-    获取近期图谱变化
+    获取图谱变化
+    - since_seq: 返回序号大于该值的增量变更（轮询时传上次结果最后一条的 seq）
+    - 未传 since_seq 时返回最近 hours 小时内的变更
     """
-    logger.info(f"Fetching graph changes for user {user_id} (last {hours}h)")
+    logger.info(f"Fetching graph changes for user {user_id} (since_seq={since_seq}, last {hours}h)")
     try:
-        changes = engine.detect_changes(user_id, hours=hours)
+        changes = await engine.adetect_changes(user_id, hours=hours, since_seq=since_seq, limit=limit)
         return changes
     except Exception as e:
         logger.error(f"Error fetching graph changes: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
 
 
 @router.get("/{user_id}/insights", response_model=GraphInsightsResponse)
@@ -159,31 +353,74 @@ async def get_graph_insights(
 ):
     """
     获取图谱洞察（关键人物、风险关系、近期变化）
+    关键人物按加权 PageRank 排序，附介数中心性与带符号影响力
     """
     logger.info(f"Fetching graph insights for user {user_id}")
     try:
-        insights = engine.get_centrality_analysis(user_id)
+        insights = await run_in_threadpool(engine.get_centrality_analysis, user_id)
         return insights
     except Exception as e:
         logger.error(f"Error fetching graph insights: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
 
 
-@router.delete("/{user_id}")
+@router.post("/{user_id}/consolidate")
+async def consolidate_entities(
+    user_id: str,
+    dry_run: bool = True,
+    engine: GraphEngine = Depends(_get_graph_engine),
+):
+    """
+    合并重复实体（如“陈总”/“Chen总”/“VP Chen”）：关系与证据改挂到保留的实体，原名称记为别名
+    - dry_run=true（默认）只返回将被合并的分组，确认后传 dry_run=false 执行
+    """
+    logger.info(f"Consolidating duplicate entities for user {user_id} (dry_run={dry_run})")
+    try:
+        return await run_in_threadpool(engine.consolidate_duplicates, user_id, dry_run=dry_run)
+    except Exception as e:
+        logger.error(f"Error consolidating entities: {e}", exc_info=True)
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+
+
+@router.delete("/{user_id}", response_model=GraphClearJobResponse, status_code=202)
 async def clear_graph(
     user_id: str,
     engine: GraphEngine = Depends(_get_graph_engine),
 ):
     """
     清空用户的全部图谱数据
+    后台分批删除，立即返回作业状态（status=clearing），通过 GET /graph/{user_id}/clear 查询进度；
+    清空期间该用户的图谱写入暂存到发件箱，结束后按顺序回放
     """
     logger.info(f"Clearing all graph data for user {user_id}")
     try:
-        engine.clear_graph(user_id)
-        return {"message": f"用户 {user_id} 的图谱数据已清空"}
+        return engine.clear_graph(user_id)
     except Exception as e:
         logger.error(f"Error clearing graph: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
+
+
+@router.get("/{user_id}/clear", response_model=GraphClearJobResponse)
+async def get_clear_status(
+    user_id: str,
+    engine: GraphEngine = Depends(_get_graph_engine),
+):
+    """查询最近一次清空作业的进度"""
+    status = engine.get_clear_status(user_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No clear job for this user")
+    return status
+
+
+@router.post("/{user_id}/clear/cancel", response_model=GraphClearJobResponse)
+async def cancel_clear(
+    user_id: str,
+    engine: GraphEngine = Depends(_get_graph_engine),
+):
+    """中止进行中的清空作业（当前批次完成后停止，已删除的数据不会恢复）"""
+    if not engine.cancel_clear(user_id):
+        raise HTTPException(status_code=409, detail="No clear job in progress")
+    return engine.get_clear_status(user_id)
 
 
 @router.delete("/{user_id}/entity/{entity_name}")
@@ -197,8 +434,8 @@ async def delete_entity(
     """
     logger.info(f"Deleting entity '{entity_name}' for user {user_id}")
     try:
-        engine.delete_entity(user_id, entity_name)
+        await run_in_threadpool(engine.delete_entity, user_id, entity_name)
         return {"message": f"实体 '{entity_name}' 及其关系已删除"}
     except Exception as e:
         logger.error(f"Error deleting entity: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(e), detail=str(e))
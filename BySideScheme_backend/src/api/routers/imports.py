@@ -0,0 +1,125 @@
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel
+from typing import Any, Dict, List, Literal, Optional
+
+from src.services.bulk_import import BulkImportService, parse_jsonl, parse_markdown
+from src.core.logger import logger
+
+router = APIRouter(prefix="/import", tags=["import"])
+
+
+# ------------------------------------------------------------------
+# Response schemas
+# ------------------------------------------------------------------
+
+class ImportErrorItem(BaseModel):
+    seq: int
+    error: Optional[str] = None
+
+
+class ImportJobResponse(BaseModel):
+    job_id: str
+    user_id: str
+    status: str  # pending / running / completed / cancelled / failed
+    source_format: Optional[str] = None
+    total: int
+    completed: int
+    failed: int
+    remaining: int
+    throughput: Optional[float] = None  # 本次运行的处理速度（条/秒）
+    eta_seconds: Optional[float] = None
+    error: Optional[str] = None
+    errors: List[ImportErrorItem] = []
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+
+# ------------------------------------------------------------------
+# Helper
+# ------------------------------------------------------------------
+
+def _get_import_service() -> BulkImportService:
+    from src.api.main import container
+    if not container.bulk_import:
+        raise HTTPException(status_code=500, detail="BulkImportService not initialized")
+    return container.bulk_import
+
+
+def _detect_format(request: Request, raw: str) -> str:
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "jsonl"
+    if "markdown" in content_type:
+        return "markdown"
+    return "jsonl" if raw.lstrip().startswith(("{", '"')) else "markdown"
+
+
+def _job_or_404(service: BulkImportService, job_id: str) -> Dict[str, Any]:
+    job = service.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+# ------------------------------------------------------------------
+# Endpoints
+# ------------------------------------------------------------------
+
+@router.get("/jobs/{job_id}", response_model=ImportJobResponse)
+async def get_import_job(job_id: str, service: BulkImportService = Depends(_get_import_service)):
+    """查询导入进度：已完成 / 失败条数、吞吐量、预计剩余时间"""
+    return _job_or_404(service, job_id)
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=ImportJobResponse)
+async def cancel_import_job(job_id: str, service: BulkImportService = Depends(_get_import_service)):
+    """停止导入（正在处理的条目完成后停止），之后可通过 resume 继续"""
+    _job_or_404(service, job_id)
+    service.cancel(job_id)
+    return service.status(job_id)
+
+
+@router.post("/jobs/{job_id}/resume", response_model=ImportJobResponse)
+async def resume_import_job(job_id: str, service: BulkImportService = Depends(_get_import_service)):
+    """从未完成的条目继续导入（已取消或失败的作业），失败的条目一并重试"""
+    _job_or_404(service, job_id)
+    if not service.start(job_id, retry_failed=True):
+        raise HTTPException(status_code=409, detail="Import job is already running")
+    return service.status(job_id)
+
+
+@router.post("/{user_id}", response_model=ImportJobResponse, status_code=202)
+async def create_import_job(
+    user_id: str,
+    request: Request,
+    format: Optional[Literal["jsonl", "markdown"]] = None,
+    memory: bool = True,
+    graph: bool = True,
+    situation_context: str = "",
+    service: BulkImportService = Depends(_get_import_service),
+):
+    """
+    批量导入历史笔记（请求体为原始文件内容）
+    - format=jsonl: 每行 {"text": "...", "date": "..."}；format=markdown: 按标题或 --- 切分
+    - 未指定 format 时按 Content-Type / 内容推断
+    - memory / graph: 是否写入记忆库 / 抽取到图谱
+    作业在后台运行，通过 GET /import/jobs/{job_id} 查询进度
+    """
+    raw = (await request.body()).decode("utf-8-sig", errors="replace")
+    source_format = format or _detect_format(request, raw)
+    try:
+        items = parse_jsonl(raw) if source_format == "jsonl" else parse_markdown(raw)
+        job_id = service.submit(
+            user_id,
+            items,
+            source_format,
+            memory=memory,
+            graph=graph,
+            situation_context=situation_context,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error creating import job for user {user_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    return service.status(job_id)
@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+
+class VersionedLRUCache:
+    """
+    按 scope 版本号失效的 LRU 缓存（线程安全）。
+    - 每个 scope（如 user_id）有一个单调递增的版本号，写入方调用 bump(scope) 即可让该 scope 下所有缓存项失效
+    - 缓存项记录写入时的版本号，读取时版本不一致视为未命中并惰性淘汰
+    - 读穿缓存的调用方在计算前用 token(scope) 取得 (版本号, epoch)，写入时一并传给 set：
+      计算期间发生过 bump / bump_all 时放弃写入
+    - 版本号取自全局递增的时钟，不同 scope 之间不会重复；已没有缓存项的 scope 的版本号定期清理，
+      清理后回落到 _floor（不小于被清理的版本号），不会与在途的 token 误判为相等
+    - 总条目数有上限，超出后按 LRU 淘汰；max_entries <= 0 表示禁用缓存
+    - 可选的总开销上限 max_weight（每项的开销由 set 的 weight 给出，如图数据的节点 + 关系数），
+      用于限制大对象占用的内存；单项超过上限时不缓存；max_weight <= 0 表示不限制
+    """
+
+    def __init__(self, max_entries: int = 1024, name: str = "cache", max_weight: int = 0):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        # (scope, key) -> (version, epoch, value, weight)
+        self._entries: "OrderedDict[Tuple[Hashable, Hashable], Tuple[int, int, Any, int]]" = OrderedDict()
+        self._weight = 0
+        self._versions: Dict[Hashable, int] = {}
+        self._clock = 0  # 最近一次 bump 分配的版本号
+        self._floor = 0  # 没有记录的 scope 的版本号
+        # 记录的 scope 数超过该值时清理没有缓存项的 scope
+        self._max_scopes = max(2 * max_entries, 1024)
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def version(self, scope: Hashable) -> int:
+        with self._lock:
+            return self._versions.get(scope, self._floor)
+
+    def token(self, scope: Hashable) -> Tuple[int, int]:
+        """计算前读取的 (版本号, epoch)，写入时传给 set 的 version / epoch。"""
+        with self._lock:
+            return self._versions.get(scope, self._floor), self._epoch
+
+    def bump(self, scope: Hashable) -> int:
+        """使 scope 下全部缓存项失效，返回新版本号。"""
+        with self._lock:
+            self._clock += 1
+            self._versions[scope] = self._clock
+            self._invalidations += 1
+            if len(self._versions) > self._max_scopes:
+                self._prune_versions()
+            return self._clock
+
+    def bump_all(self):
+        """无法确定 scope 时使用：让全部缓存项失效。"""
+        with self._lock:
+            self._epoch += 1
+            self._invalidations += 1
+            self._entries.clear()
+            self._weight = 0
+            self._prune_versions()
+
+    def _prune_versions(self):
+        """
+        只保留仍有缓存项的 scope 的版本号（调用方持有锁），其余 scope 回落到 _floor。
+        _floor 取当前时钟：被清理的 scope 若此后没有 bump 过，版本号不变或变大，在途的 token 不会被误判为仍然有效。
+        """
+        live = {scope for scope, _ in self._entries}
+        self._versions = {scope: self._versions.get(scope, self._floor) for scope in live}
+        self._floor = self._clock
+
+    def get(self, scope: Hashable, key: Hashable) -> Tuple[bool, Any]:
+        """返回 (是否命中, 值)。"""
+        if self.max_entries <= 0:
+            return False, None
+        cache_key = (scope, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                version, epoch, value, weight = entry
+                if version == self._versions.get(scope, self._floor) and epoch == self._epoch:
+                    self._entries.move_to_end(cache_key)
+                    self._hits += 1
+                    return True, value
+                del self._entries[cache_key]
+                self._weight -= weight
+            self._misses += 1
+            return False, None
+
+    def set(
+        self, scope: Hashable, key: Hashable, value: Any, version: int = None, weight: int = 1, epoch: int = None
+    ):
+        """
+        写入缓存。version / epoch 为计算该值之前用 token 读取到的值（可选）：
+        若计算期间 scope 已被 bump 或全部缓存已被 bump_all，则放弃写入，避免把旧数据写成新版本。
+        weight 为该项的开销，计入 max_weight 上限。
+        """
+        if self.max_entries <= 0 or (self.max_weight > 0 and weight > self.max_weight):
+            return
+        with self._lock:
+            current = self._versions.get(scope, self._floor)
+            if (version is not None and version != current) or (epoch is not None and epoch != self._epoch):
+                return
+            cache_key = (scope, key)
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self._weight -= previous[3]
+            self._entries[cache_key] = (current, self._epoch, value, weight)
+            self._weight += weight
+            while len(self._entries) > self.max_entries or (self.max_weight > 0 and self._weight > self.max_weight):
+                _, evicted = self._entries.popitem(last=False)
+                self._weight -= evicted[3]
+                self._evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "weight": self._weight,
+                "max_weight": self.max_weight,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "scopes": len(self._versions),
+            }
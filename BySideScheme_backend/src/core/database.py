@@ -66,6 +66,72 @@ class DatabaseManager:
                     CREATE INDEX IF NOT EXISTS idx_user_persona_versions_lookup
                     ON user_persona_versions (user_id, person_name, created_at)
                 """)
+
+                # 图谱实体别名：表面形式 -> 规范实体名
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS entity_aliases (
+                        user_id TEXT NOT NULL,
+                        alias TEXT NOT NULL,
+                        canonical_name TEXT NOT NULL,
+                        entity_type TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, alias)
+                    )
+                """)
+
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_entity_aliases_canonical
+                    ON entity_aliases (user_id, canonical_name)
+                """)
+
+                # 批量导入作业与逐条进度（断点续传）
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS import_jobs (
+                        job_id TEXT PRIMARY KEY,
+                        user_id TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        source_format TEXT,
+                        options TEXT,
+                        total INTEGER NOT NULL,
+                        error TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS import_items (
+                        job_id TEXT NOT NULL,
+                        seq INTEGER NOT NULL,
+                        content TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending', -- pending / done / failed
+                        error TEXT,
+                        updated_at TIMESTAMP,
+                        PRIMARY KEY (job_id, seq)
+                    )
+                """)
+
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_import_items_status
+                    ON import_items (job_id, status, seq)
+                """)
+
+                # 图谱写入发件箱：图存储不可达时暂存的抽取结果，恢复后按 id 顺序回放
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS graph_outbox (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending', -- pending / failed
+                        error TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_graph_outbox_user
+                    ON graph_outbox (status, user_id, id)
+                """)
                 conn.commit()
         except sqlite3.Error as e:
             logger.error(f"Database initialization error: {e}", exc_info=True)
@@ -263,3 +329,325 @@ class DatabaseManager:
         except sqlite3.Error as e:
             logger.error(f"Error getting persona version {persona_id}: {e}", exc_info=True)
             return None
+
+    def save_entity_aliases(self, user_id: str, aliases: list[Dict[str, Any]]):
+        """保存实体别名 [{"alias", "canonical_name", "entity_type"}]，已存在的别名指向新的规范名。"""
+        if not aliases:
+            return
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    """
+                    INSERT OR REPLACE INTO entity_aliases (user_id, alias, canonical_name, entity_type, created_at)
+                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                    """,
+                    [(user_id, a["alias"], a["canonical_name"], a.get("entity_type")) for a in aliases],
+                )
+                conn.commit()
+            logger.debug(f"Saved {len(aliases)} entity aliases for user {user_id}")
+        except sqlite3.Error as e:
+            logger.error(f"Error saving entity aliases for user {user_id}: {e}", exc_info=True)
+
+    def list_entity_aliases(self, user_id: str) -> list[Dict[str, Any]]:
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT alias, canonical_name, entity_type FROM entity_aliases WHERE user_id = ?",
+                    (user_id,),
+                )
+                return [
+                    {"alias": r[0], "canonical_name": r[1], "entity_type": r[2]}
+                    for r in cursor.fetchall()
+                ]
+        except sqlite3.Error as e:
+            logger.error(f"Error listing entity aliases for user {user_id}: {e}", exc_info=True)
+            return []
+
+    def repoint_entity_aliases(self, user_id: str, old_name: str, new_name: str):
+        """实体合并后，把指向 old_name 的别名改为指向 new_name。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "UPDATE entity_aliases SET canonical_name = ? WHERE user_id = ? AND canonical_name = ?",
+                    (new_name, user_id, old_name),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error repointing entity aliases for user {user_id}: {e}", exc_info=True)
+
+    def delete_entity_aliases(self, user_id: str, canonical_name: Optional[str] = None):
+        """删除实体的全部别名；canonical_name 为空时删除该用户的全部别名。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                if canonical_name is None:
+                    cursor.execute("DELETE FROM entity_aliases WHERE user_id = ?", (user_id,))
+                else:
+                    cursor.execute(
+                        "DELETE FROM entity_aliases WHERE user_id = ? AND (canonical_name = ? OR alias = ?)",
+                        (user_id, canonical_name, canonical_name),
+                    )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error deleting entity aliases for user {user_id}: {e}", exc_info=True)
+
+    # --- 批量导入作业 ---
+
+    def create_import_job(
+        self,
+        job_id: str,
+        user_id: str,
+        items: list[str],
+        source_format: str,
+        options: Dict[str, Any],
+    ):
+        """创建导入作业并写入全部条目（同一事务）。"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO import_jobs (job_id, user_id, status, source_format, options, total, created_at, updated_at)
+                VALUES (?, ?, 'pending', ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                """,
+                (job_id, user_id, source_format, json.dumps(options, ensure_ascii=False), len(items)),
+            )
+            cursor.executemany(
+                "INSERT INTO import_items (job_id, seq, content, status) VALUES (?, ?, ?, 'pending')",
+                [(job_id, seq, content) for seq, content in enumerate(items)],
+            )
+            conn.commit()
+
+    def get_import_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """读取作业及按状态统计的条目数。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT job_id, user_id, status, source_format, options, total, error, created_at, updated_at
+                    FROM import_jobs WHERE job_id = ?
+                    """,
+                    (job_id,),
+                )
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                cursor.execute(
+                    "SELECT status, count(*) FROM import_items WHERE job_id = ? GROUP BY status",
+                    (job_id,),
+                )
+                counts = dict(cursor.fetchall())
+                return {
+                    "job_id": row[0],
+                    "user_id": row[1],
+                    "status": row[2],
+                    "source_format": row[3],
+                    "options": json.loads(row[4]) if row[4] else {},
+                    "total": row[5],
+                    "error": row[6],
+                    "created_at": row[7],
+                    "updated_at": row[8],
+                    "completed": counts.get("done", 0),
+                    "failed": counts.get("failed", 0),
+                }
+        except sqlite3.Error as e:
+            logger.error(f"Error getting import job {job_id}: {e}", exc_info=True)
+            return None
+
+    def list_import_jobs(self, user_id: Optional[str] = None, statuses: Optional[list[str]] = None) -> list[str]:
+        """按用户 / 状态筛选作业，返回 job_id 列表（按创建时间升序）。"""
+        clauses, params = [], []
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT job_id FROM import_jobs {where} ORDER BY created_at, job_id", params)
+                return [r[0] for r in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Error listing import jobs: {e}", exc_info=True)
+            return []
+
+    def update_import_job(self, job_id: str, status: str, error: Optional[str] = None):
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "UPDATE import_jobs SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+                    (status, error, job_id),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error updating import job {job_id}: {e}", exc_info=True)
+
+    def list_pending_import_items(self, job_id: str) -> list[tuple]:
+        """尚未完成的条目 [(seq, content)]，按顺序返回。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT seq, content FROM import_items WHERE job_id = ? AND status = 'pending' ORDER BY seq",
+                    (job_id,),
+                )
+                return cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error listing pending items for import job {job_id}: {e}", exc_info=True)
+            return []
+
+    def reset_failed_import_items(self, job_id: str) -> int:
+        """失败的条目重新置为 pending（重试），返回条目数。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE import_items SET status = 'pending', error = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE job_id = ? AND status = 'failed'
+                    """,
+                    (job_id,),
+                )
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Error resetting failed items for import job {job_id}: {e}", exc_info=True)
+            return 0
+
+    def mark_import_item(self, job_id: str, seq: int, status: str, error: Optional[str] = None):
+        """记录单条导入结果（断点）。error 为失败原因，或成功条目的警告。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    UPDATE import_items SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE job_id = ? AND seq = ?
+                    """,
+                    (status, error, job_id, seq),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error marking import item {job_id}#{seq}: {e}", exc_info=True)
+
+    def list_import_errors(self, job_id: str, limit: int = 50, status: str = "failed") -> list[Dict[str, Any]]:
+        """status 为 failed 时返回失败原因，为 done 时返回成功条目记录的警告。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT seq, error FROM import_items
+                    WHERE job_id = ? AND status = ? AND error IS NOT NULL
+                    ORDER BY seq LIMIT ?
+                    """,
+                    (job_id, status, limit),
+                )
+                return [{"seq": r[0], "error": r[1]} for r in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Error listing failures for import job {job_id}: {e}", exc_info=True)
+            return []
+
+    # --- 图谱写入发件箱 ---
+
+    def enqueue_graph_outbox(self, user_id: str, payload: Dict[str, Any]) -> int:
+        """追加一条待写入图谱的抽取结果，返回其 id。失败时抛出异常（调用方据此判断是否已落盘）。"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO graph_outbox (user_id, payload, status, created_at) VALUES (?, ?, 'pending', CURRENT_TIMESTAMP)",
+                (user_id, json.dumps(payload, ensure_ascii=False, default=str)),
+            )
+            conn.commit()
+            return cursor.lastrowid
+
+    def list_graph_outbox_users(self) -> list[str]:
+        """有待回放记录的用户（按最早一条记录的顺序）。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT user_id FROM graph_outbox WHERE status = 'pending' GROUP BY user_id ORDER BY min(id)"
+                )
+                return [r[0] for r in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Error listing graph outbox users: {e}", exc_info=True)
+            return []
+
+    def list_graph_outbox(self, user_id: str, limit: int = 100) -> list[tuple]:
+        """某用户待回放的记录 [(id, payload)]，按写入顺序返回。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT id, payload FROM graph_outbox
+                    WHERE status = 'pending' AND user_id = ?
+                    ORDER BY id LIMIT ?
+                    """,
+                    (user_id, limit),
+                )
+                return [(r[0], json.loads(r[1])) for r in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Error listing graph outbox for user {user_id}: {e}", exc_info=True)
+            return []
+
+    def delete_graph_outbox(self, ids: list[int]):
+        """删除已成功回放的记录。"""
+        if not ids:
+            return
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM graph_outbox WHERE id IN ({', '.join('?' for _ in ids)})", ids)
+            conn.commit()
+
+    def discard_graph_outbox(self, user_id: str, max_id: Optional[int] = None):
+        """丢弃某用户待回放的记录（如图谱已被清空）；给出 max_id 时只丢弃 id 不大于它的记录。"""
+        sql = "DELETE FROM graph_outbox WHERE user_id = ? AND status = 'pending'"
+        params: list[Any] = [user_id]
+        if max_id is not None:
+            sql += " AND id <= ?"
+            params.append(max_id)
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            conn.commit()
+
+    def last_graph_outbox_id(self, user_id: str) -> int:
+        """某用户待回放记录中最大的 id（无记录时为 0）。"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT max(id) FROM graph_outbox WHERE user_id = ? AND status = 'pending'", (user_id,)
+            )
+            return cursor.fetchone()[0] or 0
+
+    def mark_graph_outbox_failed(self, outbox_id: int, error: str):
+        """无法回放的记录（如数据格式错误）置为 failed，保留以便排查，不再阻塞后续记录。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "UPDATE graph_outbox SET status = 'failed', error = ? WHERE id = ?",
+                    (error, outbox_id),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error marking graph outbox record {outbox_id} failed: {e}", exc_info=True)
+
+    def count_graph_outbox(self) -> Dict[str, int]:
+        """按状态统计发件箱记录数。"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT status, count(*) FROM graph_outbox GROUP BY status")
+                return dict(cursor.fetchall())
+        except sqlite3.Error as e:
+            logger.error(f"Error counting graph outbox: {e}", exc_info=True)
+            return {}
@@ -0,0 +1,668 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from src.core.graph_history import RELATION_FIELDS
+from src.core.graph_schema import ENTITY_LABEL
+from src.core.graph_store import CHANGE_FIELDS, ENDPOINT_NOT_FOUND, EVIDENCE_RING_SIZE, RISK_RELATION_TYPES, GraphStore
+from src.core.logger import logger
+
+# (source, rel_type, target)
+EdgeKey = Tuple[str, str, str]
+
+
+class _UserGraph:
+    """单个用户的内存图：节点按名称唯一，关系按 (source, rel_type, target) 唯一。"""
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict[str, Any]] = {}  # name -> {"id", "type", "props"}
+        self.edges: Dict[EdgeKey, Dict[str, Any]] = {}  # key -> {"id", "props"}
+        self.adjacency: Dict[str, Set[EdgeKey]] = {}  # name -> 出边 + 入边
+        self.edge_ids: Dict[int, EdgeKey] = {}
+        self.seq = 0
+
+    def add_edge(self, key: EdgeKey, edge: Dict[str, Any]):
+        self.edges[key] = edge
+        self.edge_ids[edge["id"]] = key
+        self.adjacency.setdefault(key[0], set()).add(key)
+        self.adjacency.setdefault(key[2], set()).add(key)
+
+    def remove_edge(self, key: EdgeKey):
+        edge = self.edges.pop(key, None)
+        if edge is not None:
+            self.edge_ids.pop(edge["id"], None)
+        self.adjacency.get(key[0], set()).discard(key)
+        self.adjacency.get(key[2], set()).discard(key)
+
+    def remove_node(self, name: str) -> Optional[Dict[str, Any]]:
+        node = self.nodes.pop(name, None)
+        if node is None:
+            return None
+        for key in self.adjacency.pop(name, set()):
+            edge = self.edges.pop(key, None)
+            if edge is not None:
+                self.edge_ids.pop(edge["id"], None)
+            other = key[2] if key[0] == name else key[0]
+            self.adjacency.get(other, set()).discard(key)
+        return node
+
+
+class EmbeddedGraphStore(GraphStore):
+    """
+    进程内图谱存储：按用户分区的邻接表，写入同步落盘到 SQLite（默认 data/graph.db）。
+    - 用户首次访问时从 SQLite 整体加载，之后读取全部走内存
+    - 每次写操作在一个 SQLite 事务中提交（节点/关系 upsert + 变更日志）
+    - 与 Neo4j 后端的差异：同一用户下实体名称唯一，类型以最近一次写入为准
+    适用于小规模部署、CI 以及 Neo4j 不可用的场景。
+    """
+
+    backend = "embedded"
+
+    def __init__(self, db_path: str = None):
+        if db_path is None:
+            db_path = os.getenv("GRAPH_EMBEDDED_PATH")
+        if not db_path:
+            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            data_dir = os.path.join(base_dir, "data")
+            os.makedirs(data_dir, exist_ok=True)
+            db_path = os.path.join(data_dir, "graph.db")
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._users: Dict[str, _UserGraph] = {}
+        self._init_db()
+        row = self._conn.execute("SELECT value FROM graph_meta WHERE key = 'next_id'").fetchone()
+        self._next_id = row[0] if row else 1
+        logger.info(f"Embedded graph store initialized at: {self.db_path}")
+
+    def _init_db(self):
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS graph_nodes (
+                    user_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    props TEXT NOT NULL,
+                    PRIMARY KEY (user_id, name)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS graph_edges (
+                    user_id TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    rel_type TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    props TEXT NOT NULL,
+                    PRIMARY KEY (user_id, source, rel_type, target)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS graph_changes (
+                    user_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    record TEXT NOT NULL,
+                    PRIMARY KEY (user_id, seq)
+                )
+            """)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_graph_changes_time
+                ON graph_changes (user_id, timestamp)
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS graph_evidence (
+                    user_id TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    rel_type TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (user_id, source, rel_type, target, text)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS graph_checkpoints (
+                    user_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (user_id, seq)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS graph_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+
+    # ------------------------------------------------------------------
+    # 内部工具（调用方持有 self._lock）
+    # ------------------------------------------------------------------
+
+    def _graph(self, user_id: str) -> _UserGraph:
+        graph = self._users.get(user_id)
+        if graph is not None:
+            return graph
+        graph = _UserGraph()
+        for name, node_id, etype, props in self._conn.execute(
+            "SELECT name, id, type, props FROM graph_nodes WHERE user_id = ?", (user_id,)
+        ):
+            graph.nodes[name] = {"id": node_id, "type": etype, "props": json.loads(props)}
+        for source, rel_type, target, edge_id, props in self._conn.execute(
+            "SELECT source, rel_type, target, id, props FROM graph_edges WHERE user_id = ?", (user_id,)
+        ):
+            graph.add_edge((source, rel_type, target), {"id": edge_id, "props": json.loads(props)})
+        row = self._conn.execute(
+            "SELECT max(seq) FROM graph_changes WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        graph.seq = row[0] or 0
+        self._users[user_id] = graph
+        logger.debug(f"Embedded graph loaded for user {user_id}: {len(graph.nodes)} nodes, {len(graph.edges)} edges")
+        return graph
+
+    def _allocate_id(self) -> int:
+        node_id = self._next_id
+        self._next_id += 1
+        self._conn.execute(
+            "INSERT INTO graph_meta (key, value) VALUES ('next_id', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (self._next_id,),
+        )
+        return node_id
+
+    def _save_node(self, user_id: str, name: str, node: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO graph_nodes (user_id, name, id, type, props) VALUES (?, ?, ?, ?, ?)",
+            (user_id, name, node["id"], node["type"], json.dumps(node["props"], ensure_ascii=False, default=str)),
+        )
+
+    def _save_edge(self, user_id: str, key: EdgeKey, edge: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO graph_edges (user_id, source, rel_type, target, id, props) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, *key, edge["id"], json.dumps(edge["props"], ensure_ascii=False, default=str)),
+        )
+
+    def _append_locked(self, user_id: str, graph: _UserGraph, changes: List[Dict[str, Any]], now_iso: str):
+        for change in changes:
+            graph.seq += 1
+            self._conn.execute(
+                "INSERT INTO graph_changes (user_id, seq, timestamp, record) VALUES (?, ?, ?, ?)",
+                (user_id, graph.seq, now_iso, json.dumps(change, ensure_ascii=False, default=str)),
+            )
+        return graph.seq
+
+    def _commit(self, user_id: str):
+        """提交 SQLite 事务；失败时回滚并丢弃该用户的内存图，下次访问时从磁盘重新加载。"""
+        try:
+            self._conn.commit()
+        except sqlite3.Error:
+            self._rollback(user_id)
+            raise
+
+    def _rollback(self, user_id: str):
+        """
+        写操作中途失败：回滚未提交的语句（否则会随下一次写操作一起提交），
+        并丢弃已被部分修改的内存图。
+        """
+        self._conn.rollback()
+        self._users.pop(user_id, None)
+
+    @staticmethod
+    def _node_out(name: str, node: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": str(node["id"]),
+            "name": name,
+            "type": node["type"],
+            "properties": {k: v for k, v in node["props"].items() if k != "user_id"},
+        }
+
+    @staticmethod
+    def _edge_out(graph: _UserGraph, key: EdgeKey, edge: Dict[str, Any]) -> Dict[str, Any]:
+        props = edge["props"]
+        return {
+            "id": str(edge["id"]),
+            "source": str(graph.nodes[key[0]]["id"]),
+            "target": str(graph.nodes[key[2]]["id"]),
+            "type": key[1],
+            "weight": float(props.get("weight", 0.5)),
+            "sentiment": props.get("sentiment", "neutral"),
+            "confidence": float(props.get("confidence", 0.5)),
+            "evidence": list(props.get("evidence", [])),
+            "evidence_count": props.get("evidence_count", len(props.get("evidence", []))),
+        }
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def merge_entities(self, user_id, etype, rows, now_iso, errors):
+        written: Dict[int, Dict[str, Any]] = {}
+        with self._lock:
+            graph = self._graph(user_id)
+            try:
+                for row in rows:
+                    node = graph.nodes.get(row["name"])
+                    created = node is None
+                    if created:
+                        node = {"id": self._allocate_id(), "type": etype, "props": {"created_at": now_iso}}
+                        graph.nodes[row["name"]] = node
+                    node["type"] = etype
+                    node["props"].update(row["props"])
+                    self._save_node(user_id, row["name"], node)
+                    written[row["idx"]] = {"created": created, "id": str(node["id"])}
+                self._commit(user_id)
+            except Exception as e:
+                logger.error(f"Embedded entity merge failed for user {user_id}: {e}", exc_info=True)
+                self._rollback(user_id)
+                for row in rows:
+                    errors.append({"kind": "entity", "item": row["label"], "error": str(e)})
+                return {}
+        return written
+
+    def merge_relations(self, user_id, rel_type, source_label, target_label, rows, now_iso, errors):
+        written: Dict[int, Dict[str, Any]] = {}
+        with self._lock:
+            graph = self._graph(user_id)
+            try:
+                for row in rows:
+                    source = graph.nodes.get(row["source"])
+                    target = graph.nodes.get(row["target"])
+                    if (
+                        source is None
+                        or target is None
+                        or source_label not in (ENTITY_LABEL, source["type"])
+                        or target_label not in (ENTITY_LABEL, target["type"])
+                    ):
+                        logger.error(f"Error merging relation {row['label']}: {ENDPOINT_NOT_FOUND}")
+                        errors.append({"kind": "relation", "item": row["label"], "error": ENDPOINT_NOT_FOUND})
+                        continue
+                    key = (row["source"], rel_type, row["target"])
+                    edge = graph.edges.get(key)
+                    created = edge is None
+                    if created:
+                        edge = {
+                            "id": self._allocate_id(),
+                            "props": {"created_at": now_iso, "evidence": [], "evidence_count": 0},
+                        }
+                        graph.add_edge(key, edge)
+                    props = edge["props"]
+                    before = None if created else {k: props.get(k) for k in RELATION_FIELDS}
+                    props.update(
+                        weight=row["weight"],
+                        sentiment=row["sentiment"],
+                        confidence=row["confidence"],
+                        updated_at=now_iso,
+                    )
+                    for text in row["evidence"]:
+                        if text and self._conn.execute(
+                            "INSERT OR IGNORE INTO graph_evidence "
+                            "(user_id, source, rel_type, target, text, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                            (user_id, *key, text, now_iso),
+                        ).rowcount:
+                            props["evidence"] = (props["evidence"] + [text])[-EVIDENCE_RING_SIZE:]
+                            props["evidence_count"] = props.get("evidence_count", 0) + 1
+                    self._save_edge(user_id, key, edge)
+                    entry = written.setdefault(row["idx"], {"created": created, "id": str(edge["id"]), "before": before})
+                    entry["created"] = entry["created"] or created
+                self._commit(user_id)
+            except Exception as e:
+                logger.error(f"Embedded relation merge failed for user {user_id}: {e}", exc_info=True)
+                self._rollback(user_id)
+                for row in rows:
+                    errors.append({"kind": "relation", "item": row["label"], "error": str(e)})
+                return {}
+        return written
+
+    def append_changes(self, user_id, changes, now_iso):
+        if not changes:
+            return None
+        with self._lock:
+            graph = self._graph(user_id)
+            try:
+                seq = self._append_locked(user_id, graph, changes, now_iso)
+                self._commit(user_id)
+            except Exception:
+                self._rollback(user_id)
+                raise
+            return seq
+
+    def clear_batch(self, user_id, batch_size=1000):
+        with self._lock:
+            graph = self._graph(user_id)
+            try:
+                edge_keys = list(graph.edges)[:batch_size]
+                for key in edge_keys:
+                    graph.remove_edge(key)
+                self._conn.executemany(
+                    "DELETE FROM graph_edges WHERE user_id = ? AND source = ? AND rel_type = ? AND target = ?",
+                    [(user_id, *key) for key in edge_keys],
+                )
+                names = [name for name in graph.nodes if not graph.adjacency.get(name)][:batch_size]
+                for name in names:
+                    graph.remove_node(name)
+                self._conn.executemany(
+                    "DELETE FROM graph_nodes WHERE user_id = ? AND name = ?", [(user_id, name) for name in names]
+                )
+                evidence = self._conn.execute(
+                    "DELETE FROM graph_evidence WHERE rowid IN "
+                    "(SELECT rowid FROM graph_evidence WHERE user_id = ? LIMIT ?)",
+                    (user_id, batch_size),
+                ).rowcount
+                self._commit(user_id)
+            except Exception:
+                self._rollback(user_id)
+                raise
+            return {"relations": len(edge_keys), "entities": len(names), "evidence": evidence}
+
+    def delete_entity(self, user_id, name, batch_size=1000):
+        with self._lock:
+            graph = self._graph(user_id)
+            keys = list(graph.adjacency.get(name, ()))
+            node = graph.remove_node(name)
+            if node is None:
+                return []
+            try:
+                self._conn.execute("DELETE FROM graph_nodes WHERE user_id = ? AND name = ?", (user_id, name))
+                self._conn.executemany(
+                    "DELETE FROM graph_edges WHERE user_id = ? AND source = ? AND rel_type = ? AND target = ?",
+                    [(user_id, *key) for key in keys],
+                )
+                self._conn.execute(
+                    "DELETE FROM graph_evidence WHERE user_id = ? AND (source = ? OR target = ?)",
+                    (user_id, name, name),
+                )
+                self._commit(user_id)
+            except Exception:
+                self._rollback(user_id)
+                raise
+            return [{"node_id": str(node["id"]), "type": node["type"]}]
+
+    def merge_entity_into(self, user_id, duplicate, canonical, batch_size=500, etype=None):
+        with self._lock:
+            graph = self._graph(user_id)
+            dup = graph.nodes.get(duplicate)
+            canon = graph.nodes.get(canonical)
+            if dup is None or canon is None or duplicate == canonical:
+                return None
+            if etype is not None and (dup["type"] != etype or canon["type"] != etype):
+                return None
+            moved = 0
+            try:
+                for key in list(graph.adjacency.get(duplicate, ())):
+                    edge = graph.edges.pop(key)
+                    graph.edge_ids.pop(edge["id"], None)
+                    graph.adjacency.get(key[0], set()).discard(key)
+                    graph.adjacency.get(key[2], set()).discard(key)
+                    self._conn.execute(
+                        "DELETE FROM graph_edges WHERE user_id = ? AND source = ? AND rel_type = ? AND target = ?",
+                        (user_id, *key),
+                    )
+                    new_key = tuple(canonical if part == duplicate else part for part in key)
+                    # 重复实体与规范实体之间的关系合并后成为自环，直接丢弃
+                    if new_key[0] != new_key[2]:
+                        self._conn.execute(
+                            "UPDATE OR IGNORE graph_evidence SET source = ?, target = ? "
+                            "WHERE user_id = ? AND source = ? AND rel_type = ? AND target = ?",
+                            (new_key[0], new_key[2], user_id, *key),
+                        )
+                        existing = graph.edges.get(new_key)
+                        if existing is None:
+                            graph.add_edge(new_key, edge)
+                            existing = edge
+                        else:
+                            self._merge_edge_props(existing["props"], edge["props"])
+                            existing["props"]["evidence_count"] = self._conn.execute(
+                                "SELECT count(*) FROM graph_evidence "
+                                "WHERE user_id = ? AND source = ? AND rel_type = ? AND target = ?",
+                                (user_id, *new_key),
+                            ).fetchone()[0]
+                        self._save_edge(user_id, new_key, existing)
+                    self._conn.execute(
+                        "DELETE FROM graph_evidence WHERE user_id = ? AND source = ? AND rel_type = ? AND target = ?",
+                        (user_id, *key),
+                    )
+                    moved += 1
+                    if moved % batch_size == 0:
+                        self._commit(user_id)
+
+                for k, v in dup["props"].items():
+                    canon["props"].setdefault(k, v)
+                self._save_node(user_id, canonical, canon)
+                graph.nodes.pop(duplicate, None)
+                graph.adjacency.pop(duplicate, None)
+                self._conn.execute("DELETE FROM graph_nodes WHERE user_id = ? AND name = ?", (user_id, duplicate))
+                self._commit(user_id)
+            except Exception:
+                self._rollback(user_id)
+                raise
+            return {"node_id": str(dup["id"]), "relations": moved}
+
+    @staticmethod
+    def _merge_edge_props(into: Dict[str, Any], other: Dict[str, Any]):
+        """同一关系的两份属性合并：证据环按时间拼接去重，强度/情感/置信度取较新的一份。"""
+        ring = [text for text in into.get("evidence", []) if text not in other.get("evidence", [])]
+        into["evidence"] = (ring + list(other.get("evidence", [])))[-EVIDENCE_RING_SIZE:]
+        if other.get("updated_at", "") > into.get("updated_at", ""):
+            for field in ("weight", "sentiment", "confidence", "updated_at"):
+                if field in other:
+                    into[field] = other[field]
+        if other.get("created_at") and other["created_at"] < into.get("created_at", other["created_at"]):
+            into["created_at"] = other["created_at"]
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def change_seq(self, user_id):
+        with self._lock:
+            return self._graph(user_id).seq
+
+    def read_changes(
+        self,
+        user_id,
+        since_seq=None,
+        until_seq=None,
+        cutoff_iso=None,
+        limit=500,
+        latest_first=False,
+        until_iso=None,
+    ):
+        conditions = ["user_id = ?"]
+        params: List[Any] = [user_id]
+        if since_seq is not None:
+            conditions.append("seq > ?")
+            params.append(since_seq)
+        if until_seq is not None:
+            conditions.append("seq <= ?")
+            params.append(until_seq)
+        if cutoff_iso is not None:
+            conditions.append("timestamp >= ?")
+            params.append(cutoff_iso)
+        if until_iso is not None:
+            conditions.append("timestamp <= ?")
+            params.append(until_iso)
+        sql = (
+            f"SELECT seq, timestamp, record FROM graph_changes WHERE {' AND '.join(conditions)} "
+            f"ORDER BY seq {'DESC' if latest_first else 'ASC'} LIMIT ?"
+        )
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        changes = []
+        for seq, timestamp, record in rows:
+            record = json.loads(record)
+            change = {key: record.get(key) for key in CHANGE_FIELDS}
+            change.update(seq=seq, timestamp=timestamp)
+            changes.append(change)
+        return changes
+
+    def save_checkpoint(self, user_id, seq, timestamp, data):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO graph_checkpoints (user_id, seq, timestamp, data) VALUES (?, ?, ?, ?)",
+                (user_id, seq, timestamp, data),
+            )
+            self._conn.commit()
+
+    def load_checkpoint(self, user_id, as_of_iso=None):
+        sql = "SELECT seq, timestamp, data FROM graph_checkpoints WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if as_of_iso is not None:
+            sql += " AND timestamp <= ?"
+            params.append(as_of_iso)
+        with self._lock:
+            row = self._conn.execute(sql + " ORDER BY seq DESC LIMIT 1", params).fetchone()
+        return {"seq": row[0], "timestamp": row[1], "data": row[2]} if row else None
+
+    def fetch_nodes(self, user_id, names=None):
+        with self._lock:
+            graph = self._graph(user_id)
+            if names is None:
+                return [self._node_out(name, node) for name, node in graph.nodes.items()]
+            return [self._node_out(name, graph.nodes[name]) for name in names if name in graph.nodes]
+
+    def fetch_edges(self, user_id, relations=None):
+        with self._lock:
+            graph = self._graph(user_id)
+            if relations is None:
+                keys = list(graph.edges)
+            else:
+                keys = [(r["source"], r["rel_type"], r["target"]) for r in relations]
+            return [self._edge_out(graph, key, graph.edges[key]) for key in keys if key in graph.edges]
+
+    def edge_evidence(self, user_id, edge_id, offset=0, limit=20):
+        if not edge_id.isdigit():
+            return None
+        with self._lock:
+            graph = self._graph(user_id)
+            key = graph.edge_ids.get(int(edge_id))
+            if key is None:
+                return None
+            where = "user_id = ? AND source = ? AND rel_type = ? AND target = ?"
+            total = self._conn.execute(f"SELECT count(*) FROM graph_evidence WHERE {where}", (user_id, *key)).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT text, created_at FROM graph_evidence WHERE {where} "
+                "ORDER BY created_at DESC, rowid DESC LIMIT ? OFFSET ?",
+                (user_id, *key, limit, offset),
+            ).fetchall()
+        return {"total": total, "items": [{"text": text, "created_at": created_at} for text, created_at in rows]}
+
+    def expand_frontier(self, user_id, frontier, exclude_edges, limit, half_life_days=None):
+        excluded = {int(edge_id) for edge_id in exclude_edges}
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            graph = self._graph(user_id)
+            candidates: Dict[EdgeKey, str] = {}
+            for name in frontier:
+                for key in graph.adjacency.get(name, ()):
+                    if graph.edges[key]["id"] not in excluded and key not in candidates:
+                        candidates[key] = key[2] if key[0] == name else key[0]
+
+            def _strength(key):
+                props = graph.edges[key]["props"]
+                strength = float(props.get("weight", 0.5)) * float(props.get("confidence", 0.5))
+                if half_life_days and props.get("updated_at"):
+                    age_days = (now - datetime.fromisoformat(props["updated_at"])).total_seconds() / 86400
+                    strength *= 0.5 ** (max(age_days, 0.0) / half_life_days)
+                return strength
+
+            ranked = sorted(candidates, key=_strength, reverse=True)[:limit]
+            return [
+                (
+                    self._edge_out(graph, key, graph.edges[key]),
+                    self._node_out(candidates[key], graph.nodes[candidates[key]]),
+                )
+                for key in ranked
+            ]
+
+    def context_rows(self, user_id):
+        with self._lock:
+            graph = self._graph(user_id)
+            person_rels = []
+            for (source, rel_type, target), edge in graph.edges.items():
+                if graph.nodes[source]["type"] != "Person":
+                    continue
+                props = edge["props"]
+                person_rels.append(
+                    {
+                        "source": source,
+                        "rel_type": rel_type,
+                        "weight": props.get("weight"),
+                        "sentiment": props.get("sentiment"),
+                        "target": target,
+                        "target_type": graph.nodes[target]["type"],
+                    }
+                )
+            person_rels.sort(key=lambda r: r["weight"] or 0, reverse=True)
+
+            def _by_type(etype):
+                return [(name, node["props"]) for name, node in graph.nodes.items() if node["type"] == etype]
+
+            persons = [
+                {
+                    "name": name,
+                    "role": props.get("role"),
+                    "influence": props.get("influence_level"),
+                    "style": props.get("style"),
+                }
+                for name, props in sorted(_by_type("Person"))
+            ]
+            events = sorted(_by_type("Event"), key=lambda item: item[1].get("updated_at") or "", reverse=True)
+            projects = sorted(_by_type("Project"), key=lambda item: item[1].get("updated_at") or "", reverse=True)
+            return {
+                "person_rels": person_rels[:30],
+                "persons": persons,
+                "events": [
+                    {"name": name, "description": props.get("description"), "date": props.get("date")}
+                    for name, props in events[:10]
+                ],
+                "projects": [
+                    {"name": name, "status": props.get("status"), "priority": props.get("priority")}
+                    for name, props in projects[:10]
+                ],
+            }
+
+    def entity_index_rows(self, user_id):
+        with self._lock:
+            graph = self._graph(user_id)
+            return [
+                {
+                    "name": name,
+                    "type": node["type"],
+                    "neighbors": list(
+                        {key[2] if key[0] == name else key[0] for key in graph.adjacency.get(name, ())}
+                    ),
+                }
+                for name, node in graph.nodes.items()
+            ]
+
+    def risk_relations(self, user_id):
+        with self._lock:
+            graph = self._graph(user_id)
+            risks = [
+                {
+                    "source": source,
+                    "target": target,
+                    "rel_type": rel_type,
+                    "weight": edge["props"].get("weight"),
+                    "sentiment": edge["props"].get("sentiment"),
+                    "evidence": list(edge["props"].get("evidence", [])),
+                }
+                for (source, rel_type, target), edge in graph.edges.items()
+                if edge["props"].get("sentiment") == "negative" or rel_type in RISK_RELATION_TYPES
+            ]
+        risks.sort(key=lambda r: r["weight"] or 0, reverse=True)
+        return risks
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        logger.info("Embedded graph store closed.")
@@ -0,0 +1,293 @@
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.core.logger import logger
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # requirements.txt 已包含 pypinyin；缺失时中英文形式无法对照（“陈总” / “VP Chen”）
+    lazy_pinyin = None
+    logger.warning("pypinyin is not installed: Chinese/Latin alias matching (e.g. 陈总 / VP Chen) is disabled")
+
+# 英文称谓（独立成词时从名称中分离）："VP Chen" -> ("chen", "总")
+TITLE_TOKENS = {"vp", "svp", "evp", "ceo", "cto", "cfo", "coo", "mr", "mrs", "ms", "miss", "dr", "prof"}
+
+# 中文称谓后缀（长的在前）："陈副总" / "Chen总" -> ("陈", "总") / ("chen", "总")
+TITLE_SUFFIXES = (
+    "董事长", "副总裁", "总经理", "副经理", "副主任", "副局长", "副处长", "副部长",
+    "副总", "总裁", "总监", "经理", "主任", "主管", "局长", "处长", "科长", "部长", "书记",
+    "老师", "先生", "女士", "总", "工",
+)
+
+# 中文称谓前缀：仅在“前缀 + 单字姓”时分离（老张、小王）
+TITLE_PREFIXES = ("老", "小")
+
+# 称谓归一：这些称谓在称呼上等价（“VP Chen”在中文里称“陈总”），其余称谓按原样保留在 key 中，
+# “张工”与“张总”是不同的人
+TITLE_EQUIVALENTS = {
+    "vp": "总", "svp": "总", "evp": "总", "ceo": "总", "cto": "总", "cfo": "总", "coo": "总",
+    "副总": "总", "总裁": "总", "副总裁": "总", "总经理": "总",
+    "mr": "先生", "mrs": "女士", "ms": "女士", "miss": "女士", "dr": "博士", "prof": "教授",
+}
+
+_SPLIT_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+# 模糊匹配（只差一个插入 / 删除的字符）只用于拉丁字母名称且长度不小于该值，短名称和中文名误合并的风险太高
+FUZZY_MIN_LENGTH = 5
+
+
+def _is_cjk(ch: str) -> bool:
+    return "一" <= ch <= "鿿"
+
+
+def _tokens(name: str) -> List[str]:
+    text = unicodedata.normalize("NFKC", name or "").lower()
+    return [t for t in _SPLIT_RE.split(text) if t]
+
+
+def normalize_name(name: str) -> str:
+    """名称规范化：全角转半角、小写、去空白与标点（别名表按此精确比对）。"""
+    return "".join(_tokens(name))
+
+
+def _split_title(name: str) -> Tuple[str, str]:
+    """
+    人物名称拆成 (姓名, 归一后的称谓)。称谓去掉后为空时保留原名（如实体本身就叫“总”）。
+    """
+    tokens = _tokens(name)
+    titles = [t for t in tokens if t in TITLE_TOKENS]
+    if titles and len(titles) < len(tokens):
+        tokens = [t for t in tokens if t not in TITLE_TOKENS]
+    else:
+        titles = []
+    text = "".join(tokens)
+
+    changed = True
+    while changed:
+        changed = False
+        for suffix in TITLE_SUFFIXES:
+            if text.endswith(suffix) and len(text) > len(suffix):
+                text = text[: -len(suffix)]
+                titles.insert(0, suffix)
+                changed = True
+                break
+    if len(text) == 2 and text[0] in TITLE_PREFIXES and _is_cjk(text[1]):
+        titles.insert(0, text[0])
+        text = text[1:]
+    return text, "".join(TITLE_EQUIVALENTS.get(t, t) for t in titles)
+
+
+def alias_key(name: str, etype: Optional[str] = None) -> str:
+    """
+    精确匹配用的 key：规范化后的名称，人物为“姓名|称谓”。“Chen总”与“VP Chen”得到相同的 key，
+    “张工”与“张总”不同。中文字符原样保留，拼音只用于中英文形式之间的对照（见 _pinyin_key）。
+    """
+    if etype != "Person":
+        return normalize_name(name)
+    base, title = _split_title(name)
+    return f"{base}|{title}"
+
+
+def _split_key(key: str) -> Tuple[str, str]:
+    """key -> (名称部分, 称谓部分含分隔符)，非人物 key 的称谓部分为空。"""
+    base, sep, title = key.partition("|")
+    return base, sep + title
+
+
+def _pinyin_key(key: str) -> Optional[str]:
+    """中文名称的 key 转成拼音形式（称谓不转），用于查找对应的拉丁字母名称；未安装 pypinyin 时为 None。"""
+    base, title = _split_key(key)
+    if lazy_pinyin is None or not any(_is_cjk(ch) for ch in base):
+        return None
+    return "".join(lazy_pinyin(base)) + title
+
+
+def _is_latin(key: str) -> bool:
+    return _split_key(key)[0].isascii()
+
+
+def _deletions(key: str) -> Set[str]:
+    """key 本身及删去名称部分任意一个字符后的所有变体（编辑距离 1 的候选检索，称谓部分不变）。"""
+    base, title = _split_key(key)
+    return {base + title} | {base[:i] + base[i + 1:] + title for i in range(len(base))}
+
+
+def _fuzzy_eligible(key: str) -> bool:
+    """名称部分为纯拉丁字母名称（不含中文，不看拼音）且足够长时才做模糊匹配。"""
+    base = _split_key(key)[0]
+    return base.isascii() and len(base) >= FUZZY_MIN_LENGTH
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """
+    名称部分只差一个插入 / 删除的字符（“Jenifer” / “Jennifer”），且不在首字母上。
+    替换一个字符不算：“Jason” / “Mason”、“Maria” / “Marie”、“Project Alpha” / “Project Alpho”
+    往往是不同的人或项目，自动合并后无法撤销。
+    """
+    # 称谓不同（“Smith工” / “Smith总”）是不同的人，只在名称部分比较编辑距离
+    (a, title_a), (b, title_b) = _split_key(a), _split_key(b)
+    if title_a != title_b:
+        return False
+    # 只差一个数字的名称（“Project 1” / “Project 2”）是不同实体
+    if re.sub(r"\D", "", a) != re.sub(r"\D", "", b):
+        return False
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) != 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return i > 0 and a[i:] == b[i + 1:]
+
+
+class _UserAliases:
+    def __init__(self):
+        self.types: Dict[str, str] = {}  # 规范实体名 -> 类型
+        self.keys: Dict[str, str] = {}  # 规范实体名 -> alias_key
+        self.aliases: Dict[str, str] = {}  # 规范化后的别名 -> 规范实体名
+        self.by_key: Dict[str, Set[str]] = {}  # alias_key -> 规范实体名
+        self.by_pinyin: Dict[str, Set[str]] = {}  # 拼音 key -> 规范实体名（仅中文名称）
+        self.fuzzy: Dict[str, Set[str]] = {}  # 删除变体 -> 规范实体名（仅拉丁字母名称）
+
+
+class AliasIndex:
+    """
+    按用户划分的实体别名解析索引，写入图谱前把表面形式映射到已有的规范实体：
+    1. 名称完全一致
+    2. 别名表中记录过的表面形式（规范化后比较）
+    3. 规范化后的 key 一致（人物保留归一后的称谓，“张工”与“张总”不是同一人）
+    4. 中英文形式按拼音对照（“Chen总” <-> “陈总”）；两个中文名只要汉字不同就不合并，
+       “章总”与“张总”、“汪总”与“王总”读音相同也视为不同实体
+    5. 拉丁字母名称只差一个插入 / 删除的字符（删除变体索引检索），替换字符的拼写差异不合并
+    3~5 步只在候选唯一（且类型一致）时采用，有歧义时视为新实体。
+    与 EntityIndex 一样由调用方整体加载，之后增量更新；删除/清空后 invalidate。
+    """
+
+    def __init__(self):
+        self._users: Dict[str, _UserAliases] = {}
+        self._lock = threading.Lock()
+
+    def has_user(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._users
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def load_user(self, user_id: str, entities: Iterable[Dict], aliases: Iterable[Dict]):
+        """entities: [{"name", "type"}]；aliases: [{"alias", "canonical_name"}]"""
+        entry = _UserAliases()
+        for row in entities:
+            if row.get("name"):
+                self._add_entity(entry, row["name"], row.get("type") or "Unknown")
+        for row in aliases:
+            entry.aliases[normalize_name(row["alias"])] = row["canonical_name"]
+        with self._lock:
+            self._users[user_id] = entry
+
+    @staticmethod
+    def _add_entity(entry: _UserAliases, name: str, etype: str):
+        entry.types[name] = etype
+        key = alias_key(name, etype)
+        entry.keys[name] = key
+        entry.by_key.setdefault(key, set()).add(name)
+        pinyin = _pinyin_key(key)
+        if pinyin is not None:
+            entry.by_pinyin.setdefault(pinyin, set()).add(name)
+        if _fuzzy_eligible(key):
+            for variant in _deletions(key):
+                entry.fuzzy.setdefault(variant, set()).add(name)
+
+    def add_entity(self, user_id: str, name: str, etype: str):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and name not in entry.types:
+                self._add_entity(entry, name, etype)
+
+    def add_alias(self, user_id: str, alias: str, canonical_name: str):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                entry.aliases[normalize_name(alias)] = canonical_name
+
+    def resolve(self, user_id: str, name: str, etype: Optional[str] = None) -> Optional[str]:
+        """
+        返回 name 对应的已有规范实体名；etype 给定时只匹配同类型实体。未命中或有歧义时返回 None。
+        etype 为空（关系端点）时人物实体按人物 key 比对，其他实体按普通 key 比对。
+        """
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+
+            def _compatible(candidate: str) -> bool:
+                return candidate in entry.types and (etype is None or entry.types[candidate] == etype)
+
+            if name in entry.types:
+                return name if _compatible(name) else None
+            canonical = entry.aliases.get(normalize_name(name))
+            if canonical is not None and _compatible(canonical):
+                return canonical
+
+            # (key, 候选过滤)：类型未知时分别按人物与非人物规则生成 key，只与对应类型的实体比对
+            if etype is not None:
+                lookups = [(alias_key(name, etype), _compatible)]
+            else:
+                lookups = [
+                    (alias_key(name, "Person"), lambda c: entry.types.get(c) == "Person"),
+                    (alias_key(name), lambda c: c in entry.types and entry.types[c] != "Person"),
+                ]
+
+            exact: Set[str] = set()  # 同一写法（汉字相同或拉丁字母相同）
+            cross: Set[str] = set()  # 中英文对照：拼音相同的另一种文字形式
+            fuzzy: Set[str] = set()  # 拉丁字母名称的拼写差异
+            for key, ok in lookups:
+                exact.update(c for c in entry.by_key.get(key, ()) if ok(c))
+                if not _is_latin(key):
+                    pinyin = _pinyin_key(key)
+                    if pinyin is not None:
+                        cross.update(c for c in entry.by_key.get(pinyin, ()) if ok(c) and _is_latin(entry.keys[c]))
+                    continue
+                cross.update(c for c in entry.by_pinyin.get(key, ()) if ok(c))
+                if _fuzzy_eligible(key):
+                    for variant in _deletions(key):
+                        fuzzy.update(
+                            c for c in entry.fuzzy.get(variant, ()) if ok(c) and _within_one_edit(key, entry.keys[c])
+                        )
+
+            # 按优先级取第一个有候选的步骤，候选不唯一视为歧义
+            for candidates in (exact, cross, fuzzy):
+                if candidates:
+                    return next(iter(candidates)) if len(candidates) == 1 else None
+            return None
+
+    def duplicate_groups(self, user_id: str) -> List[Tuple[str, List[str]]]:
+        """
+        按与 resolve 相同的规则分组，返回包含多个规范实体的组 [(类型, [名称...])]，用于批量合并：
+        同类型且 key 相同的实体为一组；拉丁字母名称的组并入拼音相同的唯一一个中文名称组。
+        读音相同、汉字不同的中文名称不会分到一组。
+        """
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return []
+            groups: Dict[Tuple[str, str], List[str]] = {}
+            for name, key in entry.keys.items():
+                groups.setdefault((entry.types[name], key), []).append(name)
+            for (etype, key) in list(groups):
+                if not _is_latin(key):
+                    continue
+                chinese = {
+                    entry.keys[c]
+                    for c in entry.by_pinyin.get(key, ())
+                    if entry.types[c] == etype
+                }
+                if len(chinese) == 1:
+                    groups[(etype, chinese.pop())] += groups.pop((etype, key))
+            return [(etype, sorted(names)) for (etype, _), names in groups.items() if len(names) > 1]
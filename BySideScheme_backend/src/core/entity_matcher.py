@@ -0,0 +1,190 @@
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class AhoCorasick:
+    """
+    多模式串匹配自动机（大小写不敏感）。
+    纯英文/数字模式要求词边界完整，避免 "Alex" 命中 "Alexander"；中文模式不受此限制。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for pattern in patterns:
+            if pattern:
+                self._insert(pattern)
+        self._build()
+
+    def _insert(self, pattern: str):
+        node = 0
+        for ch in pattern.lower():
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(pattern)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[int, str]]:
+        """返回 [(起始位置, 模式串), ...]，按出现顺序排列。"""
+        if not text:
+            return []
+        lowered = text.lower()
+        node = 0
+        hits = []
+        for i, ch in enumerate(lowered):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for pattern in self._out[node]:
+                start = i - len(pattern) + 1
+                if _is_word_char(pattern[0]) and start > 0 and _is_word_char(lowered[start - 1]):
+                    continue
+                if _is_word_char(pattern[-1]) and i + 1 < len(lowered) and _is_word_char(lowered[i + 1]):
+                    continue
+                hits.append((start, pattern))
+        return hits
+
+
+class _UserEntities:
+    def __init__(self):
+        self.types: Dict[str, str] = {}
+        self.surface: Dict[str, str] = {}  # 匹配用表面形式 -> 实体名（名称本身及别名）
+        self.neighbors: Dict[str, Set[str]] = {}
+        self.automaton: Optional[AhoCorasick] = None
+
+
+class EntityIndex:
+    """
+    按用户划分的进程内实体名称/别名索引，用于抽取前定位事实中提及的已有实体。
+    - 首次使用时由调用方整体加载（load_user），之后随图谱合并增量更新
+    - 删除/清空等无法增量处理的写入调用 invalidate 失效，下次使用时重新加载
+    - 自动机在名称集合变化后惰性重建
+    """
+
+    # 单字名称（如“我”）几乎出现在每段文本中，不参与匹配
+    MIN_PATTERN_LENGTH = 2
+
+    def __init__(self):
+        self._users: Dict[str, _UserEntities] = {}
+        self._lock = threading.Lock()
+
+    def has_user(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._users
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def load_user(self, user_id: str, rows: Iterable[Dict]):
+        """rows: [{"name", "type", "neighbors": [...], "aliases": [...]}]"""
+        entry = _UserEntities()
+        for row in rows:
+            name = row.get("name")
+            if not name:
+                continue
+            entry.types[name] = row.get("type") or "Unknown"
+            entry.surface[name] = name
+            for alias in row.get("aliases") or []:
+                entry.surface.setdefault(alias, name)
+            entry.neighbors.setdefault(name, set()).update(n for n in row.get("neighbors") or [] if n)
+        with self._lock:
+            self._users[user_id] = entry
+
+    def add_entities(self, user_id: str, entities: Iterable[Tuple[str, str]]):
+        """增量加入 (name, type)；用户尚未加载时忽略。"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+            for name, etype in entities:
+                if name not in entry.types:
+                    entry.automaton = None
+                entry.types[name] = etype
+                entry.surface.setdefault(name, name)
+
+    def add_aliases(self, user_id: str, aliases: Iterable[Tuple[str, str]]):
+        """增量加入 (alias, canonical_name)；用户尚未加载时忽略。"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+            for alias, name in aliases:
+                if alias not in entry.surface:
+                    entry.surface[alias] = name
+                    entry.automaton = None
+
+    def add_edges(self, user_id: str, edges: Iterable[Tuple[str, str]]):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+            for source, target in edges:
+                entry.neighbors.setdefault(source, set()).add(target)
+                entry.neighbors.setdefault(target, set()).add(source)
+
+    def entity_count(self, user_id: str) -> int:
+        with self._lock:
+            entry = self._users.get(user_id)
+            return len(entry.types) if entry else 0
+
+    def match(self, user_id: str, text: str) -> List[str]:
+        """返回文本中提及的实体名（按首次出现顺序去重）。"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or not entry.surface:
+                return []
+            if entry.automaton is None:
+                entry.automaton = AhoCorasick(
+                    s for s in entry.surface if len(s) >= self.MIN_PATTERN_LENGTH
+                )
+            automaton, surface = entry.automaton, entry.surface
+
+        seen: Dict[str, None] = {}
+        for _, pattern in automaton.find(text):
+            # 自动机内部按小写匹配，输出保留原始模式串
+            name = surface.get(pattern)
+            if name is not None:
+                seen.setdefault(name, None)
+        return list(seen)
+
+    def expand(self, user_id: str, names: List[str], limit: int = 30) -> List[Tuple[str, str]]:
+        """返回 names 及其 1 跳邻居的 (name, type)，命中实体优先，总数不超过 limit。"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return []
+            result: Dict[str, str] = {}
+            for name in names:
+                if len(result) >= limit:
+                    break
+                result[name] = entry.types.get(name, "Unknown")
+            for name in names:
+                for neighbor in sorted(entry.neighbors.get(name, ())):
+                    if len(result) >= limit:
+                        break
+                    result.setdefault(neighbor, entry.types.get(neighbor, "Unknown"))
+            return list(result.items())
@@ -0,0 +1,103 @@
+import json
+from typing import Any, Dict, Iterator, List
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时退回标准库
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """JSON 编码为 UTF-8 字节串；安装了 orjson 时使用 orjson。"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class _StringTable:
+    """字符串驻留表：重复出现的字符串只传输一次，列中以下标引用。"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def ref(self, value: Any) -> int:
+        value = "" if value is None else str(value)
+        idx = self._index.get(value)
+        if idx is None:
+            idx = len(self.strings)
+            self._index[value] = idx
+            self.strings.append(value)
+        return idx
+
+
+def encode_compact(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把 get_graph_data / get_graph_delta 的结果转换为紧凑列式格式：
+    - strings: 驻留字符串表（节点 id、名称、类型、关系类型、情感）
+    - nodes / edges: 并行数组，字符串列存放 strings 的下标
+    - 关系不携带 evidence 原文，只给出 evidence_count，原文按 edge id 另行获取
+    其余顶层字段（version、since、reset、removed_nodes）原样保留。
+    """
+    table = _StringTable()
+    nodes = data.get("nodes", [])
+    edges = data.get("edges", [])
+
+    compact: Dict[str, Any] = {
+        k: v for k, v in data.items() if k not in ("nodes", "edges")
+    }
+    compact["format"] = "compact"
+    compact["nodes"] = {
+        "id": [table.ref(n["id"]) for n in nodes],
+        "name": [table.ref(n["name"]) for n in nodes],
+        "type": [table.ref(n["type"]) for n in nodes],
+        # name 已在 name 列中，不重复传输
+        "properties": [
+            {k: v for k, v in n.get("properties", {}).items() if k != "name"} for n in nodes
+        ],
+    }
+    compact["edges"] = {
+        "id": [e.get("id", "") for e in edges],
+        "source": [table.ref(e["source"]) for e in edges],
+        "target": [table.ref(e["target"]) for e in edges],
+        "type": [table.ref(e["type"]) for e in edges],
+        "weight": [e["weight"] for e in edges],
+        "sentiment": [table.ref(e["sentiment"]) for e in edges],
+        "confidence": [e["confidence"] for e in edges],
+        "evidence_count": [e.get("evidence_count", len(e.get("evidence") or [])) for e in edges],
+    }
+    compact["strings"] = table.strings
+    return compact
+
+
+def iter_json(obj: Any, chunk_items: int = 2000, buffer_bytes: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    分块编码 JSON，用于 StreamingResponse：
+    长数组每 chunk_items 个元素编码一次，输出按 buffer_bytes 聚合后再交给传输层，
+    避免一次性生成整个响应体。
+    """
+    buffer = bytearray()
+    for piece in _iter_pieces(obj, chunk_items):
+        buffer += piece
+        if len(buffer) >= buffer_bytes:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _iter_pieces(obj: Any, chunk_items: int) -> Iterator[bytes]:
+    if isinstance(obj, dict):
+        yield b"{"
+        for i, (key, value) in enumerate(obj.items()):
+            yield (b"," if i else b"") + dumps(str(key)) + b":"
+            yield from _iter_pieces(value, chunk_items)
+        yield b"}"
+    elif isinstance(obj, list) and len(obj) > chunk_items:
+        yield b"["
+        for start in range(0, len(obj), chunk_items):
+            # 去掉每块自身的方括号后拼接
+            yield (b"," if start else b"") + dumps(obj[start:start + chunk_items])[1:-1]
+        yield b"]"
+    else:
+        yield dumps(obj)
@@ -1,63 +1,203 @@
+import asyncio
 import json
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
-
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from src.core.cache import VersionedLRUCache
+from src.core.database import DatabaseManager
+from src.core.entity_aliases import AliasIndex
+from src.core.entity_matcher import EntityIndex
+from src.core.graph_history import GraphState, relation_delta
+from src.core.graph_metrics import CentralityCalculator, GraphSnapshot
+from src.core.graph_schema import ENTITY_LABEL, VALID_NODE_TYPES, VALID_RELATION_TYPES
+from src.core.graph_store import GraphStore, GraphUnavailableError, Neo4jGraphStore, is_unavailable
 from src.core.llm_client import LLMClientFactory
 from src.core.logger import logger
 from src.core.neo4j_client import Neo4jClient
 from src.core.prompt_loader import PromptLoader
-
-# ------------------------------------------------------------------
-# 常量
-# ------------------------------------------------------------------
-
-VALID_NODE_TYPES = {"Person", "Event", "Project", "Resource", "Organization"}
-
-VALID_RELATION_TYPES = {
-    # Person ↔ Person
-    "REPORTS_TO",
-    "ALLIES_WITH",
-    "COMPETES_WITH",
-    "TRUSTS",
-    "DISTRUSTS",
-    "INFLUENCES",
-    # Person → Event
-    "PARTICIPATED_IN",
-    "INITIATED",
-    "OPPOSED",
-    # Person → Project
-    "OWNS",
-    "WORKS_ON",
-    "SUPPORTS",
-    "BLOCKS",
-    # Person → Resource
-    "CONTROLS",
-    "COMPETES_FOR",
-    # Person → Organization
-    "BELONGS_TO",
-    "LEADS",
-}
+from src.core.text_chunker import chunk_text
+from src.core.write_queue import KeyedWriteQueue
 
 
 class GraphEngine:
     """
     图谱引擎：
     - 调用 LLM 从事实文本中抽取实体与关系
-    - 通过 Neo4j 的 MERGE 语义增量合并到图
+    - 通过存储后端（GraphStore）增量合并到图
     - 提供图谱上下文生成、子图查询、变化检测等能力
     """
 
-    def __init__(self, neo4j_client: Neo4jClient):
-        self.neo4j = neo4j_client
+    def __init__(
+        self,
+        store: Union[GraphStore, Neo4jClient, Callable[[], GraphStore]],
+        db: Optional[DatabaseManager] = None,
+    ):
+        # 兼容旧用法：直接传入 Neo4jClient 时使用 Neo4j 后端；
+        # 传入无参工厂函数时延迟连接：后端暂不可用时照常启动，写入暂存到发件箱，由后台重连线程恢复
+        self._store: Optional[GraphStore] = None
+        self._store_factory: Optional[Callable[[], GraphStore]] = None
+        if isinstance(store, Neo4jClient):
+            self._store = Neo4jGraphStore(store)
+        elif isinstance(store, GraphStore):
+            self._store = store
+        else:
+            self._store_factory = store
+        self._store_lock = threading.Lock()
+        # 实体别名表存放在应用 SQLite 库中
+        self.db = db or DatabaseManager()
         self.client, self.model = LLMClientFactory.create_client("GRAPH_ENGINE")
-        logger.info(f"GraphEngine initialized with model: {self.model}")
+        # 进程内实体名称索引：抽取前定位事实中提及的已有实体
+        self._entity_index = EntityIndex()
+        # 进程内别名解析索引：写入前把“陈总”“Chen总”等表面形式映射到已有的规范实体
+        self._alias_index = AliasIndex()
+        # 长文本抽取：分块大小 / 相邻块重叠字符数 / 并发调用 LLM 的块数
+        self.extract_chunk_chars = int(os.getenv("GRAPH_EXTRACT_CHUNK_CHARS", "2000"))
+        self.extract_chunk_overlap = int(os.getenv("GRAPH_EXTRACT_CHUNK_OVERLAP", "200"))
+        self.extract_concurrency = int(os.getenv("GRAPH_EXTRACT_CONCURRENCY", "4"))
+        # 批量合并重复实体时每个事务最多改挂的关系数
+        self.consolidate_batch_size = int(os.getenv("GRAPH_CONSOLIDATE_BATCH_SIZE", "500"))
+        # 清空图谱 / 删除实体时每个事务最多删除的关系（实体、证据记录）数
+        self.clear_batch_size = int(os.getenv("GRAPH_CLEAR_BATCH_SIZE", "1000"))
+        # 后台清空作业：user_id -> 最近一次作业的状态（见 clear_graph）
+        self._clear_jobs: Dict[str, Dict[str, Any]] = {}
+        self._clear_lock = threading.Lock()
+        # 同一用户的图谱写入串行化：写入期间到达的抽取结果排队，随后合并为一批写入；
+        # 删除实体、合并重复实体、清空批次也经同一队列执行，不与合并写入并发
+        self._write_queue = KeyedWriteQueue(
+            self._apply_writes,
+            max_batch=int(os.getenv("GRAPH_WRITE_MAX_COALESCE", "16")),
+            name="graph_write",
+        )
+        self._write_lock = threading.Lock()
+        self._lost_writes = 0  # 重试后仍写入失败的实体 / 关系条目数
+        # 读缓存：按用户图谱版本号失效，所有写操作都会 bump 版本；
+        # 除条目数外还限制缓存的图数据总规模（节点 + 关系数）
+        self._read_cache = VersionedLRUCache(
+            max_entries=int(os.getenv("GRAPH_READ_CACHE_SIZE", "1024")),
+            name="graph_read",
+            max_weight=int(os.getenv("GRAPH_READ_CACHE_MAX_ITEMS", "200000")),
+        )
+        # 增量同步时最多回放的变更条数，超出后直接返回完整图数据
+        self.delta_max_changes = int(os.getenv("GRAPH_DELTA_MAX_CHANGES", "2000"))
+        # 时间点查询：每累计 N 条变更物化一次检查点，查询时最多回放约 N 条
+        self.checkpoint_interval = int(os.getenv("GRAPH_CHECKPOINT_INTERVAL", "500"))
+        self._checkpoint_seqs: Dict[str, int] = {}  # user_id -> 最近一个检查点的序号
+        # 邻域查询上限：防止单个请求在稠密图上展开过大的子图
+        self.neighborhood_max_depth = int(os.getenv("GRAPH_NEIGHBORHOOD_MAX_DEPTH", "3"))
+        self.neighborhood_max_nodes = int(os.getenv("GRAPH_NEIGHBORHOOD_MAX_NODES", "200"))
+        self.neighborhood_max_edges = int(os.getenv("GRAPH_NEIGHBORHOOD_MAX_EDGES", "500"))
+        # Prompt 图谱上下文：以事实中提及的实体为起点扩展的跳数 / 节点数 / 关系数，
+        # 以及关系按更新时间衰减的半衰期（天）
+        self.context_depth = int(os.getenv("GRAPH_CONTEXT_DEPTH", "2"))
+        self.context_max_nodes = int(os.getenv("GRAPH_CONTEXT_MAX_NODES", "40"))
+        self.context_max_edges = int(os.getenv("GRAPH_CONTEXT_MAX_EDGES", "60"))
+        self.context_half_life_days = float(os.getenv("GRAPH_CONTEXT_HALF_LIFE_DAYS", "30"))
+        # 中心性计算：保留每个用户最近一次结果，小幅变更后增量重算
+        self._centrality = CentralityCalculator(
+            damping=float(os.getenv("GRAPH_PAGERANK_DAMPING", "0.85")),
+            betweenness_samples=int(os.getenv("GRAPH_BETWEENNESS_SAMPLES", "256")),
+            incremental_max_changes=int(os.getenv("GRAPH_METRICS_INCREMENTAL_MAX_CHANGES", "50")),
+        )
+        # 图存储不可达时的写入发件箱（SQLite）与后台重连：退避初始 / 最大秒数，每次回放的记录数
+        self.reconnect_backoff = float(os.getenv("GRAPH_RECONNECT_BACKOFF", "1"))
+        self.reconnect_max_backoff = float(os.getenv("GRAPH_RECONNECT_MAX_BACKOFF", "60"))
+        self.outbox_batch_size = int(os.getenv("GRAPH_OUTBOX_BATCH_SIZE", "100"))
+        self._outbox_lock = threading.Lock()
+        self._outbox_users = set(self.db.list_graph_outbox_users())  # 有待回放记录的用户
+        self._outbox_queued = 0
+        self._outbox_replayed = 0
+        self._reconnector: Optional[threading.Thread] = None
+        self._outbox_wakeup = threading.Event()  # 清空结束等情况下提前结束重连线程的退避等待
+
+        if self._store_factory is not None:
+            self._connect()
+        if self._store is None or self._outbox_users:
+            self._ensure_reconnector()
+        logger.info(
+            f"GraphEngine initialized with model: {self.model}, "
+            f"backend: {self._store.backend if self._store is not None else 'unavailable'}"
+        )
+
+    @property
+    def store(self) -> GraphStore:
+        """图存储后端。延迟连接模式下尚未连上时抛出 GraphUnavailableError（由后台重连线程恢复）。"""
+        store = self._store
+        if store is None:
+            raise GraphUnavailableError("graph store is not connected")
+        return store
+
+    def _connect(self) -> bool:
+        """调用工厂函数连接图存储，返回是否已连接。"""
+        with self._store_lock:
+            if self._store is not None:
+                return True
+            try:
+                self._store = self._store_factory()
+            except Exception as e:
+                logger.warning(f"Graph store unavailable: {e}")
+                return False
+        logger.info(f"Graph store connected: {self._store.backend}")
+        return True
+
+    def graph_version(self, user_id: str) -> int:
+        """进程内的用户图谱版本号，每次写入后递增。"""
+        return self._read_cache.version(user_id)
+
+    def read_cache_stats(self) -> Dict[str, Any]:
+        """读缓存的命中/未命中等指标。"""
+        return self._read_cache.stats()
+
+    def _mark_graph_changed(self, user_id: str):
+        """图谱写入后调用：递增版本号，使该用户的读缓存失效。"""
+        self._read_cache.bump(user_id)
+
+    def _cached(self, user_id: str, key: tuple, compute: Callable[[], Any], weight: Callable[[Any], int] = None):
+        """
+        读穿缓存：按 (user_id, key) 查找，未命中时调用 compute 计算并写入。
+        版本号和 epoch 在计算之前读取，计算期间发生写入或全局失效时结果不会写入缓存。
+        weight 给出结果的开销（计入 GRAPH_READ_CACHE_MAX_ITEMS），默认为 1。
+        """
+        version, epoch = self._read_cache.token(user_id)
+        hit, cached = self._read_cache.get(user_id, key)
+        if hit:
+            return cached
+        value = compute()
+        self._read_cache.set(
+            user_id, key, value, version=version, epoch=epoch, weight=weight(value) if weight else 1
+        )
+        return value
+
+    async def _acached(
+        self, user_id: str, key: tuple, compute: Callable[[], Awaitable[Any]], weight: Callable[[Any], int] = None
+    ):
+        """_cached 的异步版本：compute 返回协程。"""
+        version, epoch = self._read_cache.token(user_id)
+        hit, cached = self._read_cache.get(user_id, key)
+        if hit:
+            return cached
+        value = await compute()
+        self._read_cache.set(
+            user_id, key, value, version=version, epoch=epoch, weight=weight(value) if weight else 1
+        )
+        return value
+
+    @staticmethod
+    def _graph_weight(data: Dict[str, Any]) -> int:
+        return max(1, len(data.get("nodes", [])) + len(data.get("edges", [])))
 
     # ==================================================================
     # 1. LLM 实体关系抽取
     # ==================================================================
 
     def extract_entities_relations(
-        self, text: str, situation_context: str = "", graph_summary: str = ""
+        self, text: str, situation_context: str = "", graph_summary: str = "", strict: bool = False
     ) -> Dict[str, Any]:
         """
         调用 LLM 从文本中抽取实体和关系，返回结构化 JSON：
@@ -65,6 +205,7 @@ class GraphEngine:
             "entities": [ { "name": ..., "type": ..., "properties": {...} } ],
             "relations": [ { "source": ..., "target": ..., "type": ..., "properties": {...} } ]
         }
+        LLM 调用或解析失败时默认返回空结果；strict=True 时抛出异常（批量导入据此把条目记为失败以便重试）。
         """
         try:
             prompt_data = PromptLoader.load_prompt("graph", "extract")
@@ -109,100 +250,433 @@ class GraphEngine:
 
         except Exception as e:
             logger.error(f"Error in extract_entities_relations: {e}", exc_info=True)
+            if strict:
+                raise
             return {"entities": [], "relations": []}
 
     # ==================================================================
     # 2. 图谱合并写入
     # ==================================================================
 
-    def merge_to_graph(self, user_id: str, extracted_data: Dict[str, Any]):
+    def merge_to_graph(self, user_id: str, extracted_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        使用 Cypher MERGE 将抽取结果合并入 Neo4j。
+        将抽取结果合并入图谱存储。
         - 新实体 → 创建
         - 已有实体 → 更新 properties / updated_at
-        - 关系 → MERGE 并更新 weight、evidence 等
+        - 关系 → MERGE 并更新 weight 等，新证据写入证据记录
+        写入前先做别名解析：实体名与关系端点映射到已有的规范实体，新出现的表面形式记入别名表。
+        实体按类型、关系按 (类型, 端点类型) 分组，每组交给存储后端批量写入；
+        失败条目逐条记录在报告中。
+        成功写入的条目按新增/更新追加到用户的变更日志：实体记录写入的属性，关系只记录取值变化的
+        weight / sentiment / confidence（增量），供时间点查询回放。
+        同一用户的并发调用经写入队列串行化，排队期间的多份抽取结果按到达顺序合并为一批写入，
+        避免并发 MERGE 同一批节点 / 关系时的锁冲突；存储后端对瞬时错误（死锁等）退避重试。
+        图存储不可达或该用户的图谱正在清空时，抽取结果写入 SQLite 发件箱，报告中 queued=True，
+        恢复连接 / 清空结束后按顺序回放。
+        返回合并报告：{"entities": 成功数, "relations": 成功数, "errors": [逐条错误],
+        "aliases": [{"alias", "canonical_name"}]}
+        """
+        if self.is_clearing(user_id):
+            # 清空过程中直接写入会被随后的批次删除：暂存到发件箱，清空结束后回放
+            logger.info(f"Graph for user {user_id} is being cleared, queueing extraction in outbox")
+            return self._enqueue_outbox(user_id, extracted_data)
+        if self._store is None:
+            # 延迟连接模式下尚未连上：直接暂存，不进入写入队列跑一遍注定失败的批次
+            logger.warning(f"Graph store not connected, queueing extraction for user {user_id} in outbox")
+            return self._enqueue_outbox(user_id, extracted_data)
+        with self._outbox_lock:
+            behind_outbox = user_id in self._outbox_users
+        if behind_outbox:
+            # 发件箱中还有该用户未回放的写入：排在其后，保持写入顺序
+            return self._enqueue_outbox(user_id, extracted_data)
+        try:
+            return self._write_queue.submit(user_id, extracted_data)
+        except Exception as e:
+            if not is_unavailable(e):
+                raise
+            logger.warning(f"Graph store unavailable, queueing extraction for user {user_id} in outbox: {e}")
+            return self._enqueue_outbox(user_id, extracted_data)
+
+    def _apply_writes(self, user_id: str, items: List[Any]) -> List[Any]:
+        """
+        写入队列的批处理函数：连续的抽取结果交给 _merge_batch 合并写入；
+        其它写操作以无参函数提交，按到达顺序单独执行。返回与 items 一一对应的结果（失败时为异常实例）。
+        """
+        results: List[Any] = []
+        merges: List[Dict[str, Any]] = []
+
+        def _flush():
+            if not merges:
+                return
+            try:
+                results.extend(self._merge_batch(user_id, merges))
+            except Exception as e:
+                results.extend([e] * len(merges))
+            merges.clear()
+
+        # 整轮批处理复用同一个后端会话（Neo4j 下省去每次写入新开会话）
+        store = self._store
+        with store.session_scope() if store is not None else nullcontext():
+            for item in items:
+                if not callable(item):
+                    merges.append(item)
+                    continue
+                _flush()
+                try:
+                    results.append(item())
+                except Exception as e:
+                    results.append(e)
+            _flush()
+        return results
+
+    def _merge_batch(self, user_id: str, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        写入队列的批处理函数：把 batch 中的多份抽取结果按顺序拼接后一次写入，
+        返回与 batch 一一对应的合并报告（成功数按条目归属统计，错误按条目标签归属）。
         """
         now_iso = datetime.now(timezone.utc).isoformat()
-        entities = extracted_data.get("entities", [])
-        relations = extracted_data.get("relations", [])
+        entities: List[Dict[str, Any]] = []
+        relations: List[Dict[str, Any]] = []
+        aliases: List[Dict[str, Any]] = []
+        entity_owner: List[int] = []  # 拼接后每个实体 / 关系来自 batch 中的第几份
+        relation_owner: List[int] = []
+        reports: List[Any] = []
+        for k, extracted_data in enumerate(batch):
+            try:
+                resolved_entities, resolved_relations, resolved_aliases = self._resolve_aliases(
+                    user_id, extracted_data.get("entities", []), extracted_data.get("relations", [])
+                )
+            except Exception as e:
+                # 格式错误的抽取结果只让其调用方失败，不影响同批其它结果
+                reports.append(e)
+                continue
+            entities += resolved_entities
+            relations += resolved_relations
+            aliases += resolved_aliases
+            entity_owner += [k] * len(resolved_entities)
+            relation_owner += [k] * len(resolved_relations)
+            reports.append(
+                {
+                    "entities": 0,
+                    "relations": 0,
+                    "errors": [],
+                    "aliases": [{"alias": a["alias"], "canonical_name": a["canonical_name"]} for a in resolved_aliases],
+                }
+            )
+        errors: List[Dict[str, Any]] = []
+        label_owners: Dict[str, set] = {}
+        changes: List[Dict[str, Any]] = []
 
-        # --- Merge nodes ---
-        for entity in entities:
+        # --- Merge nodes (grouped by label) ---
+        entity_groups: Dict[str, List[Dict[str, Any]]] = {}
+        for idx, entity in enumerate(entities):
             etype = entity["type"]
             name = entity["name"].strip()
-            props = entity.get("properties", {})
+            props = dict(entity.get("properties") or {})
             # 构建 SET 子句：将 properties 展平到节点属性
             props["updated_at"] = now_iso
             props["user_id"] = user_id
             props["name"] = name
-
-            cypher = (
-                f"MERGE (n:{etype} {{user_id: $user_id, name: $name}}) "
-                f"ON CREATE SET n += $props, n.created_at = $now "
-                f"ON MATCH SET n += $props"
-            )
-            try:
-                self.neo4j.run_write(
-                    cypher,
+            label = f"{name} ({etype})"
+            label_owners.setdefault(label, set()).add(entity_owner[idx])
+            entity_groups.setdefault(etype, []).append({"idx": idx, "name": name, "props": props, "label": label})
+
+        for etype, rows in entity_groups.items():
+            written = self.store.merge_entities(user_id, etype, rows, now_iso, errors)
+            for row in rows:
+                if row["idx"] not in written:
+                    continue
+                reports[entity_owner[row["idx"]]]["entities"] += 1
+                created = written[row["idx"]]["created"]
+                props = {k: v for k, v in row["props"].items() if k != "user_id"}
+                if created:
+                    props["created_at"] = now_iso
+                changes.append(
                     {
-                        "user_id": user_id,
-                        "name": name,
-                        "props": props,
-                        "now": now_iso,
-                    },
+                        "change_type": "new_entity" if created else "updated_entity",
+                        "entity_type": etype,
+                        "name": row["name"],
+                        "node_id": written[row["idx"]]["id"],
+                        "props": json.dumps(props, ensure_ascii=False, default=str),
+                        "description": f"{'新增' if created else '更新'}{etype}: {row['name']}",
+                    }
                 )
-            except Exception as e:
-                logger.error(f"Error merging entity {name} ({etype}): {e}")
 
-        # --- Merge relationships ---
-        for rel in relations:
+        # --- Merge relationships (grouped by type + endpoint labels) ---
+        # 端点类型已在本次抽取结果中给出时直接按类型标签定位，否则走共享的 Entity 标签
+        name_types = {e["name"].strip(): e["type"] for e in entities}
+        relation_groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for idx, rel in enumerate(relations):
             source_name = rel["source"].strip()
             target_name = rel["target"].strip()
             rel_type = rel["type"]
             props = rel.get("properties", {})
-
-            weight = float(props.get("weight", 0.5))
-            sentiment = props.get("sentiment", "neutral")
-            confidence = float(props.get("confidence", 0.5))
             evidence_item = props.get("evidence", "")
-
-            # 需要先找到 source 和 target 节点（可能是任意类型）
-            cypher = (
-                f"MATCH (s {{user_id: $user_id, name: $source}}) "
-                f"MATCH (t {{user_id: $user_id, name: $target}}) "
-                f"MERGE (s)-[r:{rel_type}]->(t) "
-                f"ON CREATE SET r.weight = $weight, r.sentiment = $sentiment, "
-                f"r.confidence = $confidence, r.evidence = [$evidence], "
-                f"r.created_at = $now, r.updated_at = $now "
-                f"ON MATCH SET r.weight = $weight, r.sentiment = $sentiment, "
-                f"r.confidence = $confidence, "
-                f"r.evidence = CASE WHEN $evidence IN r.evidence THEN r.evidence "
-                f"ELSE r.evidence + $evidence END, "
-                f"r.updated_at = $now"
+            group_key = (
+                rel_type,
+                name_types.get(source_name, ENTITY_LABEL),
+                name_types.get(target_name, ENTITY_LABEL),
             )
-            try:
-                self.neo4j.run_write(
-                    cypher,
+            # 分块合并后的关系可能带多条证据
+            evidence_items = evidence_item if isinstance(evidence_item, list) else [evidence_item]
+            label_owners.setdefault(f"{source_name}-[{rel_type}]->{target_name}", set()).add(relation_owner[idx])
+            relation_groups.setdefault(group_key, []).append(
+                {
+                    "idx": idx,
+                    "source": source_name,
+                    "target": target_name,
+                    "weight": float(props.get("weight", 0.5)),
+                    "sentiment": props.get("sentiment", "neutral"),
+                    "confidence": float(props.get("confidence", 0.5)),
+                    "evidence": list(dict.fromkeys(str(item) for item in evidence_items if item)),
+                    "label": f"{source_name}-[{rel_type}]->{target_name}",
+                }
+            )
+
+        for (rel_type, source_label, target_label), rows in relation_groups.items():
+            written = self.store.merge_relations(user_id, rel_type, source_label, target_label, rows, now_iso, errors)
+            for row in rows:
+                result = written.get(row["idx"])
+                if result is None:
+                    continue
+                reports[relation_owner[row["idx"]]]["relations"] += 1
+                delta = relation_delta(row, None if result["created"] else result.get("before"))
+                if result["created"]:
+                    change_type = "new_relation"
+                    description = (
+                        f"新增关系: {row['source']} -[{rel_type}]-> {row['target']} "
+                        f"(权重:{row['weight']}, 情感:{row['sentiment']})"
+                    )
+                else:
+                    change_type = "updated_relation"
+                    description = (
+                        f"关系更新: {row['source']} -[{rel_type}]-> {row['target']} "
+                        f"(当前权重:{row['weight']}, 情感:{row['sentiment']})"
+                    )
+                changes.append(
                     {
-                        "user_id": user_id,
-                        "source": source_name,
-                        "target": target_name,
-                        "weight": weight,
-                        "sentiment": sentiment,
-                        "confidence": confidence,
-                        "evidence": evidence_item if isinstance(evidence_item, str) else str(evidence_item),
-                        "now": now_iso,
-                    },
-                )
-            except Exception as e:
-                logger.error(
-                    f"Error merging relation {source_name}-[{rel_type}]->{target_name}: {e}"
+                        "change_type": change_type,
+                        "source": row["source"],
+                        "target": row["target"],
+                        "rel_type": rel_type,
+                        "edge_id": result["id"],
+                        "delta": json.dumps(delta, ensure_ascii=False),
+                        "description": description,
+                    }
                 )
 
+        self._append_changes(user_id, changes, now_iso)
+        self._mark_graph_changed(user_id)
+        self._maybe_checkpoint(user_id)
+
+        for error in errors:
+            for k in label_owners.get(error["item"]) or range(len(batch)):
+                if isinstance(reports[k], dict):
+                    reports[k]["errors"].append(error)
+        if errors:
+            with self._write_lock:
+                self._lost_writes += len(errors)
+
+        # 同步进程内实体索引（有写入失败时整体失效，下次使用时重新加载）
+        if errors:
+            self._entity_index.invalidate(user_id)
+            self._alias_index.invalidate(user_id)
+        else:
+            self._entity_index.add_entities(
+                user_id, [(e["name"].strip(), e["type"]) for e in entities]
+            )
+            self._entity_index.add_edges(
+                user_id, [(r["source"].strip(), r["target"].strip()) for r in relations]
+            )
+            if aliases:
+                self.db.save_entity_aliases(user_id, aliases)
+                self._entity_index.add_aliases(user_id, [(a["alias"], a["canonical_name"]) for a in aliases])
+
         logger.info(
-            f"Merged {len(entities)} entities and {len(relations)} relations for user {user_id}."
+            f"Merged {sum(r['entities'] for r in reports if isinstance(r, dict))}/{len(entities)} entities and "
+            f"{sum(r['relations'] for r in reports if isinstance(r, dict))}/{len(relations)} relations "
+            f"for user {user_id} "
+            f"({len(errors)} errors"
+            + (f", {len(batch)} extractions coalesced)." if len(batch) > 1 else ").")
+        )
+        return reports
+
+    def write_stats(self) -> Dict[str, Any]:
+        """图谱写入指标：写入队列的排队 / 合并情况、瞬时错误重试次数与最终失败的条目数。"""
+        with self._write_lock:
+            lost = self._lost_writes
+        retried = self._store.write_retries if self._store is not None else 0
+        return {**self._write_queue.stats(), "retried": retried, "lost": lost}
+
+    # ------------------------------------------------------------------
+    # 发件箱与后台重连
+    # ------------------------------------------------------------------
+
+    def _enqueue_outbox(self, user_id: str, extracted_data: Dict[str, Any]) -> Dict[str, Any]:
+        """抽取结果落盘到发件箱，并确保后台重连线程在运行。"""
+        with self._outbox_lock:
+            self.db.enqueue_graph_outbox(user_id, extracted_data)
+            self._outbox_users.add(user_id)
+            self._outbox_queued += 1
+        self._ensure_reconnector()
+        return {"entities": 0, "relations": 0, "errors": [], "aliases": [], "queued": True}
+
+    def _ensure_reconnector(self):
+        with self._outbox_lock:
+            if self._reconnector is not None:
+                return
+            self._reconnector = threading.Thread(target=self._reconnect_loop, name="graph-reconnect", daemon=True)
+            self._reconnector.start()
+
+    def _reconnect_loop(self):
+        """
+        后台重连：连上图存储后按写入顺序回放发件箱，不可达时按指数退避重试
+        （GRAPH_RECONNECT_BACKOFF 起，最多 GRAPH_RECONNECT_MAX_BACKOFF 秒）；
+        已连接且发件箱清空后退出，之后再有写入暂存时重新启动。
+        """
+        delay = self.reconnect_backoff
+        while True:
+            try:
+                if self._connect() and self._drain_outbox():
+                    with self._outbox_lock:
+                        if not self._outbox_users:
+                            self._reconnector = None
+                            return
+                    delay = self.reconnect_backoff
+                    continue
+            except Exception as e:
+                logger.error(f"Graph outbox replay failed: {e}", exc_info=True)
+            if self._outbox_wakeup.wait(delay):
+                self._outbox_wakeup.clear()
+                delay = self.reconnect_backoff
+                continue
+            delay = min(delay * 2, self.reconnect_max_backoff)
+
+    def _drain_outbox(self) -> bool:
+        """
+        按用户、按写入顺序回放发件箱：每次取 GRAPH_OUTBOX_BATCH_SIZE 条，经写入队列合并写入。
+        后端仍不可达时停止并返回 False；其它原因失败的记录置为 failed，不阻塞后续记录。
+        正在清空图谱的用户暂不回放（返回 False），清空结束时唤醒重连线程回放。
+        """
+        drained = True
+        for user_id in self.db.list_graph_outbox_users():
+            if self.is_clearing(user_id):
+                drained = False
+                continue
+            while True:
+                rows = self.db.list_graph_outbox(user_id, self.outbox_batch_size)
+                if not rows:
+                    break
+                results = self._write_queue.submit_many(user_id, [payload for _, payload in rows])
+                done: List[int] = []
+                unavailable = False
+                for (outbox_id, _), result in zip(rows, results):
+                    if isinstance(result, BaseException):
+                        if is_unavailable(result):
+                            unavailable = True
+                            break
+                        logger.error(f"Graph outbox record {outbox_id} for user {user_id} failed: {result}")
+                        self.db.mark_graph_outbox_failed(outbox_id, str(result))
+                    else:
+                        done.append(outbox_id)
+                self.db.delete_graph_outbox(done)
+                with self._outbox_lock:
+                    self._outbox_replayed += len(done)
+                if done:
+                    logger.info(f"Replayed {len(done)} graph outbox records for user {user_id}")
+                if unavailable:
+                    return False
+            with self._outbox_lock:
+                if not self.db.list_graph_outbox(user_id, limit=1):
+                    self._outbox_users.discard(user_id)
+        return drained
+
+    def outbox_stats(self) -> Dict[str, Any]:
+        """发件箱指标：图存储是否已连接、待回放 / 回放失败的记录数、本进程暂存与回放的记录数。"""
+        counts = self.db.count_graph_outbox()
+        with self._outbox_lock:
+            return {
+                "connected": self._store is not None,
+                "reconnecting": self._reconnector is not None,
+                "pending": counts.get("pending", 0),
+                "failed": counts.get("failed", 0),
+                "users": len(self._outbox_users),
+                "queued": self._outbox_queued,
+                "replayed": self._outbox_replayed,
+            }
+
+    def _resolve_aliases(
+        self, user_id: str, entities: List[Dict[str, Any]], relations: List[Dict[str, Any]]
+    ):
+        """
+        把抽取结果中的实体名、关系端点替换为已有的规范实体名。
+        - 同一批次内先出现的新实体也参与解析，“陈总”“Chen总”同批出现时只建一个节点
+        - 解析后首尾相同的关系（自环）丢弃
+        返回 (entities, relations, 新别名 [{"alias", "canonical_name", "entity_type"}])。
+        """
+        self._ensure_alias_index(user_id)
+        renames: Dict[str, str] = {}
+        aliases: Dict[str, Dict[str, Any]] = {}
+
+        resolved_entities = []
+        for entity in entities:
+            name = entity["name"].strip()
+            etype = entity["type"]
+            canonical = self._alias_index.resolve(user_id, name, etype)
+            if canonical is None:
+                canonical = name
+                self._alias_index.add_entity(user_id, name, etype)
+            elif canonical != name:
+                renames[name] = canonical
+                aliases[name] = {"alias": name, "canonical_name": canonical, "entity_type": etype}
+            resolved_entities.append({**entity, "name": canonical})
+
+        def _endpoint(name: str) -> str:
+            name = name.strip()
+            if name in renames:
+                return renames[name]
+            canonical = self._alias_index.resolve(user_id, name)
+            if canonical is None or canonical == name:
+                return name
+            aliases.setdefault(name, {"alias": name, "canonical_name": canonical, "entity_type": None})
+            return canonical
+
+        resolved_relations = []
+        for rel in relations:
+            source, target = _endpoint(rel["source"]), _endpoint(rel["target"])
+            if source == target:
+                logger.debug(f"Dropped self-loop relation after alias resolution: {rel}")
+                continue
+            resolved_relations.append({**rel, "source": source, "target": target})
+
+        for alias in aliases.values():
+            self._alias_index.add_alias(user_id, alias["alias"], alias["canonical_name"])
+        if aliases:
+            logger.info(
+                f"Resolved {len(aliases)} entity aliases for user {user_id}: "
+                + ", ".join(f"{a['alias']} → {a['canonical_name']}" for a in aliases.values())
+            )
+        return resolved_entities, resolved_relations, list(aliases.values())
+
+    def _ensure_alias_index(self, user_id: str):
+        """首次使用时加载用户的实体名称与别名表。"""
+        if self._alias_index.has_user(user_id):
+            return
+        self._alias_index.load_user(
+            user_id, self.store.entity_index_rows(user_id), self.db.list_entity_aliases(user_id)
         )
 
+    def _append_changes(self, user_id: str, changes: List[Dict[str, Any]], now_iso: str) -> Optional[int]:
+        """追加变更记录到用户的变更日志，返回最新序号。"""
+        if not changes:
+            return None
+        try:
+            return self.store.append_changes(user_id, changes, now_iso)
+        except Exception as e:
+            # 变更日志写失败不影响图谱本身
+            logger.error(f"Failed to append {len(changes)} graph changes for user {user_id}: {e}")
+            return None
+
     # ==================================================================
     # 3. 抽取 + 合并一步完成（供 AdvisorService 调用）
     # ==================================================================
@@ -212,169 +686,415 @@ class GraphEngine:
     ):
         """
         从事实文本中抽取实体关系并合并到图谱（端到端）。
+        长文本按 process_document 分块并行抽取。
+        """
+        return self.process_document(user_id, fact, situation_context)["extracted"]
+
+    def process_document(
+        self,
+        user_id: str,
+        text: str,
+        situation_context: str = "",
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        strict: bool = False,
+    ) -> Dict[str, Any]:
         """
-        graph_summary = self._get_graph_summary(user_id)
-        extracted = self.extract_entities_relations(
-            text=fact,
-            situation_context=situation_context,
-            graph_summary=graph_summary,
+        长文本（会议纪要、周报等）抽取：
+        - 按句切成不超过 GRAPH_EXTRACT_CHUNK_CHARS 的重叠块
+        - 各块在线程池中并行调用 LLM，并发数不超过 GRAPH_EXTRACT_CONCURRENCY
+        - 各块结果去重合并后一次性写入图谱
+        on_progress 在每块完成及写入完成时收到进度事件（在工作线程中调用）。
+        strict=True 时任一块抽取失败即抛出异常，不写入部分结果。
+        返回 {"extracted", "chunks", "report", "elapsed"}
+        """
+        started = time.monotonic()
+        chunks = chunk_text(text, self.extract_chunk_chars, self.extract_chunk_overlap)
+        self._try_ensure_entity_index(user_id)
+
+        def _extract(chunk: str) -> Dict[str, Any]:
+            return self.extract_entities_relations(
+                text=chunk,
+                situation_context=situation_context,
+                graph_summary=self._get_candidate_summary(user_id, chunk),
+                strict=strict,
+            )
+
+        results: List[Dict[str, Any]] = [{"entities": [], "relations": []} for _ in chunks]
+        if len(chunks) == 1:
+            results[0] = _extract(chunks[0])
+            self._report_progress(on_progress, "extract", 0, 1, 1, results[0], started)
+        elif chunks:
+            with ThreadPoolExecutor(
+                max_workers=max(1, min(self.extract_concurrency, len(chunks))),
+                thread_name_prefix="graph-extract",
+            ) as pool:
+                futures = {pool.submit(_extract, chunk): i for i, chunk in enumerate(chunks)}
+                for completed, future in enumerate(as_completed(futures), 1):
+                    index = futures[future]
+                    results[index] = future.result()
+                    self._report_progress(
+                        on_progress, "extract", index, completed, len(chunks), results[index], started
+                    )
+
+        extracted = self._reconcile_extractions(results) if len(results) > 1 else (
+            results[0] if results else {"entities": [], "relations": []}
         )
+        report = None
         if extracted["entities"] or extracted["relations"]:
-            self.merge_to_graph(user_id, extracted)
-        return extracted
-
-    # ==================================================================
-    # 4. 图谱查询
-    # ==================================================================
+            report = self.merge_to_graph(user_id, extracted)
+        elapsed = round(time.monotonic() - started, 3)
+        if on_progress is not None:
+            on_progress(
+                {
+                    "stage": "merge",
+                    "total": len(chunks),
+                    "entities": len(extracted["entities"]),
+                    "relations": len(extracted["relations"]),
+                    "elapsed": elapsed,
+                }
+            )
+        if len(chunks) > 1:
+            logger.info(
+                f"Extracted {len(chunks)} chunks ({len(text)} chars) for user {user_id} in {elapsed}s: "
+                f"{len(extracted['entities'])} entities, {len(extracted['relations'])} relations after reconcile."
+            )
+        return {"extracted": extracted, "chunks": len(chunks), "report": report, "elapsed": elapsed}
+
+    @staticmethod
+    def _report_progress(
+        on_progress: Optional[Callable[[Dict[str, Any]], None]],
+        stage: str,
+        index: int,
+        completed: int,
+        total: int,
+        result: Dict[str, Any],
+        started: float,
+    ):
+        if on_progress is None:
+            return
+        on_progress(
+            {
+                "stage": stage,
+                "chunk": index,
+                "completed": completed,
+                "total": total,
+                "entities": len(result["entities"]),
+                "relations": len(result["relations"]),
+                "elapsed": round(time.monotonic() - started, 3),
+            }
+        )
 
-    def get_graph_data(self, user_id: str) -> Dict[str, Any]:
+    @staticmethod
+    def _reconcile_extractions(results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
-        返回用户完整图数据（nodes + edges），供前端可视化。
+        合并多个分块的抽取结果：
+        - 实体按 (名称, 类型) 去重，属性以先出现的块为准、缺失的从后续块补齐
+        - 关系按 (源, 类型, 目标) 去重：权重与置信度取平均，情感取多数，证据按出现顺序去重保留全部
         """
-        # 查询所有节点
-        nodes_cypher = (
-            "MATCH (n) WHERE n.user_id = $user_id "
-            "RETURN id(n) AS id, labels(n) AS labels, properties(n) AS props"
-        )
-        nodes_raw = self.neo4j.run_query(nodes_cypher, {"user_id": user_id})
-
-        nodes = []
-        for row in nodes_raw:
-            label_list = row.get("labels", [])
-            node_type = label_list[0] if label_list else "Unknown"
-            props = row.get("props", {})
-            nodes.append(
+        entities: Dict[tuple, Dict[str, Any]] = {}
+        for result in results:
+            for entity in result["entities"]:
+                key = (entity["name"].strip(), entity["type"])
+                if key not in entities:
+                    entities[key] = {"name": key[0], "type": key[1], "properties": dict(entity.get("properties") or {})}
+                    continue
+                props = entities[key]["properties"]
+                for k, v in (entity.get("properties") or {}).items():
+                    if v not in (None, "") and props.get(k) in (None, ""):
+                        props[k] = v
+
+        grouped: Dict[tuple, List[Dict[str, Any]]] = {}
+        for result in results:
+            for rel in result["relations"]:
+                key = (rel["source"].strip(), rel["type"], rel["target"].strip())
+                grouped.setdefault(key, []).append(rel.get("properties") or {})
+
+        relations = []
+        for (source, rtype, target), props_list in grouped.items():
+            evidence: List[str] = []
+            for props in props_list:
+                items = props.get("evidence") or []
+                for item in items if isinstance(items, list) else [items]:
+                    item = str(item)
+                    if item and item not in evidence:
+                        evidence.append(item)
+            sentiments = Counter(p.get("sentiment", "neutral") for p in props_list)
+            relations.append(
                 {
-                    "id": str(row["id"]),
-                    "name": props.get("name", ""),
-                    "type": node_type,
+                    "source": source,
+                    "target": target,
+                    "type": rtype,
                     "properties": {
-                        k: v
-                        for k, v in props.items()
-                        if k not in ("user_id",)
+                        "weight": round(sum(float(p.get("weight", 0.5)) for p in props_list) / len(props_list), 4),
+                        "confidence": round(
+                            sum(float(p.get("confidence", 0.5)) for p in props_list) / len(props_list), 4
+                        ),
+                        "sentiment": sentiments.most_common(1)[0][0],
+                        "evidence": evidence,
                     },
                 }
             )
+        return {"entities": list(entities.values()), "relations": relations}
 
-        # 查询所有关系
-        edges_cypher = (
-            "MATCH (s)-[r]->(t) "
-            "WHERE s.user_id = $user_id AND t.user_id = $user_id "
-            "RETURN id(s) AS source, id(t) AS target, type(r) AS rel_type, "
-            "properties(r) AS props"
-        )
-        edges_raw = self.neo4j.run_query(edges_cypher, {"user_id": user_id})
+    # ==================================================================
+    # 4. 图谱查询
+    # ==================================================================
 
-        edges = []
-        for row in edges_raw:
-            props = row.get("props", {})
-            edges.append(
-                {
-                    "source": str(row["source"]),
-                    "target": str(row["target"]),
-                    "type": row.get("rel_type", ""),
-                    "weight": float(props.get("weight", 0.5)),
-                    "sentiment": props.get("sentiment", "neutral"),
-                    "confidence": float(props.get("confidence", 0.5)),
-                    "evidence": props.get("evidence", []),
-                }
+    # 以下读取方法均提供同步 / 异步（a 前缀）两个版本：
+    # 分别调用存储后端的同步 / 异步接口；async 路由使用异步版本，不阻塞事件循环
+
+    def get_change_seq(self, user_id: str) -> int:
+        """
+        持久化的用户图谱版本：变更日志的最新序号（无记录时为 0）。
+        用作 GET /graph/{user_id} 的 ETag 以及增量同步的游标。
+        """
+        return self._cached(user_id, ("change_seq",), lambda: self.store.change_seq(user_id))
+
+    async def aget_change_seq(self, user_id: str) -> int:
+        return await self._acached(user_id, ("change_seq",), lambda: self.store.achange_seq(user_id))
+
+    def get_graph_data(self, user_id: str) -> Dict[str, Any]:
+        """
+        返回用户完整图数据（version + nodes + edges），供前端可视化。
+        version 在读取数据之前获取，客户端据此增量同步时最多重复拿到部分变更，不会遗漏。
+        结果按图谱版本缓存，调用方不得修改返回的数据。
+        """
+
+        def _fetch():
+            version = self.get_change_seq(user_id)
+            return {
+                "version": version,
+                "nodes": self.store.fetch_nodes(user_id),
+                "edges": self.store.fetch_edges(user_id),
+            }
+
+        return self._cached(user_id, ("graph",), _fetch, weight=self._graph_weight)
+
+    async def aget_graph_data(self, user_id: str) -> Dict[str, Any]:
+        """get_graph_data 的异步版本：节点与关系两次读取并发执行。"""
+
+        async def _fetch():
+            version = await self.aget_change_seq(user_id)
+            nodes, edges = await asyncio.gather(
+                self.store.afetch_nodes(user_id),
+                self.store.afetch_edges(user_id),
             )
+            return {"version": version, "nodes": nodes, "edges": edges}
 
-        return {"nodes": nodes, "edges": edges}
+        return await self._acached(user_id, ("graph",), _fetch, weight=self._graph_weight)
 
-    def get_entity_neighborhood(
-        self, user_id: str, entity_name: str, depth: int = 2
-    ) -> Dict[str, Any]:
+    # 时间点查询回放变更记录时的分页大小
+    AS_OF_PAGE_SIZE = 5000
+
+    def get_graph_as_of(self, user_id: str, as_of_iso: str) -> Dict[str, Any]:
         """
-        返回指定实体的 N 跳邻域子图。
+        时间点查询：返回 as_of_iso（UTC ISO 时间）时刻的图谱 {"version", "as_of", "nodes", "edges"}。
+        从不晚于该时刻的最近一个检查点（没有时从空图）开始，按序回放其后、该时刻之前的变更记录；
+        version 为回放到的最后一条变更序号。关系只含强度 / 情感 / 置信度，不含证据原文。
         """
-        cypher = (
-            "MATCH (center {user_id: $user_id, name: $name}) "
-            f"CALL apoc.path.subgraphAll(center, {{maxLevel: {depth}}}) "
-            "YIELD nodes, relationships "
-            "RETURN nodes, relationships"
+        return self._cached(
+            user_id, ("as_of", as_of_iso), lambda: self._replay_as_of(user_id, as_of_iso), weight=self._graph_weight
         )
 
-        # Fallback: 如果没有 APOC 插件，使用基础 Cypher
-        fallback_cypher = (
-            "MATCH path = (center {user_id: $user_id, name: $name})-[*1..%d]-(neighbor) "
-            "WHERE neighbor.user_id = $user_id "
-            "WITH collect(DISTINCT center) + collect(DISTINCT neighbor) AS all_nodes, "
-            "collect(DISTINCT relationships(path)) AS all_rels_nested "
-            "UNWIND all_nodes AS n "
-            "WITH collect(DISTINCT n) AS nodes, all_rels_nested "
-            "UNWIND all_rels_nested AS rels "
-            "UNWIND rels AS r "
-            "WITH nodes, collect(DISTINCT r) AS relationships "
-            "RETURN nodes, relationships"
-        ) % depth
-
-        params = {"user_id": user_id, "name": entity_name}
+    def _replay_as_of(self, user_id: str, as_of_iso: str) -> Dict[str, Any]:
+        checkpoint = self.store.load_checkpoint(user_id, as_of_iso)
+        state = GraphState.decode(checkpoint["data"]) if checkpoint else GraphState()
+        seq = checkpoint["seq"] if checkpoint else 0
+        replayed = 0
+        while True:
+            rows = self.store.read_changes(user_id, since_seq=seq, until_iso=as_of_iso, limit=self.AS_OF_PAGE_SIZE)
+            for row in rows:
+                state.apply(row)
+            replayed += len(rows)
+            if len(rows) < self.AS_OF_PAGE_SIZE:
+                break
+            seq = rows[-1]["seq"]
+        if rows:
+            seq = rows[-1]["seq"]
+        logger.debug(
+            f"Graph as of {as_of_iso} for user {user_id}: checkpoint seq "
+            f"{checkpoint['seq'] if checkpoint else 0} + {replayed} changes replayed"
+        )
+        return {"version": seq, "as_of": as_of_iso, **state.to_graph_data()}
 
+    def _maybe_checkpoint(self, user_id: str, force: bool = False):
+        """
+        距上一个检查点累计 GRAPH_CHECKPOINT_INTERVAL 条变更后（或 force 时）物化一个检查点。
+        序号在读取图谱之前获取、时间戳在读取之后获取：检查点包含序号及之前的全部变更，
+        其后的变更在回放时重复应用一次也不影响结果。失败只记录日志。
+        """
+        if self.checkpoint_interval <= 0 and not force:
+            return
         try:
-            raw = self.neo4j.run_query(cypher, params)
-        except Exception:
-            logger.debug("APOC not available, using fallback Cypher for neighborhood.")
-            try:
-                raw = self.neo4j.run_query(fallback_cypher, params)
-            except Exception as e:
-                logger.error(f"Neighborhood query failed: {e}")
-                return {"nodes": [], "edges": []}
-
-        if not raw:
-            return {"nodes": [], "edges": []}
-
-        record = raw[0]
-        raw_nodes = record.get("nodes", [])
-        raw_rels = record.get("relationships", [])
-
-        nodes = []
-        for n in raw_nodes:
-            # n might be a Neo4j Node object or dict depending on driver version
-            if hasattr(n, "labels"):
-                node_type = list(n.labels)[0] if n.labels else "Unknown"
-                props = dict(n)
-            else:
-                node_type = n.get("labels", ["Unknown"])[0] if isinstance(n, dict) else "Unknown"
-                props = n.get("props", n) if isinstance(n, dict) else {}
+            last = self._checkpoint_seqs.get(user_id)
+            if last is None:
+                checkpoint = self.store.load_checkpoint(user_id)
+                last = checkpoint["seq"] if checkpoint else 0
+                self._checkpoint_seqs[user_id] = last
+            seq = self.store.change_seq(user_id)
+            if seq <= last or (not force and seq - last < self.checkpoint_interval):
+                return
+            state = GraphState.from_graph(self.store.fetch_nodes(user_id), self.store.fetch_edges(user_id))
+            timestamp = datetime.now(timezone.utc).isoformat()
+            self.store.save_checkpoint(user_id, seq, timestamp, state.encode())
+            self._checkpoint_seqs[user_id] = seq
+            logger.info(
+                f"Graph checkpoint saved for user {user_id} at seq {seq}: "
+                f"{len(state.nodes)} nodes, {len(state.edges)} edges"
+            )
+        except Exception as e:
+            logger.error(f"Failed to save graph checkpoint for user {user_id}: {e}")
 
-            nodes.append(
-                {
-                    "id": str(n.element_id if hasattr(n, "element_id") else n.get("id", "")),
-                    "name": props.get("name", ""),
-                    "type": node_type,
-                    "properties": {
-                        k: v for k, v in props.items() if k not in ("user_id",)
-                    },
-                }
+    def get_graph_delta(self, user_id: str, since: int) -> Dict[str, Any]:
+        """
+        返回自版本 since 以来的图谱增量：
+        - nodes / edges: 新增或更新过的节点与关系（当前完整内容，客户端按 id / (source, type, target) 覆盖）
+        - removed_nodes: 已删除的节点 id，客户端同时移除与之相连的边
+        变更日志中出现清空操作、变更条数超过 GRAPH_DELTA_MAX_CHANGES 或 since 不在日志范围内时，
+        返回完整图数据并置 reset=True。
+        """
+        version = self.get_change_seq(user_id)
+        delta = self._empty_delta(version, since)
+        if since == version:
+            return delta
+        rows = []
+        if 0 <= since < version:
+            rows = self.store.read_changes(
+                user_id, since_seq=since, until_seq=version, limit=self.delta_max_changes + 1
+            )
+        plan = self._plan_delta(rows, since, version)
+        if plan is None:
+            return {**delta, **self.get_graph_data(user_id), "reset": True}
+
+        names, relations, removed = plan
+        if names:
+            delta["nodes"] = self.store.fetch_nodes(user_id, names)
+        if relations:
+            delta["edges"] = self.store.fetch_edges(user_id, relations)
+        upserted = {n["id"] for n in delta["nodes"]}
+        delta["removed_nodes"] = [node_id for node_id in removed if node_id not in upserted]
+        return delta
+
+    async def aget_graph_delta(self, user_id: str, since: int) -> Dict[str, Any]:
+        """get_graph_delta 的异步版本。"""
+        version = await self.aget_change_seq(user_id)
+        delta = self._empty_delta(version, since)
+        if since == version:
+            return delta
+        rows = []
+        if 0 <= since < version:
+            rows = await self.store.aread_changes(
+                user_id, since_seq=since, until_seq=version, limit=self.delta_max_changes + 1
             )
+        plan = self._plan_delta(rows, since, version)
+        if plan is None:
+            return {**delta, **(await self.aget_graph_data(user_id)), "reset": True}
+
+        names, relations, removed = plan
+        if names:
+            delta["nodes"] = await self.store.afetch_nodes(user_id, names)
+        if relations:
+            delta["edges"] = await self.store.afetch_edges(user_id, relations)
+        upserted = {n["id"] for n in delta["nodes"]}
+        delta["removed_nodes"] = [node_id for node_id in removed if node_id not in upserted]
+        return delta
+
+    @staticmethod
+    def _empty_delta(version: int, since: int) -> Dict[str, Any]:
+        return {
+            "version": version,
+            "since": since,
+            "reset": False,
+            "nodes": [],
+            "edges": [],
+            "removed_nodes": [],
+        }
 
-        edges = []
-        for r in raw_rels:
-            if hasattr(r, "type"):
-                rel_type = r.type
-                rel_props = dict(r)
-                source_id = str(r.start_node.element_id)
-                target_id = str(r.end_node.element_id)
-            else:
-                rel_type = r.get("type", "")
-                rel_props = r.get("props", r) if isinstance(r, dict) else {}
-                source_id = str(r.get("source", ""))
-                target_id = str(r.get("target", ""))
+    def _plan_delta(self, rows: List[Dict[str, Any]], since: int, version: int):
+        """
+        根据变更记录计算需要重新读取的实体名、关系与已删除节点 id。
+        记录不完整（since 越界、超出条数上限、期间清空或合并过实体）时返回 None，调用方改为返回完整图数据。
+        """
+        complete = (
+            0 <= since < version
+            and len(rows) == version - since
+            and len(rows) <= self.delta_max_changes
+            and not any(r["change_type"] in ("cleared", "partially_cleared", "merged_entity") for r in rows)
+        )
+        if not complete:
+            return None
+
+        names: Dict[str, None] = {}
+        relations: Dict[tuple, None] = {}
+        removed: Dict[str, None] = {}
+        for row in rows:
+            change_type = row["change_type"]
+            if change_type in ("new_entity", "updated_entity"):
+                names.setdefault(row["name"], None)
+            elif change_type in ("new_relation", "updated_relation"):
+                relations.setdefault((row["source"], row["rel_type"], row["target"]), None)
+            elif change_type == "deleted_entity" and row.get("node_id"):
+                removed.setdefault(row["node_id"], None)
+        return (
+            list(names),
+            [{"source": s, "rel_type": t, "target": o} for s, t, o in relations],
+            list(removed),
+        )
 
-            edges.append(
-                {
-                    "source": source_id,
-                    "target": target_id,
-                    "type": rel_type,
-                    "weight": float(rel_props.get("weight", 0.5)),
-                    "sentiment": rel_props.get("sentiment", "neutral"),
-                    "confidence": float(rel_props.get("confidence", 0.5)),
-                    "evidence": rel_props.get("evidence", []),
-                }
-            )
+    # 证据分页单页上限
+    EVIDENCE_PAGE_MAX = 100
 
-        return {"nodes": nodes, "edges": edges}
+    def get_edge_evidence(
+        self, user_id: str, edge_id: str, offset: int = 0, limit: int = 20
+    ) -> Optional[Dict[str, Any]]:
+        """
+        按关系 id 分页读取完整证据历史（新的在前）。
+        图数据中的关系只带最近几条 evidence 与 evidence_count，完整历史通过这里按需获取；
+        关系不存在时返回 None。
+        """
+        offset, limit = max(0, offset), max(1, min(limit, self.EVIDENCE_PAGE_MAX))
+        page = self._cached(
+            user_id, ("evidence", edge_id, offset, limit), lambda: self.store.edge_evidence(user_id, edge_id, offset, limit)
+        )
+        return None if page is None else {**page, "offset": offset, "limit": limit}
+
+    async def aget_edge_evidence(
+        self, user_id: str, edge_id: str, offset: int = 0, limit: int = 20
+    ) -> Optional[Dict[str, Any]]:
+        offset, limit = max(0, offset), max(1, min(limit, self.EVIDENCE_PAGE_MAX))
+        page = await self._acached(
+            user_id, ("evidence", edge_id, offset, limit), lambda: self.store.aedge_evidence(user_id, edge_id, offset, limit)
+        )
+        return None if page is None else {**page, "offset": offset, "limit": limit}
+
+    def get_entity_neighborhood(
+        self,
+        user_id: str,
+        entity_name: str,
+        depth: int = 2,
+        max_nodes: Optional[int] = None,
+        max_edges: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        返回指定实体的 N 跳邻域子图（强关系优先的逐层扩展）。
+        depth / max_nodes / max_edges 不超过 GRAPH_NEIGHBORHOOD_MAX_* 上限；
+        因上限截断时 truncated=True。
+        """
+        depth = max(1, min(depth, self.neighborhood_max_depth))
+        max_nodes = max(1, min(max_nodes or self.neighborhood_max_nodes, self.neighborhood_max_nodes))
+        max_edges = max(1, min(max_edges or self.neighborhood_max_edges, self.neighborhood_max_edges))
+        result = self._cached(
+            user_id,
+            ("neighborhood", entity_name, depth, max_nodes, max_edges),
+            lambda: self.store.neighborhood(user_id, entity_name, depth, max_nodes, max_edges),
+            weight=self._graph_weight,
+        )
+        if result["truncated"]:
+            logger.info(
+                f"Neighborhood of '{entity_name}' truncated for user {user_id} "
+                f"(depth={depth}, nodes={len(result['nodes'])}, edges={len(result['edges'])})"
+            )
+        return {**result, "depth": depth}
 
     # ==================================================================
     # 5. 图谱上下文（用于注入 Prompt）
@@ -383,44 +1103,29 @@ class GraphEngine:
     def get_graph_context(self, user_id: str, query: str = "") -> str:
         """
         生成格式化的图谱上下文字符串，注入到 Decision/Narrative prompt 中。
-        包含：关键人物及其关系、重要事件、项目状态、风险关系。
-        """
-        # 人物关系
-        person_rels_cypher = (
-            "MATCH (p:Person {user_id: $user_id})-[r]->(t {user_id: $user_id}) "
-            "RETURN p.name AS source, type(r) AS rel_type, r.weight AS weight, "
-            "r.sentiment AS sentiment, t.name AS target, labels(t)[0] AS target_type "
-            "ORDER BY r.weight DESC LIMIT 30"
-        )
-        person_rels = self.neo4j.run_query(person_rels_cypher, {"user_id": user_id})
-
-        # 所有人物节点
-        persons_cypher = (
-            "MATCH (p:Person {user_id: $user_id}) "
-            "RETURN p.name AS name, p.role AS role, p.influence_level AS influence, "
-            "p.style AS style "
-            "ORDER BY p.name"
-        )
-        persons = self.neo4j.run_query(persons_cypher, {"user_id": user_id})
+        包含：关键人物及其关系、重要事件、项目状态。
+        - query 中提及已有实体时，只取以这些实体为起点、按关系强度与更新时间逐层扩展的子图
+          （GRAPH_CONTEXT_DEPTH 跳，节点 / 关系数不超过 GRAPH_CONTEXT_MAX_NODES / MAX_EDGES）
+        - 否则退化为全图概览：权重最高的人物关系、全部人物、最近的事件与项目
+        """
+        seeds: List[str] = []
+        if query:
+            self._ensure_entity_index(user_id)
+            seeds = self._entity_index.match(user_id, query)
 
-        # 近期事件
-        events_cypher = (
-            "MATCH (e:Event {user_id: $user_id}) "
-            "RETURN e.name AS name, e.description AS description, e.date AS date "
-            "ORDER BY e.updated_at DESC LIMIT 10"
-        )
-        events = self.neo4j.run_query(events_cypher, {"user_id": user_id})
+        return self._cached(user_id, ("context", *seeds), lambda: self._build_graph_context(user_id, seeds))
 
-        # 项目状态
-        projects_cypher = (
-            "MATCH (pj:Project {user_id: $user_id}) "
-            "RETURN pj.name AS name, pj.status AS status, pj.priority AS priority "
-            "ORDER BY pj.updated_at DESC LIMIT 10"
-        )
-        projects = self.neo4j.run_query(projects_cypher, {"user_id": user_id})
+    def _build_graph_context(self, user_id: str, seeds: List[str]) -> str:
+        rows = self._focused_context_rows(user_id, seeds) if seeds else self.store.context_rows(user_id)
+        person_rels = rows["person_rels"]
+        persons = rows["persons"]
+        events = rows["events"]
+        projects = rows["projects"]
 
         # 构建上下文字符串
         lines = ["[局势图谱]"]
+        if seeds:
+            lines.append(f"> 相关实体: {', '.join(seeds)}")
 
         if persons:
             lines.append("> 关键人物:")
@@ -462,112 +1167,189 @@ class GraphEngine:
 
         return "\n".join(lines)
 
+    def _focused_context_rows(self, user_id: str, seeds: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        以 seeds 为起点的子图转换为 context_rows 的格式。
+        人物关系包含子图中所有以人物为起点的关系（按强度降序），人物 / 事件 / 项目只取子图内的节点。
+        """
+        sub = self.store.subgraph(
+            user_id,
+            seeds,
+            depth=self.context_depth,
+            max_nodes=self.context_max_nodes,
+            max_edges=self.context_max_edges,
+            half_life_days=self.context_half_life_days or None,
+        )
+        nodes = {n["id"]: n for n in sub["nodes"]}
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        for node in sub["nodes"]:
+            by_type.setdefault(node["type"], []).append(node)
+
+        person_rels = []
+        for edge in sorted(sub["edges"], key=lambda e: e["weight"] * e["confidence"], reverse=True):
+            source, target = nodes.get(edge["source"]), nodes.get(edge["target"])
+            if source is None or target is None or source["type"] != "Person":
+                continue
+            person_rels.append(
+                {
+                    "source": source["name"],
+                    "rel_type": edge["type"],
+                    "weight": edge["weight"],
+                    "sentiment": edge["sentiment"],
+                    "target": target["name"],
+                    "target_type": target["type"],
+                }
+            )
+
+        def _recent(nodes_of_type: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            return sorted(nodes_of_type, key=lambda n: str(n["properties"].get("updated_at", "")), reverse=True)[:10]
+
+        persons = [
+            {
+                "name": p["name"],
+                "role": p["properties"].get("role"),
+                "influence": p["properties"].get("influence_level"),
+                "style": p["properties"].get("style"),
+            }
+            for p in sorted(by_type.get("Person", []), key=lambda n: n["name"])
+        ]
+        events = [
+            {"name": e["name"], "description": e["properties"].get("description"), "date": e["properties"].get("date")}
+            for e in _recent(by_type.get("Event", []))
+        ]
+        projects = [
+            {"name": pj["name"], "status": pj["properties"].get("status"), "priority": pj["properties"].get("priority")}
+            for pj in _recent(by_type.get("Project", []))
+        ]
+        if sub["truncated"]:
+            logger.debug(
+                f"Graph context subgraph truncated for user {user_id} "
+                f"(seeds={len(seeds)}, nodes={len(sub['nodes'])}, edges={len(sub['edges'])})"
+            )
+        return {"person_rels": person_rels, "persons": persons, "events": events, "projects": projects}
+
     # ==================================================================
     # 6. 图谱摘要（用于抽取 Prompt 中提供上下文）
     # ==================================================================
 
-    def _get_graph_summary(self, user_id: str) -> str:
+    def _get_candidate_summary(self, user_id: str, fact: str, limit: int = 30) -> str:
         """
-        简要描述当前图谱内容，帮助 LLM 在抽取时避免重复/保持一致。
+        列出事实中提及的已有实体及其 1 跳邻居，帮助 LLM 在抽取时沿用已有名称。
+        通过进程内 Aho-Corasick 索引匹配，无需每次查询整张图。
         """
-        cypher = (
-            "MATCH (n {user_id: $user_id}) "
-            "RETURN labels(n)[0] AS type, n.name AS name "
-            "ORDER BY n.name LIMIT 50"
-        )
-        results = self.neo4j.run_query(cypher, {"user_id": user_id})
-        if not results:
+        if not self._try_ensure_entity_index(user_id):
+            return "图谱暂不可用"
+        if not self._entity_index.entity_count(user_id):
             return "暂无已有图谱数据"
 
+        mentioned = self._entity_index.match(user_id, fact)
+        if not mentioned:
+            return "文本中未提及已有图谱实体"
+
         by_type: Dict[str, List[str]] = {}
-        for r in results:
-            t = r.get("type", "Unknown")
-            by_type.setdefault(t, []).append(r.get("name", ""))
+        for name, etype in self._entity_index.expand(user_id, mentioned, limit=limit):
+            by_type.setdefault(etype, []).append(name)
 
         parts = []
         for t, names in by_type.items():
             parts.append(f"{t}: {', '.join(names)}")
-        return "已有实体 - " + "; ".join(parts)
+        return "相关已有实体 - " + "; ".join(parts)
+
+    def _try_ensure_entity_index(self, user_id: str) -> bool:
+        """抽取前加载实体索引；图存储不可达时返回 False，抽取照常进行（结果暂存到发件箱）。"""
+        try:
+            self._ensure_entity_index(user_id)
+            return True
+        except Exception as e:
+            if not is_unavailable(e):
+                raise
+            logger.warning(f"Graph store unavailable, extracting without entity index for user {user_id}: {e}")
+            return False
+
+    def _ensure_entity_index(self, user_id: str):
+        """首次使用时加载用户的实体名称与邻接关系。"""
+        if self._entity_index.has_user(user_id):
+            return
+        aliases: Dict[str, List[str]] = {}
+        for row in self.db.list_entity_aliases(user_id):
+            aliases.setdefault(row["canonical_name"], []).append(row["alias"])
+        rows = [{**row, "aliases": aliases.get(row["name"], [])} for row in self.store.entity_index_rows(user_id)]
+        self._entity_index.load_user(user_id, rows)
+        logger.debug(f"Entity index loaded for user {user_id}: {len(rows)} entities")
 
     # ==================================================================
     # 7. 变化检测
     # ==================================================================
 
-    def detect_changes(self, user_id: str, hours: int = 24) -> List[Dict[str, Any]]:
+    def detect_changes(
+        self,
+        user_id: str,
+        hours: Optional[int] = 24,
+        since_seq: Optional[int] = None,
+        limit: int = 500,
+        latest_first: bool = False,
+    ) -> List[Dict[str, Any]]:
         """
-        检测最近 N 小时内的图谱变化（新增实体/关系、权重变动）。
+        从变更日志读取图谱变化（新增/更新实体与关系、删除、清空）。
+        - since_seq 给定时返回序号大于它的增量记录，客户端以最后一条的 seq 作为下次游标
+        - 否则返回最近 N 小时内的记录
+        两种方式都是 (user_id, seq) / (user_id, timestamp) 索引上的范围读取；结果按图谱版本缓存。
         """
-        cutoff = datetime.now(timezone.utc)
-        from datetime import timedelta
-        cutoff_iso = (cutoff - timedelta(hours=hours)).isoformat()
-
-        changes = []
-
-        # 新增节点
-        new_nodes_cypher = (
-            "MATCH (n {user_id: $user_id}) "
-            "WHERE n.created_at >= $cutoff "
-            "RETURN labels(n)[0] AS type, n.name AS name, n.created_at AS created_at"
-        )
-        new_nodes = self.neo4j.run_query(
-            new_nodes_cypher, {"user_id": user_id, "cutoff": cutoff_iso}
+        query = self._changes_query(hours, since_seq, limit, latest_first)
+        changes = self._cached(
+            user_id,
+            ("changes", *sorted(query.items())),
+            lambda: self._parse_changes(self.store.read_changes(user_id, **query)),
         )
-        for node in new_nodes:
-            changes.append(
-                {
-                    "change_type": "new_entity",
-                    "description": f"新增{node['type']}: {node['name']}",
-                    "timestamp": node.get("created_at", ""),
-                }
-            )
-
-        # 新增关系
-        new_rels_cypher = (
-            "MATCH (s {user_id: $user_id})-[r]->(t {user_id: $user_id}) "
-            "WHERE r.created_at >= $cutoff "
-            "RETURN s.name AS source, type(r) AS rel_type, t.name AS target, "
-            "r.created_at AS created_at, r.weight AS weight, r.sentiment AS sentiment"
-        )
-        new_rels = self.neo4j.run_query(
-            new_rels_cypher, {"user_id": user_id, "cutoff": cutoff_iso}
-        )
-        for rel in new_rels:
-            changes.append(
-                {
-                    "change_type": "new_relation",
-                    "description": (
-                        f"新增关系: {rel['source']} -[{rel['rel_type']}]-> {rel['target']} "
-                        f"(权重:{rel.get('weight', '?')}, 情感:{rel.get('sentiment', '?')})"
-                    ),
-                    "timestamp": rel.get("created_at", ""),
-                }
-            )
-
-        # 最近更新的关系（created_at < cutoff 但 updated_at >= cutoff）
-        updated_rels_cypher = (
-            "MATCH (s {user_id: $user_id})-[r]->(t {user_id: $user_id}) "
-            "WHERE r.updated_at >= $cutoff AND r.created_at < $cutoff "
-            "RETURN s.name AS source, type(r) AS rel_type, t.name AS target, "
-            "r.updated_at AS updated_at, r.weight AS weight, r.sentiment AS sentiment"
-        )
-        updated_rels = self.neo4j.run_query(
-            updated_rels_cypher, {"user_id": user_id, "cutoff": cutoff_iso}
-        )
-        for rel in updated_rels:
-            changes.append(
-                {
-                    "change_type": "updated_relation",
-                    "description": (
-                        f"关系更新: {rel['source']} -[{rel['rel_type']}]-> {rel['target']} "
-                        f"(当前权重:{rel.get('weight', '?')}, 情感:{rel.get('sentiment', '?')})"
-                    ),
-                    "timestamp": rel.get("updated_at", ""),
-                }
-            )
+        logger.info(f"Read {len(changes)} graph changes for user {user_id} (since_seq={since_seq}, hours={hours}).")
+        return changes
 
-        logger.info(f"Detected {len(changes)} graph changes in last {hours}h for user {user_id}.")
+    async def adetect_changes(
+        self,
+        user_id: str,
+        hours: Optional[int] = 24,
+        since_seq: Optional[int] = None,
+        limit: int = 500,
+        latest_first: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """detect_changes 的异步版本。"""
+        query = self._changes_query(hours, since_seq, limit, latest_first)
+
+        async def _read():
+            return self._parse_changes(await self.store.aread_changes(user_id, **query))
+
+        changes = await self._acached(user_id, ("changes", *sorted(query.items())), _read)
+        logger.info(f"Read {len(changes)} graph changes for user {user_id} (since_seq={since_seq}, hours={hours}).")
         return changes
 
+    @staticmethod
+    def _changes_query(
+        hours: Optional[int], since_seq: Optional[int], limit: int, latest_first: bool
+    ) -> Dict[str, Any]:
+        """
+        构造 GraphStore.read_changes 的过滤参数：优先按序号游标，否则按时间窗口。
+        时间窗口起点向下取整到分钟，使一分钟内的重复查询命中同一个缓存项。
+        """
+        query: Dict[str, Any] = {"limit": limit, "latest_first": latest_first}
+        if since_seq is not None:
+            query["since_seq"] = since_seq
+        else:
+            cutoff = datetime.now(timezone.utc) - timedelta(hours=hours or 24)
+            query["cutoff_iso"] = cutoff.replace(second=0, microsecond=0).isoformat()
+        return query
+
+    @staticmethod
+    def _parse_changes(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "seq": r["seq"],
+                "change_type": r.get("change_type") or "",
+                "description": r.get("description") or "",
+                "timestamp": r.get("timestamp") or "",
+            }
+            for r in rows
+        ]
+
     # ==================================================================
     # 8. 中心性 / 洞察分析
     # ==================================================================
@@ -575,32 +1357,18 @@ class GraphEngine:
     def get_centrality_analysis(self, user_id: str) -> Dict[str, Any]:
         """
         计算图谱洞察：
-        - 关键人物（按连接数排序）
+        - 关键人物（按加权 PageRank 排序，附介数中心性与带符号影响力）
         - 风险关系（负面情感 / 高权重对抗）
-        - 孤立节点
+        - 近期变化
+        结果按图谱版本缓存。
         """
-        # 度中心性（简化版：统计连接数）
-        degree_cypher = (
-            "MATCH (p:Person {user_id: $user_id})-[r]-() "
-            "RETURN p.name AS name, count(r) AS degree "
-            "ORDER BY degree DESC LIMIT 10"
-        )
-        degree_results = self.neo4j.run_query(degree_cypher, {"user_id": user_id})
+        return self._cached(user_id, ("insights",), lambda: self._compute_insights(user_id))
 
-        key_players = [
-            {"name": r["name"], "centrality": r["degree"]}
-            for r in degree_results
-        ]
+    def _compute_insights(self, user_id: str) -> Dict[str, Any]:
+        key_players = self._rank_key_players(user_id)
 
         # 风险关系
-        risk_cypher = (
-            "MATCH (s {user_id: $user_id})-[r]->(t {user_id: $user_id}) "
-            "WHERE r.sentiment = 'negative' OR type(r) IN ['COMPETES_WITH', 'DISTRUSTS', 'BLOCKS', 'OPPOSED'] "
-            "RETURN s.name AS source, type(r) AS rel_type, t.name AS target, "
-            "r.weight AS weight, r.sentiment AS sentiment, r.evidence AS evidence "
-            "ORDER BY r.weight DESC"
-        )
-        risk_results = self.neo4j.run_query(risk_cypher, {"user_id": user_id})
+        risk_results = self.store.risk_relations(user_id)
 
         risk_relations = [
             {
@@ -615,8 +1383,8 @@ class GraphEngine:
             for r in risk_results
         ]
 
-        # 近期变化
-        recent_changes = self.detect_changes(user_id, hours=72)
+        # 近期变化（变更日志中最近 72 小时的最新 20 条）
+        recent_changes = self.detect_changes(user_id, hours=72, limit=20, latest_first=True)
 
         return {
             "key_players": key_players,
@@ -627,22 +1395,256 @@ class GraphEngine:
             ],
         }
 
+    def _rank_key_players(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        基于用户图谱快照计算中心性，返回 PageRank 最高的人物。
+        上次计算之后的变更不多时读取这些变更，交给 CentralityCalculator 做增量重算。
+        """
+        seq = self.get_change_seq(user_id)
+        previous = self._centrality.previous(user_id)
+        changes = None
+        if previous is not None and 0 <= seq - previous.seq <= self._centrality.incremental_max_changes:
+            changes = self.store.read_changes(
+                user_id, since_seq=previous.seq, until_seq=seq, limit=self._centrality.incremental_max_changes + 1
+            )
+        snapshot = GraphSnapshot(self.store.fetch_nodes(user_id), self.store.fetch_edges(user_id))
+        metrics = self._centrality.compute(user_id, seq, snapshot, changes)
+        logger.debug(
+            f"Centrality computed for user {user_id}: {snapshot.size} nodes, "
+            f"{metrics['iterations']} PageRank iterations (incremental={metrics['incremental']})"
+        )
+
+        pagerank = metrics["pagerank"]
+        top = pagerank.max() if snapshot.size else 0.0
+        players = [
+            i for i in range(snapshot.size)
+            if snapshot.types[i] == "Person" and metrics["degree"][i] > 0
+        ]
+        players.sort(key=lambda i: pagerank[i], reverse=True)
+        return [
+            {
+                "name": snapshot.names[i],
+                "centrality": round(float(pagerank[i] / top), 4),
+                "pagerank": round(float(pagerank[i]), 6),
+                "betweenness": round(float(metrics["betweenness"][i]), 4),
+                "influence": round(float(metrics["influence"][i]), 4),
+                "degree": int(metrics["degree"][i]),
+            }
+            for i in players[:limit]
+        ]
+
     # ==================================================================
     # 9. 删除操作
     # ==================================================================
 
-    def clear_graph(self, user_id: str):
-        """清空用户的全部图谱数据。"""
-        cypher = (
-            "MATCH (n {user_id: $user_id}) DETACH DELETE n"
+    def clear_graph(self, user_id: str, wait: bool = False) -> Dict[str, Any]:
+        """
+        清空用户的全部图谱数据。
+        在后台线程中按 GRAPH_CLEAR_BATCH_SIZE 分批删除（每批一个事务），立即返回作业状态；
+        清空期间该用户的图谱写入暂存到发件箱，作业结束后按顺序回放。已有进行中的作业时返回该作业。
+        wait=True 时等待作业结束（供脚本使用）。
+        """
+        with self._clear_lock:
+            job = self._clear_jobs.get(user_id)
+            if job is None or job["status"] != "clearing":
+                job = {
+                    "user_id": user_id,
+                    "status": "clearing",
+                    "relations": 0,
+                    "entities": 0,
+                    "evidence": 0,
+                    "batches": 0,
+                    "error": None,
+                    "started_at": datetime.now(timezone.utc).isoformat(),
+                    "finished_at": None,
+                    "cancel": threading.Event(),
+                    # 作业开始前已在发件箱中的记录（id 不大于该值）早于本次清空
+                    "outbox_floor": self.db.last_graph_outbox_id(user_id),
+                }
+                job["thread"] = threading.Thread(
+                    target=self._run_clear, args=(user_id, job), name=f"graph-clear-{user_id}", daemon=True
+                )
+                self._clear_jobs[user_id] = job
+                job["thread"].start()
+                logger.info(f"Started clearing graph for user {user_id} (batch size {self.clear_batch_size}).")
+        if wait:
+            job["thread"].join()
+        return self.get_clear_status(user_id)
+
+    def get_clear_status(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """最近一次清空作业的状态：clearing / completed / cancelled / failed 及已删除的关系、实体、证据数。"""
+        with self._clear_lock:
+            job = self._clear_jobs.get(user_id)
+            if job is None:
+                return None
+            return {k: v for k, v in job.items() if k not in ("cancel", "thread", "outbox_floor")}
+
+    def cancel_clear(self, user_id: str) -> bool:
+        """在当前批次完成后停止清空；已删除的数据不会恢复。没有进行中的作业时返回 False。"""
+        with self._clear_lock:
+            job = self._clear_jobs.get(user_id)
+            if job is None or job["status"] != "clearing":
+                return False
+            job["cancel"].set()
+            return True
+
+    def is_clearing(self, user_id: str) -> bool:
+        with self._clear_lock:
+            job = self._clear_jobs.get(user_id)
+            return job is not None and job["status"] == "clearing"
+
+    def _run_clear(self, user_id: str, job: Dict[str, Any]):
+        status, error = "completed", None
+        try:
+            while True:
+                if job["cancel"].is_set():
+                    status = "cancelled"
+                    break
+                # 每批经写入队列执行，与该用户的其它写操作串行
+                deleted = self._write_queue.submit(
+                    user_id, lambda: self.store.clear_batch(user_id, self.clear_batch_size)
+                )
+                with self._clear_lock:
+                    job["batches"] += 1
+                    for key, count in deleted.items():
+                        job[key] += count
+                if not any(deleted.values()):
+                    break
+                self._mark_graph_changed(user_id)  # 清空进行中的读取不返回已删除数据的缓存
+        except Exception as e:
+            logger.error(f"Clearing graph for user {user_id} failed: {e}", exc_info=True)
+            status, error = "failed", str(e)
+
+        if status == "completed":
+            change = {"change_type": "cleared", "description": "清空图谱"}
+            self.db.delete_entity_aliases(user_id)
+            # 清空开始前暂存、尚未回放的写入早于本次清空，一并丢弃；清空期间暂存的写入保留
+            self.db.discard_graph_outbox(user_id, max_id=job["outbox_floor"])
+        else:
+            # 部分删除无法从变更记录回放：增量同步时强制全量，并物化一个检查点
+            change = {"change_type": "partially_cleared", "description": f"清空图谱中止（{status}），部分数据已删除"}
+        self._append_changes(user_id, [change], datetime.now(timezone.utc).isoformat())
+        self._mark_graph_changed(user_id)
+        self._maybe_checkpoint(user_id, force=status != "completed")
+        self._entity_index.invalidate(user_id)
+        self._alias_index.invalidate(user_id)
+        with self._clear_lock:
+            job.update(status=status, error=error, finished_at=datetime.now(timezone.utc).isoformat())
+        # 回放清空期间暂存的写入（按到达顺序，排在清空之后）
+        with self._outbox_lock:
+            pending = bool(self.db.list_graph_outbox(user_id, limit=1))
+            if pending:
+                self._outbox_users.add(user_id)
+            else:
+                self._outbox_users.discard(user_id)
+        if pending:
+            self._ensure_reconnector()
+            self._outbox_wakeup.set()
+        logger.info(
+            f"Clearing graph for user {user_id} {status}: {job['relations']} relations, "
+            f"{job['entities']} entities, {job['evidence']} evidence records in {job['batches']} batches."
         )
-        self.neo4j.run_write(cypher, {"user_id": user_id})
-        logger.info(f"Cleared all graph data for user {user_id}.")
 
     def delete_entity(self, user_id: str, entity_name: str):
-        """删除指定实体及其所有关系。"""
-        cypher = (
-            "MATCH (n {user_id: $user_id, name: $name}) DETACH DELETE n"
+        """删除指定实体及其所有关系（高度数实体的关系分批删除）。经写入队列执行，不与该用户的合并写入并发。"""
+        self._write_queue.submit(user_id, partial(self._delete_entity, user_id, entity_name))
+
+    def _delete_entity(self, user_id: str, entity_name: str):
+        deleted = self.store.delete_entity(user_id, entity_name, batch_size=self.clear_batch_size)
+        self._append_changes(
+            user_id,
+            [
+                {
+                    "change_type": "deleted_entity",
+                    "entity_type": row["type"],
+                    "name": entity_name,
+                    "node_id": row["node_id"],
+                    "description": f"删除{row['type']}: {entity_name}",
+                }
+                for row in deleted
+            ],
+            datetime.now(timezone.utc).isoformat(),
         )
-        self.neo4j.run_write(cypher, {"user_id": user_id, "name": entity_name})
+        self.db.delete_entity_aliases(user_id, entity_name)
+        self._mark_graph_changed(user_id)
+        self._maybe_checkpoint(user_id)
+        self._entity_index.invalidate(user_id)
+        self._alias_index.invalidate(user_id)
         logger.info(f"Deleted entity '{entity_name}' for user {user_id}.")
+
+    # ==================================================================
+    # 10. 重复实体合并
+    # ==================================================================
+
+    def consolidate_duplicates(self, user_id: str, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        批量合并已有的重复实体（同类型、按别名解析规则视为同一实体，如“陈总”与“Chen总”）。
+        每组保留关系最多的实体作为规范实体，其余实体的关系与证据记录按
+        GRAPH_CONSOLIDATE_BATCH_SIZE 分批改挂到规范实体后删除，原名称记为别名。
+        dry_run=True 时只返回分组结果，不做修改。
+        返回 {"clusters": [{"type", "canonical", "duplicates"}], "merged": 合并实体数, "relations": 改挂关系数}
+        """
+        rows = self.store.entity_index_rows(user_id)
+        degree = {r["name"]: len(r.get("neighbors") or []) for r in rows}
+        self._alias_index.load_user(user_id, rows, self.db.list_entity_aliases(user_id))
+
+        clusters = []
+        for etype, names in self._alias_index.duplicate_groups(user_id):
+            ordered = sorted(names, key=lambda n: (-degree.get(n, 0), len(n), n))
+            clusters.append({"type": etype, "canonical": ordered[0], "duplicates": ordered[1:]})
+        if dry_run or not clusters:
+            return {"clusters": clusters, "merged": 0, "relations": 0}
+
+        merged = moved = 0
+        try:
+            for cluster in clusters:
+                for duplicate in cluster["duplicates"]:
+                    # 每个重复实体的合并作为一项写操作经写入队列执行，期间不与该用户的合并写入并发
+                    result = self._write_queue.submit(
+                        user_id, partial(self._merge_duplicate, user_id, cluster, duplicate)
+                    )
+                    if result is None:
+                        continue
+                    merged += 1
+                    moved += result["relations"]
+        finally:
+            if merged:
+                self._mark_graph_changed(user_id)
+                # 合并时关系属性的取舍无法从变更记录精确回放，合并后立即物化一个检查点
+                self._maybe_checkpoint(user_id, force=True)
+            self._entity_index.invalidate(user_id)
+            self._alias_index.invalidate(user_id)
+
+        logger.info(
+            f"Consolidated {merged} duplicate entities in {len(clusters)} clusters for user {user_id} "
+            f"({moved} relations moved)."
+        )
+        return {"clusters": clusters, "merged": merged, "relations": moved}
+
+    def _merge_duplicate(self, user_id: str, cluster: Dict[str, Any], duplicate: str) -> Optional[Dict[str, Any]]:
+        """把一个重复实体并入规范实体，记录变更并把原名称记为别名；实体已不存在时返回 None。"""
+        canonical = cluster["canonical"]
+        result = self.store.merge_entity_into(
+            user_id, duplicate, canonical, batch_size=self.consolidate_batch_size, etype=cluster["type"]
+        )
+        if result is None:
+            return None
+        self._append_changes(
+            user_id,
+            [
+                {
+                    "change_type": "merged_entity",
+                    "entity_type": cluster["type"],
+                    "name": duplicate,
+                    "into": canonical,
+                    "node_id": result["node_id"],
+                    "description": f"合并{cluster['type']}: {duplicate} → {canonical}",
+                }
+            ],
+            datetime.now(timezone.utc).isoformat(),
+        )
+        self.db.repoint_entity_aliases(user_id, duplicate, canonical)
+        self.db.save_entity_aliases(
+            user_id, [{"alias": duplicate, "canonical_name": canonical, "entity_type": cluster["type"]}]
+        )
+        return result
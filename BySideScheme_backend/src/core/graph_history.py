@@ -0,0 +1,151 @@
+import base64
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+# (source, rel_type, target)
+EdgeKey = Tuple[str, str, str]
+
+# 关系上随变更日志记录的可变属性
+RELATION_FIELDS = ("weight", "sentiment", "confidence")
+
+
+def relation_delta(current: Dict[str, Any], before: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """关系属性增量：新建时为全部属性，更新时只保留取值变化的字段。"""
+    if before is None:
+        return {k: current[k] for k in RELATION_FIELDS}
+    return {k: current[k] for k in RELATION_FIELDS if before.get(k) != current[k]}
+
+
+def _loads(value: Any) -> Dict[str, Any]:
+    """变更记录中的 props / delta 以 JSON 字符串保存（Neo4j 属性不支持嵌套 map）。"""
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return value
+    return json.loads(value)
+
+
+class GraphState:
+    """
+    按名称索引的图谱状态，用于时间点查询：
+    从物化检查点解码，再按序回放其后的变更记录，得到任意时刻的图谱。
+    不含证据原文（完整证据历史通过证据分页接口读取）。
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict[str, Any]] = {}  # name -> {"id", "type", "properties"}
+        self.edges: Dict[EdgeKey, Dict[str, Any]] = {}  # key -> {"id", "weight", "sentiment", "confidence"}
+
+    @classmethod
+    def from_graph(cls, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> "GraphState":
+        """由 GraphStore.fetch_nodes / fetch_edges 的结果构建。"""
+        state = cls()
+        names = {}
+        for node in nodes:
+            names[node["id"]] = node["name"]
+            state.nodes[node["name"]] = {
+                "id": node["id"],
+                "type": node["type"],
+                "properties": node.get("properties", {}),
+            }
+        for edge in edges:
+            source, target = names.get(edge["source"]), names.get(edge["target"])
+            if source is None or target is None:
+                continue
+            state.edges[(source, edge["type"], target)] = {
+                "id": edge.get("id"),
+                **{k: edge.get(k) for k in RELATION_FIELDS},
+            }
+        return state
+
+    # ------------------------------------------------------------------
+    # 检查点编码：zlib 压缩的列表式 JSON（base64，便于存为字符串属性）
+    # ------------------------------------------------------------------
+
+    def encode(self) -> str:
+        payload = {
+            "nodes": [[name, n["id"], n["type"], n["properties"]] for name, n in self.nodes.items()],
+            "edges": [[*key, e["id"], *(e.get(k) for k in RELATION_FIELDS)] for key, e in self.edges.items()],
+        }
+        raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        return base64.b64encode(zlib.compress(raw)).decode("ascii")
+
+    @classmethod
+    def decode(cls, data: str) -> "GraphState":
+        payload = json.loads(zlib.decompress(base64.b64decode(data)).decode("utf-8"))
+        state = cls()
+        for name, node_id, etype, props in payload["nodes"]:
+            state.nodes[name] = {"id": node_id, "type": etype, "properties": props}
+        for source, rel_type, target, edge_id, *values in payload["edges"]:
+            state.edges[(source, rel_type, target)] = {"id": edge_id, **dict(zip(RELATION_FIELDS, values))}
+        return state
+
+    # ------------------------------------------------------------------
+    # 回放
+    # ------------------------------------------------------------------
+
+    def apply(self, change: Dict[str, Any]):
+        """回放一条变更记录（GraphStore.read_changes 的返回格式）。"""
+        change_type = change.get("change_type")
+        if change_type in ("new_entity", "updated_entity"):
+            name = change["name"]
+            node = self.nodes.setdefault(
+                name, {"id": change.get("node_id") or f"name:{name}", "type": "Unknown", "properties": {}}
+            )
+            node["type"] = change.get("entity_type") or node["type"]
+            node["properties"] = {**node["properties"], **_loads(change.get("props"))}
+        elif change_type in ("new_relation", "updated_relation"):
+            key = (change["source"], change["rel_type"], change["target"])
+            edge = self.edges.setdefault(
+                key,
+                {"id": change.get("edge_id") or "|".join(key), "weight": 0.5, "sentiment": "neutral", "confidence": 0.5},
+            )
+            edge.update(_loads(change.get("delta")))
+        elif change_type == "deleted_entity":
+            self._remove_node(change["name"])
+        elif change_type == "merged_entity":
+            self._merge_node(change["name"], change.get("into"))
+        elif change_type == "cleared":
+            self.nodes.clear()
+            self.edges.clear()
+
+    def _remove_node(self, name: str):
+        self.nodes.pop(name, None)
+        for key in [k for k in self.edges if name in (k[0], k[2])]:
+            del self.edges[key]
+
+    def _merge_node(self, name: str, into: Optional[str]):
+        """重复实体合并：关系改挂到规范实体（已存在同类关系时保留规范实体的那条）。"""
+        if into and into in self.nodes:
+            for key in [k for k in self.edges if name in (k[0], k[2])]:
+                edge = self.edges.pop(key)
+                new_key = tuple(into if part == name else part for part in key)
+                if new_key[0] != new_key[2]:
+                    self.edges.setdefault(new_key, edge)
+        self._remove_node(name)
+
+    def to_graph_data(self) -> Dict[str, Any]:
+        """转换为 GET /graph 的 nodes / edges 格式。"""
+        nodes = [
+            {"id": str(n["id"]), "name": name, "type": n["type"], "properties": n["properties"]}
+            for name, n in self.nodes.items()
+        ]
+        edges = []
+        for (source, rel_type, target), e in self.edges.items():
+            if source not in self.nodes or target not in self.nodes:
+                continue
+            edges.append(
+                {
+                    "id": str(e["id"]),
+                    "source": str(self.nodes[source]["id"]),
+                    "target": str(self.nodes[target]["id"]),
+                    "type": rel_type,
+                    "weight": float(e["weight"]) if e.get("weight") is not None else 0.5,
+                    "sentiment": e.get("sentiment") or "neutral",
+                    "confidence": float(e["confidence"]) if e.get("confidence") is not None else 0.5,
+                    "evidence": [],
+                    "evidence_count": 0,
+                }
+            )
+        return {"nodes": nodes, "edges": edges}
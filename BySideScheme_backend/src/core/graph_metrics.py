@@ -0,0 +1,253 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+from src.core.graph_store import RISK_RELATION_TYPES
+
+# 情感未标注（neutral）时按关系类型判断正负
+POSITIVE_RELATION_TYPES = ("ALLIES_WITH", "TRUSTS", "SUPPORTS", "INFLUENCES")
+
+# 只改变权重、不改变拓扑的变更类型：介数中心性（按跳数计算）可直接复用
+_WEIGHT_ONLY_CHANGES = ("updated_entity", "updated_relation")
+
+
+def _edge_sign(edge: Dict[str, Any]) -> float:
+    sentiment = edge.get("sentiment")
+    if sentiment == "positive":
+        return 1.0
+    if sentiment == "negative":
+        return -1.0
+    if edge.get("type") in RISK_RELATION_TYPES:
+        return -1.0
+    if edge.get("type") in POSITIVE_RELATION_TYPES:
+        return 1.0
+    return 0.0
+
+
+class GraphSnapshot:
+    """
+    用户图谱的稀疏矩阵快照（由 GraphStore.fetch_nodes / fetch_edges 的结果构建）：
+    - weighted: 对称化的关系强度矩阵（weight × confidence），重要性沿关系双向传递
+    - adjacency: 对称化的 0/1 邻接矩阵，用于最短路径计数
+    - signed: 有向的带符号强度矩阵（正面 +，负面 -），signed[i, j] 表示 i 对 j 的态度
+    """
+
+    def __init__(self, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]):
+        self.names = [n["name"] for n in nodes]
+        self.types = [n["type"] for n in nodes]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        n = len(nodes)
+        position = {n["id"]: i for i, n in enumerate(nodes)}
+
+        rows, cols, strength, sign = [], [], [], []
+        for e in edges:
+            s, t = position.get(e["source"]), position.get(e["target"])
+            if s is None or t is None or s == t:
+                continue
+            rows.append(s)
+            cols.append(t)
+            strength.append(float(e.get("weight", 0.5)) * float(e.get("confidence", 0.5)))
+            sign.append(_edge_sign(e))
+
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        strength = np.asarray(strength, dtype=np.float64)
+        sign = np.asarray(sign, dtype=np.float64)
+
+        directed = sp.csr_matrix((strength, (rows, cols)), shape=(n, n))
+        self.weighted = (directed + directed.T).tocsr()
+        self.adjacency = (self.weighted > 0).astype(np.float64).tocsr()
+        self.signed = sp.csr_matrix((strength * sign, (rows, cols)), shape=(n, n))
+        self.degree = np.asarray(self.adjacency.sum(axis=1)).ravel()
+
+    @property
+    def size(self) -> int:
+        return len(self.names)
+
+
+def weighted_pagerank(
+    snapshot: GraphSnapshot,
+    damping: float = 0.85,
+    tol: float = 1e-8,
+    max_iter: int = 100,
+    start: Optional[np.ndarray] = None,
+):
+    """
+    加权 PageRank（幂迭代）。start 为上一次的结果时从它开始迭代（热启动），
+    小幅合并后通常几轮即收敛。返回 (scores, 迭代次数)。
+    """
+    n = snapshot.size
+    if n == 0:
+        return np.zeros(0), 0
+    out_strength = np.asarray(snapshot.weighted.sum(axis=1)).ravel()
+    dangling = out_strength == 0
+    inv = np.divide(1.0, out_strength, out=np.zeros(n), where=~dangling)
+    transition_t = (sp.diags(inv) @ snapshot.weighted).T.tocsr()
+
+    x = np.full(n, 1.0 / n) if start is None else start / start.sum()
+    teleport = (1.0 - damping) / n
+    for iteration in range(1, max_iter + 1):
+        x_next = damping * (transition_t @ x) + damping * x[dangling].sum() / n + teleport
+        if np.abs(x_next - x).sum() < tol * n:
+            return x_next, iteration
+        x = x_next
+    return x, max_iter
+
+
+def sampled_betweenness(
+    snapshot: GraphSnapshot,
+    samples: int = 256,
+    batch_size: int = 64,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    介数中心性（Brandes 算法，按跳数计最短路径，归一化到 [0, 1]）。
+    - 节点数不超过 samples 时精确计算，否则随机抽取 samples 个源点并按比例放大
+    - 每批 batch_size 个源点作为矩阵的列，BFS 的逐层扩展与依赖回传都是稀疏矩阵乘法
+    """
+    n = snapshot.size
+    scores = np.zeros(n)
+    if n < 3:
+        return scores
+    if n <= samples:
+        sources = np.arange(n)
+    else:
+        sources = np.random.default_rng(seed).choice(n, size=samples, replace=False)
+
+    adjacency = snapshot.adjacency
+    for start in range(0, len(sources), batch_size):
+        batch = sources[start:start + batch_size]
+        cols = np.arange(len(batch))
+        sigma = np.zeros((n, len(batch)))
+        dist = np.full((n, len(batch)), -1, dtype=np.int64)
+        sigma[batch, cols] = 1.0
+        dist[batch, cols] = 0
+
+        # 正向：逐层 BFS，同时累计最短路径条数
+        frontier = sigma.copy()
+        depth = 0
+        while True:
+            reached = adjacency @ frontier
+            new = (reached > 0) & (dist < 0)
+            if not new.any():
+                break
+            depth += 1
+            dist[new] = depth
+            frontier = np.where(new, reached, 0.0)
+            sigma += frontier
+
+        # 反向：由远及近回传依赖值 delta
+        delta = np.zeros((n, len(batch)))
+        for level in range(depth, 0, -1):
+            coef = np.where(dist == level, (1.0 + delta) / np.where(sigma > 0, sigma, 1.0), 0.0)
+            delta += np.where(dist == level - 1, sigma * (adjacency @ coef), 0.0)
+        delta[batch, cols] = 0.0
+        scores += delta.sum(axis=1)
+
+    # 无向图每对节点被计两次；抽样时按 n / samples 放大
+    scores *= (n / len(sources)) / 2.0
+    return scores / ((n - 1) * (n - 2) / 2.0)
+
+
+def signed_influence(snapshot: GraphSnapshot, pagerank: np.ndarray) -> np.ndarray:
+    """
+    带符号影响力：来自其他节点的态度按对方的 PageRank 加权求和，再除以最大值归一化到 [-1, 1]。
+    正值表示被重要人物支持/信任，负值表示被重要人物反对/竞争。
+    """
+    if snapshot.size == 0:
+        return np.zeros(0)
+    received = snapshot.signed.T @ pagerank
+    scale = np.abs(received).max()
+    return received / scale if scale > 0 else received
+
+
+class CentralityState:
+    """某个用户最近一次的中心性计算结果，用于增量重算。"""
+
+    def __init__(self, seq: int, names: List[str], pagerank: np.ndarray, betweenness: np.ndarray):
+        self.seq = seq
+        self.names = names
+        self.pagerank = pagerank
+        self.betweenness = betweenness
+
+    def align(self, values: np.ndarray, snapshot: GraphSnapshot, fill: float) -> np.ndarray:
+        """按名称把旧结果映射到新快照的节点顺序，新增节点取 fill。"""
+        previous = dict(zip(self.names, values))
+        return np.array([previous.get(name, fill) for name in snapshot.names], dtype=np.float64)
+
+
+class CentralityCalculator:
+    """
+    进程内中心性计算：
+    - 加权 PageRank：小幅合并后以上次结果热启动
+    - 介数中心性：期间只有权重/属性更新时直接复用，否则重算（大图抽样）
+    - 带符号影响力：基于最新 PageRank 计算，开销可忽略
+    每个用户保留最近一次结果，总数按 LRU 限制。
+    """
+
+    def __init__(
+        self,
+        damping: float = 0.85,
+        betweenness_samples: int = 256,
+        incremental_max_changes: int = 50,
+        max_users: int = 256,
+    ):
+        self.damping = damping
+        self.betweenness_samples = betweenness_samples
+        self.incremental_max_changes = incremental_max_changes
+        self.max_users = max_users
+        self._states: "OrderedDict[str, CentralityState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def previous(self, user_id: str) -> Optional[CentralityState]:
+        with self._lock:
+            return self._states.get(user_id)
+
+    def compute(
+        self,
+        user_id: str,
+        seq: int,
+        snapshot: GraphSnapshot,
+        changes: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        changes 为上次计算以来的变更记录（调用方读取不到或变更过多时传 None，全量重算）。
+        返回 {"pagerank", "betweenness", "influence", "degree", "iterations", "incremental"}。
+        """
+        state = self.previous(user_id)
+        incremental = (
+            state is not None
+            and changes is not None
+            and len(changes) <= self.incremental_max_changes
+            and not any(c.get("change_type") == "cleared" for c in changes)
+        )
+
+        start = state.align(state.pagerank, snapshot, 1.0 / max(snapshot.size, 1)) if incremental else None
+        pagerank, iterations = weighted_pagerank(snapshot, damping=self.damping, start=start)
+
+        if incremental and all(c.get("change_type") in _WEIGHT_ONLY_CHANGES for c in changes):
+            betweenness = state.align(state.betweenness, snapshot, 0.0)
+        else:
+            betweenness = sampled_betweenness(snapshot, samples=self.betweenness_samples)
+
+        with self._lock:
+            self._states[user_id] = CentralityState(seq, snapshot.names, pagerank, betweenness)
+            self._states.move_to_end(user_id)
+            while len(self._states) > self.max_users:
+                self._states.popitem(last=False)
+
+        return {
+            "pagerank": pagerank,
+            "betweenness": betweenness,
+            "influence": signed_influence(snapshot, pagerank),
+            "degree": snapshot.degree,
+            "iterations": iterations,
+            "incremental": incremental,
+        }
+
+    def forget(self, user_id: str):
+        with self._lock:
+            self._states.pop(user_id, None)
@@ -0,0 +1,132 @@
+"""
+图谱数据迁移。
+
+每个迁移按名称记录在 (:SchemaMigration {name}) 节点中，已完成的迁移启动时直接跳过。
+迁移语句使用 CALL { ... } IN TRANSACTIONS 分批提交，并以“尚未迁移”作为匹配条件，
+中途中断后重新执行即可从剩余数据继续（可重入、可恢复）。
+
+应用启动时由 ServiceContainer 自动执行，也可以手动运行：
+    python -m src.core.graph_migrations
+"""
+import os
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+
+from src.core.graph_schema import ENTITY_LABEL, VALID_NODE_TYPES
+from src.core.graph_store import EVIDENCE_RING_SIZE
+from src.core.logger import logger
+from src.core.neo4j_client import Neo4jClient
+
+DEFAULT_BATCH_SIZE = int(os.getenv("GRAPH_MIGRATION_BATCH_SIZE", "1000"))
+
+
+def _backfill_entity_label(neo4j: Neo4jClient, batch_size: int):
+    """为历史实体节点补充共享的 Entity 标签。"""
+    for label in sorted(VALID_NODE_TYPES):
+        rows = neo4j.run_auto_commit(
+            f"MATCH (n:{label}) WHERE n.user_id IS NOT NULL AND NOT n:{ENTITY_LABEL} "
+            f"CALL {{ WITH n SET n:{ENTITY_LABEL} }} IN TRANSACTIONS OF $batch_size ROWS "
+            f"RETURN count(*) AS updated",
+            {"batch_size": batch_size},
+        )
+        updated = rows[0]["updated"] if rows else 0
+        logger.info(f"Entity label backfill: {updated} {label} nodes updated.")
+
+
+def _split_relation_evidence(neo4j: Neo4jClient, batch_size: int):
+    """
+    把关系上的历史 evidence 列表拆成 (:Evidence) 记录，关系上只保留最近几条并记录总数。
+    列表中的重复原文只保留第一次出现；证据时间取关系的创建（或更新）时间加上其在列表中的位置（毫秒），
+    保持原列表的先后顺序。
+    """
+    base = f"coalesce({_as_datetime('r.created_at')}, {_as_datetime('r.updated_at')}, datetime({{epochMillis: 0}}))"
+    rows = neo4j.run_auto_commit(
+        f"MATCH (s:{ENTITY_LABEL})-[r]->(t:{ENTITY_LABEL}) "
+        "WHERE s.user_id IS NOT NULL AND r.evidence_count IS NULL "
+        "CALL { "
+        "WITH s, r, t "
+        "WITH s, r, t, reduce(acc = [], e IN coalesce(r.evidence, []) | "
+        "CASE WHEN e = '' OR e IN acc THEN acc ELSE acc + e END) AS history, "
+        f"{base} AS base "
+        "FOREACH (i IN range(0, size(history) - 1) | "
+        "CREATE (:Evidence {user_id: s.user_id, source: s.name, rel_type: type(r), target: t.name, "
+        "text: history[i], created_at: base + duration({milliseconds: i})})) "
+        "SET r.evidence_count = size(history), r.evidence = history[-$ring..] "
+        "} IN TRANSACTIONS OF $batch_size ROWS "
+        "RETURN count(*) AS updated",
+        {"batch_size": batch_size, "ring": EVIDENCE_RING_SIZE},
+    )
+    updated = rows[0]["updated"] if rows else 0
+    logger.info(f"Evidence split: {updated} relationships updated.")
+
+
+def _as_datetime(expr: str) -> str:
+    """Cypher 表达式：ISO 字符串转为原生 datetime，空串置空，已是 datetime 的保持不变。"""
+    return (
+        f"CASE WHEN {expr} = toString({expr}) "
+        f"THEN CASE WHEN {expr} = '' THEN null ELSE datetime({expr}) END ELSE {expr} END"
+    )
+
+
+# (描述, MATCH 子句, 变量名, 时间戳字段)
+_TIMESTAMP_TARGETS = (
+    ("entities", f"MATCH (x:{ENTITY_LABEL}) WHERE x.user_id IS NOT NULL", "x", ("created_at", "updated_at")),
+    (
+        "relationships",
+        f"MATCH (s:{ENTITY_LABEL})-[x]->(:{ENTITY_LABEL}) WHERE s.user_id IS NOT NULL",
+        "x",
+        ("created_at", "updated_at"),
+    ),
+    ("evidence records", "MATCH (x:Evidence) WHERE x.user_id IS NOT NULL", "x", ("created_at",)),
+    ("change records", "MATCH (x:GraphChange) WHERE x.user_id IS NOT NULL", "x", ("timestamp",)),
+    ("checkpoints", "MATCH (x:GraphCheckpoint) WHERE x.user_id IS NOT NULL", "x", ("timestamp",)),
+)
+
+
+def _native_timestamps(neo4j: Neo4jClient, batch_size: int):
+    """把 ISO 字符串形式的历史时间戳改写为原生 datetime，使时间窗口查询与排序可以走范围索引。"""
+    for description, match, var, fields in _TIMESTAMP_TARGETS:
+        pending = " OR ".join(f"{var}.{f} = toString({var}.{f})" for f in fields)
+        assignments = ", ".join(f"{var}.{f} = {_as_datetime(f'{var}.{f}')}" for f in fields)
+        rows = neo4j.run_auto_commit(
+            f"{match} AND ({pending}) "
+            f"CALL {{ WITH {var} SET {assignments} }} IN TRANSACTIONS OF $batch_size ROWS "
+            f"RETURN count(*) AS updated",
+            {"batch_size": batch_size},
+        )
+        updated = rows[0]["updated"] if rows else 0
+        logger.info(f"Native timestamps: {updated} {description} updated.")
+
+
+# (迁移名, 执行函数)，按顺序执行；新增迁移只能追加到末尾
+MIGRATIONS: List[Tuple[str, Callable[[Neo4jClient, int], None]]] = [
+    ("0001_entity_label_backfill", _backfill_entity_label),
+    ("0002_split_relation_evidence", _split_relation_evidence),
+    ("0003_native_timestamps", _native_timestamps),
+]
+
+
+def run_migrations(neo4j: Neo4jClient, batch_size: int = DEFAULT_BATCH_SIZE):
+    """执行所有尚未完成的迁移。"""
+    done = {
+        r["name"]
+        for r in neo4j.run_query("MATCH (m:SchemaMigration) RETURN m.name AS name")
+    }
+    for name, migrate in MIGRATIONS:
+        if name in done:
+            continue
+        logger.info(f"Running graph migration {name} (batch_size={batch_size})...")
+        migrate(neo4j, batch_size)
+        neo4j.run_write(
+            "MERGE (m:SchemaMigration {name: $name}) SET m.completed_at = $now",
+            {"name": name, "now": datetime.now(timezone.utc).isoformat()},
+        )
+        logger.info(f"Graph migration {name} completed.")
+
+
+if __name__ == "__main__":
+    client = Neo4jClient()
+    try:
+        run_migrations(client)
+    finally:
+        client.close()
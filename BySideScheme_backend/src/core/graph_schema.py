@@ -0,0 +1,35 @@
+"""
+图谱 schema 常量：节点 / 关系类型与共享的实体标签。
+独立成模块，供 neo4j_client（建索引）、graph_store、graph_engine 与 graph_migrations 共同引用，
+底层客户端不依赖引擎模块。
+"""
+
+# 所有用户实体共享的标签，配合 (user_id, name) 复合索引做跨类型节点定位
+ENTITY_LABEL = "Entity"
+
+VALID_NODE_TYPES = {"Person", "Event", "Project", "Resource", "Organization"}
+
+VALID_RELATION_TYPES = {
+    # Person ↔ Person
+    "REPORTS_TO",
+    "ALLIES_WITH",
+    "COMPETES_WITH",
+    "TRUSTS",
+    "DISTRUSTS",
+    "INFLUENCES",
+    # Person → Event
+    "PARTICIPATED_IN",
+    "INITIATED",
+    "OPPOSED",
+    # Person → Project
+    "OWNS",
+    "WORKS_ON",
+    "SUPPORTS",
+    "BLOCKS",
+    # Person → Resource
+    "CONTROLS",
+    "COMPETES_FOR",
+    # Person → Organization
+    "BELONGS_TO",
+    "LEADS",
+}
@@ -0,0 +1,944 @@
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+
+from src.core.graph_schema import ENTITY_LABEL, VALID_NODE_TYPES
+from src.core.logger import logger
+from src.core.neo4j_client import Neo4jClient
+
+# Cypher 片段：取节点的业务类型标签（排除共享的 Entity 标签）
+NODE_TYPE_EXPR = "[l IN labels({var}) WHERE l <> 'Entity'][0]"
+
+# 关系上只保留最近 N 条证据原文，完整历史存为独立的证据记录，按需分页读取
+EVIDENCE_RING_SIZE = int(os.getenv("GRAPH_EVIDENCE_RING_SIZE", "5"))
+
+# 写入遇到瞬时错误（死锁、锁等待超时、集群切主等）时的重试次数与初始退避秒数（指数退避 + 抖动）
+GRAPH_WRITE_RETRIES = int(os.getenv("GRAPH_WRITE_RETRIES", "3"))
+GRAPH_WRITE_BACKOFF = float(os.getenv("GRAPH_WRITE_BACKOFF", "0.2"))
+
+# 关系端点实体不存在时的错误信息（抽取结果常见的遗漏，调用方可据此与真正的写入失败区分）
+ENDPOINT_NOT_FOUND = "endpoint entity not found"
+
+# 对抗性关系类型：与负面情感关系一起视为风险关系
+RISK_RELATION_TYPES = ("COMPETES_WITH", "DISTRUSTS", "BLOCKS", "OPPOSED")
+
+# 变更记录字段：props 为实体属性（JSON），delta 为关系属性增量（JSON），into 为合并目标实体
+CHANGE_FIELDS = (
+    "change_type", "name", "entity_type", "source", "target", "rel_type",
+    "node_id", "edge_id", "props", "delta", "into", "description",
+)
+
+
+class GraphUnavailableError(RuntimeError):
+    """图存储后端暂时不可达（如 Neo4j 未启动或连接中断）。"""
+
+
+def is_unavailable(error: BaseException) -> bool:
+    """是否为后端不可达类错误：此类写入应暂存到发件箱，待恢复后回放，而不是记为失败。"""
+    return isinstance(error, (GraphUnavailableError, ServiceUnavailable, SessionExpired))
+
+
+def _dt(iso: Optional[str]) -> Optional[datetime]:
+    """ISO 时间字符串 -> datetime 参数（驱动写为 Neo4j 原生 datetime，与库中时间戳按时间比较、可走范围索引）。"""
+    return datetime.fromisoformat(iso) if iso is not None else None
+
+
+def _node_type(labels) -> str:
+    """从节点标签中取业务类型（忽略共享的 Entity 标签）。"""
+    for label in labels or []:
+        if label != ENTITY_LABEL:
+            return label
+    return "Unknown"
+
+
+class GraphStore:
+    """
+    图谱存储后端接口，GraphEngine 只通过它读写图数据。
+    - Neo4jGraphStore: Neo4j（默认）
+    - EmbeddedGraphStore: 进程内邻接表 + SQLite 持久化，无需外部服务
+
+    约定：
+    - 节点按 (user_id, name) 定位；节点/关系 id 为字符串形式的整数
+    - 写入方法的 rows 带 idx / label 字段，返回 {成功条目 idx: {"created": 是否新建, "id", ...}}，
+      失败条目追加到 errors
+    - 读取方法返回的节点/关系已是 API 输出格式（见 GET /graph/{user_id}）
+    - a 前缀的异步方法默认直接调用同步版本，网络型后端应覆盖为真正的异步实现
+    """
+
+    backend = "base"
+    # 因瞬时错误重试过的写入次数（无重试机制的后端恒为 0）
+    write_retries = 0
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def merge_entities(
+        self, user_id: str, etype: str, rows: List[Dict[str, Any]], now_iso: str, errors: List[Dict[str, Any]]
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        rows: [{"idx", "name", "props", "label"}]，同名节点存在时合并属性。
+        返回 {idx: {"created", "id": 节点 id}}
+        """
+        raise NotImplementedError
+
+    def merge_relations(
+        self,
+        user_id: str,
+        rel_type: str,
+        source_label: str,
+        target_label: str,
+        rows: List[Dict[str, Any]],
+        now_iso: str,
+        errors: List[Dict[str, Any]],
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        rows: [{"idx", "source", "target", "weight", "sentiment", "confidence", "evidence": [原文...], "label"}]
+        端点不存在的条目不写入。
+        新证据（该关系下未出现过的原文）写入证据记录，同时追加到关系上最近 EVIDENCE_RING_SIZE 条的
+        evidence 列表并累加 evidence_count。
+        返回 {idx: {"created", "id": 关系 id, "before": 写入前的 {weight, sentiment, confidence}（新建时为 None）}}
+        """
+        raise NotImplementedError
+
+    def append_changes(self, user_id: str, changes: List[Dict[str, Any]], now_iso: str) -> Optional[int]:
+        """追加变更记录并分配连续序号，返回最新序号。"""
+        raise NotImplementedError
+
+    def session_scope(self):
+        """上下文管理器：其中的多次写入复用同一个后端会话（写入队列每轮批处理使用）；默认无操作。"""
+        return nullcontext()
+
+    def clear_batch(self, user_id: str, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        分批清空用户图谱的一批：在一个事务中最多删除 batch_size 条关系、batch_size 个已无关系的实体
+        与 batch_size 条证据记录，返回 {"relations", "entities", "evidence"} 本批删除数；全为 0 时已清空。
+        """
+        raise NotImplementedError
+
+    def delete_entity(self, user_id: str, name: str, batch_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        删除实体及其关系（含证据记录），返回被删除节点 [{"node_id", "type"}]。
+        关系与证据记录每个事务最多删除 batch_size 条，最后删除节点本身。
+        """
+        raise NotImplementedError
+
+    def merge_entity_into(
+        self, user_id: str, duplicate: str, canonical: str, batch_size: int = 500, etype: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        把重复实体合并到规范实体：关系与证据记录改挂到规范实体（同类型同方向的关系合并为一条），
+        规范实体缺少的属性从重复实体补齐，最后删除重复实体。
+        每个事务最多处理 batch_size 条关系 / 证据记录。etype 给定时两个实体都必须是该类型。
+        返回 {"node_id": 被删除节点 id, "relations": 迁移的关系数}；任一实体不存在（或同名实体不唯一）时返回 None。
+        """
+        raise NotImplementedError
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def change_seq(self, user_id: str) -> int:
+        """变更日志最新序号（无记录时为 0）。"""
+        raise NotImplementedError
+
+    def read_changes(
+        self,
+        user_id: str,
+        since_seq: Optional[int] = None,
+        until_seq: Optional[int] = None,
+        cutoff_iso: Optional[str] = None,
+        limit: int = 500,
+        latest_first: bool = False,
+        until_iso: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        按序号或时间范围读取变更记录，返回 [{"seq", "timestamp", CHANGE_FIELDS 中的各字段}]
+        """
+        raise NotImplementedError
+
+    def save_checkpoint(self, user_id: str, seq: int, timestamp: str, data: str):
+        """保存物化检查点：变更日志序号 seq 处的完整图谱（GraphState.encode 的结果）。"""
+        raise NotImplementedError
+
+    def load_checkpoint(self, user_id: str, as_of_iso: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """时间不晚于 as_of_iso 的最近一个检查点 {"seq", "timestamp", "data"}；as_of_iso 为空时取最新的一个。"""
+        raise NotImplementedError
+
+    def fetch_nodes(self, user_id: str, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """读取用户节点；names 给定时只读取这些实体。"""
+        raise NotImplementedError
+
+    def fetch_edges(
+        self, user_id: str, relations: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """读取用户关系；relations 给定时只读取这些 {source, rel_type, target}。"""
+        raise NotImplementedError
+
+    def edge_evidence(self, user_id: str, edge_id: str, offset: int = 0, limit: int = 20) -> Optional[Dict[str, Any]]:
+        """
+        按关系 id 分页读取完整证据历史（新的在前），返回 {"total", "items": [{"text", "created_at"}]}；
+        关系不存在时返回 None。
+        """
+        raise NotImplementedError
+
+    def expand_frontier(
+        self,
+        user_id: str,
+        frontier: List[str],
+        exclude_edges: List[str],
+        limit: int,
+        half_life_days: Optional[float] = None,
+    ) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        读取 frontier 中实体的关联关系（不分方向，跳过 exclude_edges 中的关系 id），
+        按关系强度（weight × confidence）降序最多返回 limit 条 [(关系, 另一端节点)]。
+        half_life_days 给定时强度再乘以按关系 updated_at 计算的时间衰减 0.5 ^ (距今天数 / half_life_days)。
+        """
+        raise NotImplementedError
+
+    def neighborhood(
+        self, user_id: str, name: str, depth: int, max_nodes: int, max_edges: int
+    ) -> Dict[str, Any]:
+        """
+        实体的 N 跳邻域子图 {"nodes", "edges", "truncated"}。
+        逐层加权 BFS：每层一次 expand_frontier，强关系优先纳入；
+        节点数 / 关系数达到上限时停止扩展并置 truncated=True。
+        """
+        return self.subgraph(user_id, [name], depth, max_nodes, max_edges)
+
+    def subgraph(
+        self,
+        user_id: str,
+        seeds: List[str],
+        depth: int,
+        max_nodes: int,
+        max_edges: int,
+        half_life_days: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        以多个实体为起点的 N 跳子图 {"nodes", "edges", "truncated"}，扩展方式同 neighborhood；
+        half_life_days 给定时近期更新的关系优先（见 expand_frontier）。
+        """
+        start = self.fetch_nodes(user_id, seeds)
+        if not start:
+            return {"nodes": [], "edges": [], "truncated": False}
+        nodes = {node["id"]: node for node in start}
+        edges: Dict[str, Dict[str, Any]] = {}
+        frontier = [node["name"] for node in start]
+        truncated = False
+        for _ in range(depth):
+            if not frontier:
+                break
+            budget = max_edges - len(edges)
+            if budget <= 0:
+                truncated = True
+                break
+            # 多取一条用于判断是否还有剩余
+            rows = self.expand_frontier(user_id, frontier, list(edges), budget + 1, half_life_days)
+            if len(rows) > budget:
+                truncated = True
+                rows = rows[:budget]
+            next_frontier = []
+            for edge, neighbor in rows:
+                if neighbor["id"] not in nodes:
+                    if len(nodes) >= max_nodes:
+                        truncated = True
+                        continue
+                    nodes[neighbor["id"]] = neighbor
+                    next_frontier.append(neighbor["name"])
+                edges[edge["id"]] = edge
+            frontier = next_frontier
+        return {"nodes": list(nodes.values()), "edges": list(edges.values()), "truncated": truncated}
+
+    def context_rows(self, user_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Prompt 上下文所需数据：
+        person_rels（人物出边，按权重降序前 30）、persons（按名称）、
+        events / projects（按更新时间降序前 10）
+        """
+        raise NotImplementedError
+
+    def entity_index_rows(self, user_id: str) -> List[Dict[str, Any]]:
+        """实体名称索引数据 [{"name", "type", "neighbors"}]。"""
+        raise NotImplementedError
+
+    def risk_relations(self, user_id: str) -> List[Dict[str, Any]]:
+        """负面或对抗性关系 [{"source", "target", "rel_type", "weight", "sentiment", "evidence"}]，按权重降序。"""
+        raise NotImplementedError
+
+    # ------------------------------------------------------------------
+    # 异步读取（默认直接调用同步版本）
+    # ------------------------------------------------------------------
+
+    async def achange_seq(self, user_id: str) -> int:
+        return self.change_seq(user_id)
+
+    async def aread_changes(self, user_id: str, **kwargs) -> List[Dict[str, Any]]:
+        return self.read_changes(user_id, **kwargs)
+
+    async def afetch_nodes(self, user_id: str, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return self.fetch_nodes(user_id, names)
+
+    async def afetch_edges(
+        self, user_id: str, relations: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, Any]]:
+        return self.fetch_edges(user_id, relations)
+
+    async def aedge_evidence(
+        self, user_id: str, edge_id: str, offset: int = 0, limit: int = 20
+    ) -> Optional[Dict[str, Any]]:
+        return self.edge_evidence(user_id, edge_id, offset, limit)
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        self.close()
+
+
+class Neo4jGraphStore(GraphStore):
+    """基于 Neo4j 的图谱存储：实体带类型标签 + 共享 Entity 标签，变更日志为 (:GraphChange) 节点。"""
+
+    backend = "neo4j"
+
+    def __init__(self, neo4j_client: Neo4jClient):
+        self.neo4j = neo4j_client
+        self.write_retries = 0
+        self._retry_lock = threading.Lock()
+
+    def session_scope(self):
+        return self.neo4j.session_scope()
+
+    def _run_write_retrying(self, cypher: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        在显式事务中写入，遇到 TransientError 时按指数退避重试 GRAPH_WRITE_RETRIES 次，仍失败则抛出。
+        不使用 execute_write：驱动自带的重试（默认最长 30 秒）叠加在这里的重试之上会让一次失败的写入
+        占住该用户的写入队列过久，且重试次数无法计入指标。
+        """
+        for attempt in range(GRAPH_WRITE_RETRIES + 1):
+            try:
+                return self.neo4j.run_write_once(cypher, params)
+            except TransientError as e:
+                if attempt >= GRAPH_WRITE_RETRIES:
+                    raise
+                with self._retry_lock:
+                    self.write_retries += 1
+                delay = GRAPH_WRITE_BACKOFF * (2 ** attempt) * (1 + random.random())
+                logger.warning(f"Transient Neo4j write error, retrying in {delay:.2f}s: {e}")
+                time.sleep(delay)
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def merge_entities(self, user_id, etype, rows, now_iso, errors):
+        cypher = (
+            f"UNWIND $rows AS row "
+            f"MERGE (n:{etype} {{user_id: $user_id, name: row.name}}) "
+            f"ON CREATE SET n += row.props, n.created_at = $now "
+            f"ON MATCH SET n += row.props "
+            f"SET n:{ENTITY_LABEL}, n.updated_at = $now "
+            f"RETURN DISTINCT row.idx AS idx, n.created_at = $now AS created, toString(id(n)) AS id"
+        )
+
+        def _combine(merged, row):
+            merged["props"] = {**merged["props"], **row["props"]}
+
+        unique, groups = self._dedupe_rows(rows, lambda row: row["name"], _combine)
+        start = len(errors)
+        written = self._write_batch(cypher, unique, {"user_id": user_id, "now": _dt(now_iso)}, "entity", errors)
+        self._expand_duplicates(written, groups, "entity", errors, start)
+        return written
+
+    def merge_relations(self, user_id, rel_type, source_label, target_label, rows, now_iso, errors):
+        cypher = (
+            f"UNWIND $rows AS row "
+            f"MATCH (s:{source_label} {{user_id: $user_id, name: row.source}}) "
+            f"MATCH (t:{target_label} {{user_id: $user_id, name: row.target}}) "
+            f"MERGE (s)-[r:{rel_type}]->(t) "
+            f"ON CREATE SET r.evidence = [], r.evidence_count = 0, r.created_at = $now "
+            f"WITH row, r, r.created_at = $now AS created "
+            f"WITH row, r, created, "
+            f"CASE WHEN created THEN null ELSE r {{.weight, .sentiment, .confidence}} END AS before "
+            f"SET r.weight = row.weight, r.sentiment = row.sentiment, "
+            f"r.confidence = row.confidence, r.updated_at = $now "
+            f"WITH row, r, created, before "
+            f"CALL {{ "
+            f"WITH row, r "
+            f"UNWIND row.evidence AS text "
+            f"WITH row, r, text WHERE text <> '' "
+            f"OPTIONAL MATCH (ev:Evidence {{user_id: $user_id, source: row.source, "
+            f"rel_type: $rel_type, target: row.target, text: text}}) "
+            f"WITH row, r, text, count(ev) = 0 AS fresh WHERE fresh "
+            f"CREATE (:Evidence {{user_id: $user_id, source: row.source, rel_type: $rel_type, "
+            f"target: row.target, text: text, created_at: $now}}) "
+            f"SET r.evidence = (coalesce(r.evidence, []) + text)[-$ring..], "
+            f"r.evidence_count = coalesce(r.evidence_count, 0) + 1 "
+            f"RETURN count(*) AS added "
+            f"}} "
+            f"RETURN row.idx AS idx, created, toString(id(r)) AS id, before"
+        )
+        params = {"user_id": user_id, "now": _dt(now_iso), "rel_type": rel_type, "ring": EVIDENCE_RING_SIZE}
+
+        def _combine(merged, row):
+            merged.update(weight=row["weight"], sentiment=row["sentiment"], confidence=row["confidence"])
+            merged["evidence"] = list(dict.fromkeys(merged["evidence"] + row["evidence"]))
+
+        unique, groups = self._dedupe_rows(rows, lambda row: (row["source"], row["target"]), _combine)
+        start = len(errors)
+        written = self._write_batch(cypher, unique, params, "relation", errors)
+        self._expand_duplicates(
+            written,
+            groups,
+            "relation",
+            errors,
+            start,
+            before=lambda row: {k: row[k] for k in ("weight", "sentiment", "confidence")},
+        )
+        return written
+
+    @staticmethod
+    def _dedupe_rows(
+        rows: List[Dict[str, Any]], key: Callable[[Dict[str, Any]], Any], combine: Callable[[Dict, Dict], None]
+    ) -> Tuple[List[Dict[str, Any]], Dict[int, List[Dict[str, Any]]]]:
+        """
+        同一个 UNWIND 批次里同一节点/关系出现多次时，后面的行会 MATCH 到本语句刚新建的对象，
+        created_at = $now 同样成立，每一行都会报告为新建。
+        这里先把同 key 的行合并为一行（combine(合并行, 后出现的行)，与逐行写入的结果一致），
+        返回 (去重后的行, {首行 idx: 该 key 的全部原始行})，后者只包含有重复的 key。
+        """
+        unique: Dict[Any, Dict[str, Any]] = {}
+        originals: Dict[Any, List[Dict[str, Any]]] = {}
+        for row in rows:
+            k = key(row)
+            if k in unique:
+                combine(unique[k], row)
+                originals[k].append(row)
+            else:
+                unique[k] = dict(row)
+                originals[k] = [row]
+        groups = {group[0]["idx"]: group for group in originals.values() if len(group) > 1}
+        return list(unique.values()), groups
+
+    @staticmethod
+    def _expand_duplicates(
+        written: Dict[int, Dict[str, Any]],
+        groups: Dict[int, List[Dict[str, Any]]],
+        kind: str,
+        errors: List[Dict[str, Any]],
+        errors_start: int,
+        before: Callable[[Dict[str, Any]], Dict[str, Any]] = None,
+    ):
+        """
+        为 _dedupe_rows 合并掉的重复行补上结果：与首行写入同一对象，created 为 False，
+        before 为前一行写入的值；首行失败时重复行记同样的错误。
+        """
+        failed = {e["item"]: e["error"] for e in errors[errors_start:]}
+        for first_idx, group in groups.items():
+            result = written.get(first_idx)
+            for previous, row in zip(group, group[1:]):
+                if result is None:
+                    errors.append(
+                        {"kind": kind, "item": row["label"], "error": failed.get(group[0]["label"], "write failed")}
+                    )
+                    continue
+                entry = {**result, "created": False}
+                if before is not None:
+                    entry["before"] = before(previous)
+                written[row["idx"]] = entry
+
+    def _write_batch(
+        self,
+        cypher: str,
+        rows: List[Dict[str, Any]],
+        params: Dict[str, Any],
+        kind: str,
+        errors: List[Dict[str, Any]],
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        在一个写事务中执行 UNWIND 批量写入，返回 {成功条目 idx: 该条目返回的其余字段}。
+        cypher 需 RETURN row.idx AS idx, <是否新建> AS created 以及其它需要返回的字段；
+        未返回的条目（如关系端点不存在）记为错误。
+        瞬时错误先整批重试；仍失败时退化为逐条写入，逐条记录错误原因。
+        后端不可达（is_unavailable）时直接抛出，由调用方暂存整批写入。
+        """
+        failed: Dict[int, str] = {}
+        written: Dict[int, Dict[str, Any]] = {}
+
+        def _collect(result_rows):
+            for r in result_rows:
+                entry = written.setdefault(r["idx"], {k: v for k, v in r.items() if k != "idx"})
+                entry["created"] = bool(entry.get("created")) or bool(r.get("created"))
+
+        try:
+            _collect(self._run_write_retrying(cypher, {**params, "rows": rows}))
+        except Exception as e:
+            if is_unavailable(e):
+                raise
+            logger.warning(f"Batched {kind} write failed ({len(rows)} rows), retrying per item: {e}")
+            written = {}
+            for row in rows:
+                try:
+                    _collect(self._run_write_retrying(cypher, {**params, "rows": [row]}))
+                except Exception as item_error:
+                    if is_unavailable(item_error):
+                        raise
+                    failed[row["idx"]] = str(item_error)
+
+        for row in rows:
+            if row["idx"] in written:
+                continue
+            error = failed.get(row["idx"], ENDPOINT_NOT_FOUND)
+            logger.error(f"Error merging {kind} {row['label']}: {error}")
+            errors.append({"kind": kind, "item": row["label"], "error": error})
+        return written
+
+    def append_changes(self, user_id, changes, now_iso):
+        if not changes:
+            return None
+        rows = self._run_write_retrying(*self._change_log_statement(user_id, changes, now_iso))
+        return rows[0]["seq"] if rows else None
+
+    @staticmethod
+    def _change_log_statement(user_id: str, changes: List[Dict[str, Any]], now_iso: str):
+        """
+        构造追加变更记录的 (cypher, params)，可与其它写入放入同一个事务（run_batch）。
+        序号由每个用户一个的 (:GraphChangeLog) 计数节点分配：先加写锁再递增，
+        并发写入同一用户时严格单调、无空洞。
+        """
+        cypher = (
+            "MERGE (log:GraphChangeLog {user_id: $user_id}) "
+            "ON CREATE SET log.seq = 0 "
+            "SET log._lock = true "
+            "WITH log "
+            "SET log.seq = log.seq + size($changes) "
+            "REMOVE log._lock "
+            "WITH log.seq - size($changes) AS base "
+            "UNWIND range(0, size($changes) - 1) AS i "
+            "CREATE (c:GraphChange {user_id: $user_id, seq: base + i + 1, timestamp: $now}) "
+            "SET c += $changes[i] "
+            "RETURN max(c.seq) AS seq"
+        )
+        return cypher, {"user_id": user_id, "changes": changes, "now": _dt(now_iso)}
+
+    def clear_batch(self, user_id, batch_size=1000):
+        # 不用 CALL { ... } IN TRANSACTIONS（run_auto_commit 可以执行）：那样整个清空是一条长语句，
+        # 无法逐批汇报进度、在批次之间响应取消，也会一直占住该用户的写入队列；
+        # 这里每批一个写事务，由 GraphEngine 经写入队列逐批调用
+        params = {"user_id": user_id, "batch": batch_size}
+        relations, entities, evidence = self.neo4j.run_batch(
+            [
+                (
+                    "MATCH (:Entity {user_id: $user_id})-[r]->() "
+                    "WITH r LIMIT $batch DELETE r RETURN count(r) AS deleted",
+                    params,
+                ),
+                (
+                    "MATCH (n:Entity {user_id: $user_id}) WHERE NOT (n)--() "
+                    "WITH n LIMIT $batch DELETE n RETURN count(n) AS deleted",
+                    params,
+                ),
+                (
+                    "MATCH (ev:Evidence {user_id: $user_id}) "
+                    "WITH ev LIMIT $batch DELETE ev RETURN count(ev) AS deleted",
+                    params,
+                ),
+            ]
+        )
+        return {
+            "relations": relations[0]["deleted"] if relations else 0,
+            "entities": entities[0]["deleted"] if entities else 0,
+            "evidence": evidence[0]["deleted"] if evidence else 0,
+        }
+
+    def delete_entity(self, user_id, name, batch_size=1000):
+        params = {"user_id": user_id, "name": name, "batch": batch_size}
+        # 高度数实体：先分批删除关系与证据记录，避免单个事务过大
+        batched = (
+            "MATCH (:Entity {user_id: $user_id, name: $name})-[r]-() "
+            "WITH DISTINCT r LIMIT $batch DELETE r RETURN count(r) AS deleted",
+            "MATCH (ev:Evidence {user_id: $user_id}) "
+            "WHERE ev.source = $name OR ev.target = $name "
+            "WITH ev LIMIT $batch DELETE ev RETURN count(ev) AS deleted",
+        )
+        for cypher in batched:
+            while True:
+                rows = self.neo4j.run_write(cypher, params)
+                if not rows or rows[0]["deleted"] < batch_size:
+                    break
+        rows = self.neo4j.run_write(
+            "MATCH (n:Entity {user_id: $user_id, name: $name}) "
+            f"WITH n, id(n) AS node_id, {NODE_TYPE_EXPR.format(var='n')} AS type "
+            "DETACH DELETE n "
+            "RETURN node_id, type",
+            params,
+        )
+        return [{"node_id": str(r["node_id"]), "type": r.get("type") or "Unknown"} for r in rows]
+
+    # 合并关系属性：证据环与计数累加，强度等取较新的一条
+    _MERGE_REL_PROPS = (
+        "ON CREATE SET n = properties(r) "
+        "ON MATCH SET n.evidence = (coalesce(n.evidence, []) + coalesce(r.evidence, []))[-$ring..], "
+        "n.evidence_count = coalesce(n.evidence_count, 0) + coalesce(r.evidence_count, 0), "
+        "n.weight = CASE WHEN r.updated_at > n.updated_at THEN r.weight ELSE n.weight END, "
+        "n.sentiment = CASE WHEN r.updated_at > n.updated_at THEN r.sentiment ELSE n.sentiment END, "
+        "n.confidence = CASE WHEN r.updated_at > n.updated_at THEN r.confidence ELSE n.confidence END, "
+        "n.updated_at = CASE WHEN r.updated_at > n.updated_at THEN r.updated_at ELSE n.updated_at END "
+    )
+
+    def merge_entity_into(self, user_id, duplicate, canonical, batch_size=500, etype=None):
+        if duplicate == canonical:
+            return None
+        params = {
+            "user_id": user_id,
+            "dup": duplicate,
+            "canon": canonical,
+            "batch": batch_size,
+            "ring": EVIDENCE_RING_SIZE,
+        }
+        label = etype if etype in VALID_NODE_TYPES else ENTITY_LABEL
+        # 两端分别定位：同名不同类型的节点不能顶替缺失的一端；同名节点不唯一时无法确定合并哪一个
+        exists = self.neo4j.run_query(
+            f"OPTIONAL MATCH (d:{label} {{user_id: $user_id, name: $dup}}) "
+            f"WITH count(d) AS dup "
+            f"OPTIONAL MATCH (c:{label} {{user_id: $user_id, name: $canon}}) "
+            f"RETURN dup, count(c) AS canon",
+            params,
+        )
+        if not exists or exists[0]["dup"] != 1 or exists[0]["canon"] != 1:
+            return None
+
+        rel_types = [
+            r["rel_type"]
+            for r in self.neo4j.run_query(
+                f"MATCH (:{label} {{user_id: $user_id, name: $dup}})-[r]-() RETURN DISTINCT type(r) AS rel_type",
+                params,
+            )
+        ]
+        # 关系类型无法参数化，按类型、方向分别改挂；每轮一个事务，直到没有剩余
+        moved = 0
+        for rel_type in rel_types:
+            statements = (
+                f"MATCH (d:{label} {{user_id: $user_id, name: $dup}})-[r:{rel_type}]->(t:Entity) "
+                f"MATCH (c:{label} {{user_id: $user_id, name: $canon}}) "
+                f"WITH c, r, t LIMIT $batch "
+                f"CALL {{ WITH c, r, t WITH c, r, t WHERE t <> c "
+                f"MERGE (c)-[n:{rel_type}]->(t) {self._MERGE_REL_PROPS}}} "
+                f"DELETE r "
+                f"RETURN count(*) AS moved",
+                f"MATCH (s:Entity)-[r:{rel_type}]->(d:{label} {{user_id: $user_id, name: $dup}}) "
+                f"MATCH (c:{label} {{user_id: $user_id, name: $canon}}) "
+                f"WITH c, r, s LIMIT $batch "
+                f"CALL {{ WITH c, r, s WITH c, r, s WHERE s <> c "
+                f"MERGE (s)-[n:{rel_type}]->(c) {self._MERGE_REL_PROPS}}} "
+                f"DELETE r "
+                f"RETURN count(*) AS moved",
+            )
+            for cypher in statements:
+                while True:
+                    rows = self.neo4j.run_write(cypher, params)
+                    count = rows[0]["moved"] if rows else 0
+                    moved += count
+                    if count < batch_size:
+                        break
+
+        for field in ("source", "target"):
+            while True:
+                rows = self.neo4j.run_write(
+                    f"MATCH (ev:Evidence {{user_id: $user_id, {field}: $dup}}) "
+                    f"WITH ev LIMIT $batch "
+                    f"SET ev.{field} = $canon "
+                    f"RETURN count(ev) AS moved",
+                    params,
+                )
+                if not rows or rows[0]["moved"] < batch_size:
+                    break
+
+        rows = self.neo4j.run_write(
+            f"MATCH (d:{label} {{user_id: $user_id, name: $dup}}) "
+            f"MATCH (c:{label} {{user_id: $user_id, name: $canon}}) "
+            "WITH d, c, properties(c) AS keep, id(d) AS node_id "
+            "SET c += properties(d) "
+            "SET c += keep "
+            "DETACH DELETE d "
+            "RETURN node_id",
+            params,
+        )
+        return {"node_id": str(rows[0]["node_id"]), "relations": moved} if rows else None
+
+    # ------------------------------------------------------------------
+    # 读取：Cypher 构造与结果解析同步 / 异步共用
+    # ------------------------------------------------------------------
+
+    _CHANGE_SEQ_CYPHER = "MATCH (log:GraphChangeLog {user_id: $user_id}) RETURN log.seq AS seq"
+
+    def change_seq(self, user_id):
+        rows = self.neo4j.run_query(self._CHANGE_SEQ_CYPHER, {"user_id": user_id})
+        return (rows[0]["seq"] or 0) if rows else 0
+
+    async def achange_seq(self, user_id):
+        rows = await self.neo4j.arun_query(self._CHANGE_SEQ_CYPHER, {"user_id": user_id})
+        return (rows[0]["seq"] or 0) if rows else 0
+
+    def read_changes(self, user_id, **kwargs):
+        return self.neo4j.run_query(*self._changes_query(user_id, **kwargs))
+
+    async def aread_changes(self, user_id, **kwargs):
+        return await self.neo4j.arun_query(*self._changes_query(user_id, **kwargs))
+
+    @staticmethod
+    def _changes_query(
+        user_id: str,
+        since_seq: Optional[int] = None,
+        until_seq: Optional[int] = None,
+        cutoff_iso: Optional[str] = None,
+        limit: int = 500,
+        latest_first: bool = False,
+        until_iso: Optional[str] = None,
+    ):
+        conditions = []
+        params: Dict[str, Any] = {"user_id": user_id, "limit": limit}
+        if since_seq is not None:
+            conditions.append("c.seq > $since_seq")
+            params["since_seq"] = since_seq
+        if until_seq is not None:
+            conditions.append("c.seq <= $until_seq")
+            params["until_seq"] = until_seq
+        if cutoff_iso is not None:
+            conditions.append("c.timestamp >= $cutoff")
+            params["cutoff"] = _dt(cutoff_iso)
+        if until_iso is not None:
+            conditions.append("c.timestamp <= $until")
+            params["until"] = _dt(until_iso)
+        cypher = (
+            "MATCH (c:GraphChange {user_id: $user_id}) "
+            + (f"WHERE {' AND '.join(conditions)} " if conditions else "")
+            + "RETURN c.seq AS seq, c.timestamp AS timestamp, "
+            + ", ".join(f"c.{field} AS {field}" for field in CHANGE_FIELDS)
+            + f" ORDER BY c.seq {'DESC' if latest_first else 'ASC'} LIMIT $limit"
+        )
+        return cypher, params
+
+    def save_checkpoint(self, user_id, seq, timestamp, data):
+        self.neo4j.run_write(
+            "MERGE (cp:GraphCheckpoint {user_id: $user_id, seq: $seq}) "
+            "SET cp.timestamp = $timestamp, cp.data = $data",
+            {"user_id": user_id, "seq": seq, "timestamp": _dt(timestamp), "data": data},
+        )
+
+    def load_checkpoint(self, user_id, as_of_iso=None):
+        rows = self.neo4j.run_query(
+            "MATCH (cp:GraphCheckpoint {user_id: $user_id}) "
+            + ("WHERE cp.timestamp <= $as_of " if as_of_iso is not None else "")
+            + "RETURN cp.seq AS seq, cp.timestamp AS timestamp, cp.data AS data "
+            "ORDER BY cp.seq DESC LIMIT 1",
+            {"user_id": user_id, "as_of": _dt(as_of_iso)},
+        )
+        return dict(rows[0]) if rows else None
+
+    def fetch_nodes(self, user_id, names=None):
+        return self._parse_nodes(self.neo4j.run_query(*self._nodes_query(user_id, names)))
+
+    async def afetch_nodes(self, user_id, names=None):
+        return self._parse_nodes(await self.neo4j.arun_query(*self._nodes_query(user_id, names)))
+
+    @staticmethod
+    def _nodes_query(user_id: str, names: Optional[List[str]] = None):
+        cypher = (
+            "MATCH (n:Entity {user_id: $user_id}) "
+            + ("WHERE n.name IN $names " if names is not None else "")
+            + "RETURN id(n) AS id, labels(n) AS labels, properties(n) AS props"
+        )
+        return cypher, {"user_id": user_id, "names": names}
+
+    @staticmethod
+    def _parse_nodes(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        nodes = []
+        for row in rows:
+            props = row.get("props", {})
+            nodes.append(
+                {
+                    "id": str(row["id"]),
+                    "name": props.get("name", ""),
+                    "type": _node_type(row.get("labels", [])),
+                    "properties": {
+                        k: v
+                        for k, v in props.items()
+                        if k not in ("user_id",)
+                    },
+                }
+            )
+        return nodes
+
+    def fetch_edges(self, user_id, relations=None):
+        return self._parse_edges(self.neo4j.run_query(*self._edges_query(user_id, relations)))
+
+    async def afetch_edges(self, user_id, relations=None):
+        return self._parse_edges(await self.neo4j.arun_query(*self._edges_query(user_id, relations)))
+
+    @staticmethod
+    def _edges_query(user_id: str, relations: Optional[List[Dict[str, str]]] = None):
+        if relations is None:
+            cypher = (
+                "MATCH (s:Entity {user_id: $user_id})-[r]->(t:Entity {user_id: $user_id}) "
+                "RETURN id(r) AS id, id(s) AS source, id(t) AS target, type(r) AS rel_type, "
+                "properties(r) AS props"
+            )
+        else:
+            cypher = (
+                "UNWIND $relations AS rel "
+                "MATCH (s:Entity {user_id: $user_id, name: rel.source})"
+                "-[r]->(t:Entity {user_id: $user_id, name: rel.target}) "
+                "WHERE type(r) = rel.rel_type "
+                "RETURN id(r) AS id, id(s) AS source, id(t) AS target, type(r) AS rel_type, "
+                "properties(r) AS props"
+            )
+        return cypher, {"user_id": user_id, "relations": relations}
+
+    @staticmethod
+    def _parse_edges(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        edges = []
+        for row in rows:
+            props = row.get("props", {})
+            edges.append(
+                {
+                    "id": str(row["id"]),
+                    "source": str(row["source"]),
+                    "target": str(row["target"]),
+                    "type": row.get("rel_type", ""),
+                    "weight": float(props.get("weight", 0.5)),
+                    "sentiment": props.get("sentiment", "neutral"),
+                    "confidence": float(props.get("confidence", 0.5)),
+                    "evidence": props.get("evidence", []),
+                    "evidence_count": props.get("evidence_count", len(props.get("evidence", []))),
+                }
+            )
+        return edges
+
+    _EDGE_EVIDENCE_CYPHER = (
+        "MATCH (s)-[r]->(t) WHERE id(r) = $rel_id AND s.user_id = $user_id "
+        "CALL { "
+        "WITH s, r, t "
+        "MATCH (ev:Evidence {user_id: $user_id, source: s.name, rel_type: type(r), target: t.name}) "
+        "RETURN count(ev) AS total "
+        "} "
+        "CALL { "
+        "WITH s, r, t "
+        "MATCH (ev:Evidence {user_id: $user_id, source: s.name, rel_type: type(r), target: t.name}) "
+        "WITH ev ORDER BY ev.created_at DESC SKIP $offset LIMIT $limit "
+        "RETURN collect({text: ev.text, created_at: ev.created_at}) AS items "
+        "} "
+        "RETURN total, items"
+    )
+
+    def edge_evidence(self, user_id, edge_id, offset=0, limit=20):
+        if not edge_id.isdigit():
+            return None
+        params = {"user_id": user_id, "rel_id": int(edge_id), "offset": offset, "limit": limit}
+        rows = self.neo4j.run_query(self._EDGE_EVIDENCE_CYPHER, params)
+        return {"total": rows[0]["total"], "items": rows[0]["items"]} if rows else None
+
+    async def aedge_evidence(self, user_id, edge_id, offset=0, limit=20):
+        if not edge_id.isdigit():
+            return None
+        params = {"user_id": user_id, "rel_id": int(edge_id), "offset": offset, "limit": limit}
+        rows = await self.neo4j.arun_query(self._EDGE_EVIDENCE_CYPHER, params)
+        return {"total": rows[0]["total"], "items": rows[0]["items"]} if rows else None
+
+    def expand_frontier(self, user_id, frontier, exclude_edges, limit, half_life_days=None):
+        strength = "coalesce(r.weight, 0.5) * coalesce(r.confidence, 0.5)"
+        if half_life_days:
+            strength += (
+                " * 0.5 ^ (duration.inSeconds(coalesce(r.updated_at, $now), $now).seconds"
+                " / 86400.0 / $half_life)"
+            )
+        cypher = (
+            "UNWIND $frontier AS name "
+            "MATCH (n:Entity {user_id: $user_id, name: name})-[r]-(m:Entity {user_id: $user_id}) "
+            "WHERE NOT id(r) IN $exclude "
+            "WITH r, head(collect(m)) AS m "
+            "RETURN id(r) AS id, id(startNode(r)) AS source, id(endNode(r)) AS target, "
+            "type(r) AS rel_type, properties(r) AS props, "
+            "id(m) AS neighbor_id, labels(m) AS neighbor_labels, properties(m) AS neighbor_props "
+            f"ORDER BY {strength} DESC "
+            "LIMIT $limit"
+        )
+        rows = self.neo4j.run_query(
+            cypher,
+            {
+                "user_id": user_id,
+                "frontier": frontier,
+                "exclude": [int(edge_id) for edge_id in exclude_edges],
+                "limit": limit,
+                "now": datetime.now(timezone.utc),
+                "half_life": half_life_days,
+            },
+        )
+        edges = self._parse_edges(rows)
+        neighbors = self._parse_nodes(
+            [{"id": r["neighbor_id"], "labels": r["neighbor_labels"], "props": r["neighbor_props"]} for r in rows]
+        )
+        return list(zip(edges, neighbors))
+
+    def context_rows(self, user_id):
+        # 人物关系 / 人物 / 近期事件 / 项目状态：四组读取合并为一次往返
+        cypher = (
+            "CALL { "
+            "MATCH (p:Person {user_id: $user_id})-[r]->(t:Entity {user_id: $user_id}) "
+            "WITH p, r, t ORDER BY r.weight DESC LIMIT 30 "
+            "RETURN collect({source: p.name, rel_type: type(r), weight: r.weight, "
+            f"sentiment: r.sentiment, target: t.name, target_type: {NODE_TYPE_EXPR.format(var='t')}}}) AS person_rels "
+            "} "
+            "CALL { "
+            "MATCH (p:Person {user_id: $user_id}) "
+            "WITH p ORDER BY p.name "
+            "RETURN collect({name: p.name, role: p.role, influence: p.influence_level, "
+            "style: p.style}) AS persons "
+            "} "
+            "CALL { "
+            "MATCH (e:Event {user_id: $user_id}) "
+            "WITH e ORDER BY e.updated_at DESC LIMIT 10 "
+            "RETURN collect({name: e.name, description: e.description, date: e.date}) AS events "
+            "} "
+            "CALL { "
+            "MATCH (pj:Project {user_id: $user_id}) "
+            "WITH pj ORDER BY pj.updated_at DESC LIMIT 10 "
+            "RETURN collect({name: pj.name, status: pj.status, priority: pj.priority}) AS projects "
+            "} "
+            "RETURN person_rels, persons, events, projects"
+        )
+        rows = self.neo4j.run_query(cypher, {"user_id": user_id})
+        row = rows[0] if rows else {}
+        return {key: row.get(key) or [] for key in ("person_rels", "persons", "events", "projects")}
+
+    def entity_index_rows(self, user_id):
+        cypher = (
+            "MATCH (n:Entity {user_id: $user_id}) "
+            "OPTIONAL MATCH (n)--(m:Entity {user_id: $user_id}) "
+            f"RETURN n.name AS name, {NODE_TYPE_EXPR.format(var='n')} AS type, "
+            "collect(DISTINCT m.name) AS neighbors"
+        )
+        return self.neo4j.run_query(cypher, {"user_id": user_id})
+
+    def risk_relations(self, user_id):
+        cypher = (
+            "MATCH (s:Entity {user_id: $user_id})-[r]->(t:Entity {user_id: $user_id}) "
+            "WHERE r.sentiment = 'negative' OR type(r) IN $risk_types "
+            "RETURN s.name AS source, type(r) AS rel_type, t.name AS target, "
+            "r.weight AS weight, r.sentiment AS sentiment, r.evidence AS evidence "
+            "ORDER BY r.weight DESC"
+        )
+        return self.neo4j.run_query(cypher, {"user_id": user_id, "risk_types": list(RISK_RELATION_TYPES)})
+
+    def close(self):
+        self.neo4j.close()
+
+    async def aclose(self):
+        await self.neo4j.aclose()
@@ -0,0 +1,191 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 英文/数字按词切分，中日韩连续字符按二元组切分（单字片段保留单字）
+_LATIN_RE = re.compile(r"[a-z0-9]+(?:[._-][a-z0-9]+)*")
+_CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中英文混合分词：
+    - 英文/数字：小写后按词切分（保留 v2.0、a-b 这类连接词）
+    - 中文：连续片段切成重叠二元组（"天网项目" -> 天网/网项/项目），单字片段保留单字
+    """
+    if not text:
+        return []
+    text = text.lower()
+    tokens = _LATIN_RE.findall(text)
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class _ScopeIndex:
+    """单个 scope（user_id）的倒排索引。"""
+
+    def __init__(self):
+        self.docs: Dict[str, Tuple[Counter, int, Dict[str, Any]]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_len = 0
+
+    def add(self, doc_id: str, tokens: List[str], payload: Dict[str, Any]):
+        self.remove(doc_id)
+        tf = Counter(tokens)
+        self.docs[doc_id] = (tf, len(tokens), payload)
+        self.total_len += len(tokens)
+        for term, count in tf.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+
+    def remove(self, doc_id: str) -> bool:
+        entry = self.docs.pop(doc_id, None)
+        if entry is None:
+            return False
+        tf, length, _ = entry
+        self.total_len -= length
+        for term in tf:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+        return True
+
+
+class LexicalIndex:
+    """
+    按 scope 划分的内存 BM25 倒排索引，用于记忆检索的词法预筛。
+    - scope 首次检索时由调用方整体加载（load_scope），之后随写入增量维护
+    - search 返回 BM25 命中以及最佳命中对查询词 IDF 的覆盖率，调用方据此判断是否还需要向量检索
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._scopes: Dict[str, _ScopeIndex] = {}
+        self._doc_scope: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def has_scope(self, scope: str) -> bool:
+        with self._lock:
+            return scope in self._scopes
+
+    def load_scope(self, scope: str, docs: Iterable[Tuple[str, str, Dict[str, Any]]]):
+        """用 (doc_id, text, payload) 序列重建一个 scope 的索引。"""
+        index = _ScopeIndex()
+        for doc_id, text, payload in docs:
+            index.add(doc_id, tokenize(text), payload)
+        with self._lock:
+            self._drop_locked(scope)
+            self._scopes[scope] = index
+            for doc_id in index.docs:
+                self._doc_scope[doc_id] = scope
+
+    def upsert(self, scope: str, doc_id: str, text: str, payload: Dict[str, Any]):
+        """增量写入；scope 尚未加载时忽略（加载时会整体拉取）。"""
+        with self._lock:
+            index = self._scopes.get(scope)
+            if index is None:
+                return
+            index.add(doc_id, tokenize(text), payload)
+            self._doc_scope[doc_id] = scope
+
+    def remove(self, doc_id: str) -> Optional[str]:
+        """删除文档，返回其所属 scope（未知时返回 None）。"""
+        with self._lock:
+            scope = self._doc_scope.pop(doc_id, None)
+            if scope is not None and scope in self._scopes:
+                self._scopes[scope].remove(doc_id)
+            return scope
+
+    def scope_of(self, doc_id: str) -> Optional[str]:
+        with self._lock:
+            return self._doc_scope.get(doc_id)
+
+    def drop_scope(self, scope: str):
+        with self._lock:
+            self._drop_locked(scope)
+
+    def _drop_locked(self, scope: str):
+        index = self._scopes.pop(scope, None)
+        if index is None:
+            return
+        for doc_id in index.docs:
+            self._doc_scope.pop(doc_id, None)
+
+    def search(
+        self, scope: str, query: str, category: str = None, limit: int = 10
+    ) -> Tuple[List[Tuple[float, Dict[str, Any]]], float]:
+        """
+        BM25 检索。返回 ([(score, payload), ...], coverage)。
+        coverage 为最佳命中覆盖的查询词 IDF 之和 / 全部查询词 IDF 之和（0-1），
+        语料中不存在的查询词按最大 IDF 计入分母，因此泛化描述类查询的覆盖率天然偏低。
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            index = self._scopes.get(scope)
+            if index is None or not terms or not index.docs:
+                return [], 0.0
+
+            n_docs = len(index.docs)
+            avg_len = index.total_len / n_docs if n_docs else 0.0
+            max_idf = math.log(1 + (n_docs + 0.5) / 0.5)
+
+            idf: Dict[str, float] = {}
+            total_idf = 0.0
+            for term in terms:
+                df = len(index.postings.get(term, ()))
+                if df:
+                    idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                    total_idf += idf[term]
+                else:
+                    total_idf += max_idf
+
+            scores: Dict[str, float] = {}
+            matched_idf: Dict[str, float] = {}
+            for term, term_idf in idf.items():
+                for doc_id, tf in index.postings[term].items():
+                    _, length, payload = index.docs[doc_id]
+                    if category and (payload.get("metadata") or {}).get("category") != category:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_len) if avg_len else self.k1
+                    scores[doc_id] = scores.get(doc_id, 0.0) + term_idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched_idf[doc_id] = matched_idf.get(doc_id, 0.0) + term_idf
+
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+            hits = [(score, index.docs[doc_id][2]) for doc_id, score in ranked]
+            coverage = matched_idf[ranked[0][0]] / total_idf if ranked and total_idf else 0.0
+            return hits, coverage
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[List[Dict[str, Any]]], k: int = 60, key: str = "id"
+) -> List[Dict[str, Any]]:
+    """
+    RRF 融合多路排序结果。融合分写入 score 字段，并按路数归一化到 0-1
+    （在所有列表中都排第一时为 1.0），以便与后续的时间加权重排兼容。
+    """
+    fused: Dict[str, float] = {}
+    items: Dict[str, Dict[str, Any]] = {}
+    for results in ranked_lists:
+        for rank, item in enumerate(results):
+            item_key = item.get(key)
+            if item_key is None:
+                continue
+            fused[item_key] = fused.get(item_key, 0.0) + 1.0 / (k + rank + 1)
+            items.setdefault(item_key, item)
+
+    best = len(ranked_lists) / (k + 1) if ranked_lists else 1.0
+    merged = []
+    for item_key, score in sorted(fused.items(), key=lambda kv: kv[1], reverse=True):
+        item = dict(items[item_key])
+        item["score"] = score / best
+        merged.append(item)
+    return merged
@@ -1,8 +1,16 @@
 from mem0 import Memory
 from typing import List, Dict, Any, Optional
 import os
+import time
+from datetime import datetime, timezone
+from src.core.cache import VersionedLRUCache
+from src.core.lexical_index import LexicalIndex, reciprocal_rank_fusion
 from src.core.logger import logger
 
+# 需要建立 payload 索引的字段（mem0 会把 metadata 展平到 payload 顶层）
+PAYLOAD_KEYWORD_FIELDS = ("user_id", "category")
+PAYLOAD_TIMESTAMP_FIELD = "created_ts"
+
 class MemoryManager:
     _instance = None
     _initialized = False
@@ -36,6 +44,14 @@ class MemoryManager:
                 },
                 "history_db_path": os.path.join(data_dir, "history.db")
             }
+
+            # 配置了 QDRANT_URL 时使用独立的 Qdrant 服务（多租户共享集合），否则使用本地文件存储
+            if os.getenv("QDRANT_URL"):
+                config["vector_store"]["config"] = {
+                    "url": os.getenv("QDRANT_URL"),
+                    "api_key": os.getenv("QDRANT_API_KEY"),
+                    "on_disk": True
+                }
             
             # 配置 LLM 为 SiliconFlow (如果有 Key)
             if os.getenv("SILICONFLOW_API_KEY"):
@@ -66,16 +82,136 @@ class MemoryManager:
             logger.info(f"Using local persistence storage at: {data_dir}")
 
         self.memory = Memory.from_config(config)
+        self._ensure_collection_tuning()
+
+        # 词法预筛：按 user scope 维护的 BM25 倒排索引
+        self._lexical_enabled = os.getenv("MEMORY_LEXICAL_PREFILTER", "1").strip() not in ("0", "false", "no")
+        self._lexical_min_coverage = float(os.getenv("MEMORY_LEXICAL_MIN_COVERAGE", "0.6"))
+        self._lexical_bootstrap_limit = int(os.getenv("MEMORY_LEXICAL_BOOTSTRAP_LIMIT", "5000"))
+        self._lexical = LexicalIndex()
+
+        # 检索结果缓存：按 user scope 版本号失效，写入/删除时 bump
+        self._search_cache = VersionedLRUCache(
+            max_entries=int(os.getenv("MEMORY_SEARCH_CACHE_SIZE", "2048")),
+            name="memory_search",
+        )
         self._initialized = True
 
+    def _ensure_collection_tuning(self):
+        """
+        为向量集合建立 payload 索引，并按需开启 int8 标量量化。
+        - user_id / category 建 keyword 索引，created_ts 建 integer 索引，加速带过滤条件的 HNSW 检索
+        - MEMORY_VECTOR_QUANTIZATION=int8 时开启标量量化（量化向量常驻内存，原始向量留在磁盘用于 rescore）
+        索引与量化配置均为幂等操作，每次启动时确保一致。
+        """
+        vector_store = getattr(self.memory, "vector_store", None)
+        client = getattr(vector_store, "client", None)
+        collection_name = getattr(vector_store, "collection_name", None)
+        if client is None or not collection_name:
+            logger.debug("Vector store does not expose a Qdrant client, skipping collection tuning.")
+            return
+
+        try:
+            from qdrant_client import models
+        except ImportError:
+            logger.warning("qdrant-client not available, skipping collection tuning.")
+            return
+
+        payload_indexes = [(field, models.PayloadSchemaType.KEYWORD) for field in PAYLOAD_KEYWORD_FIELDS]
+        payload_indexes.append((PAYLOAD_TIMESTAMP_FIELD, models.PayloadSchemaType.INTEGER))
+        for field_name, field_schema in payload_indexes:
+            try:
+                client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                )
+                logger.debug(f"Ensured payload index on '{field_name}' for collection {collection_name}")
+            except Exception as e:
+                logger.warning(f"Could not create payload index on '{field_name}': {e}")
+
+        quantization = os.getenv("MEMORY_VECTOR_QUANTIZATION", "").strip().lower()
+        if quantization == "int8":
+            try:
+                client.update_collection(
+                    collection_name=collection_name,
+                    quantization_config=models.ScalarQuantization(
+                        scalar=models.ScalarQuantizationConfig(
+                            type=models.ScalarType.INT8,
+                            quantile=0.99,
+                            always_ram=True,
+                        )
+                    ),
+                )
+                logger.info(f"Enabled int8 scalar quantization for collection {collection_name}")
+            except Exception as e:
+                logger.warning(f"Could not enable scalar quantization: {e}")
+        elif quantization:
+            logger.warning(f"Unsupported MEMORY_VECTOR_QUANTIZATION value: {quantization}")
+
     def _add(self, content: str, user_id: str, category: str, extra_metadata: Dict[str, Any] = None):
-        metadata = {"category": category}
+        metadata = {"category": category, PAYLOAD_TIMESTAMP_FIELD: int(time.time())}
         if extra_metadata:
             metadata.update(extra_metadata)
         # mem0 v1.0.3 add method signature: add(messages, user_id=None, agent_id=None, run_id=None, metadata=None, filters=None, prompt=None)
         # 这里的 messages 可以是 string
         logger.debug(f"Adding memory for user {user_id} in category {category}")
-        self.memory.add(content, user_id=user_id, metadata=metadata)
+        result = self.memory.add(content, user_id=user_id, metadata=metadata)
+        self._search_cache.bump(user_id)
+        self._update_lexical_index(user_id, result, metadata)
+
+    # --- 词法索引维护 ---
+
+    @staticmethod
+    def _lexical_payload(item: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """把 mem0 记录整理成与 search 结果同构的 dict，便于与向量结果融合。"""
+        return {
+            "id": item.get("id"),
+            "memory": item.get("memory", ""),
+            "metadata": item.get("metadata") or {},
+            "created_at": item.get("created_at"),
+            "user_id": user_id,
+        }
+
+    def _update_lexical_index(self, user_id: str, add_result: Any, metadata: Dict[str, Any]):
+        """
+        根据 mem0.add 的返回（ADD/UPDATE/DELETE 事件）增量维护倒排索引。
+        mem0 会对输入做事实抽取，真正落库的文本以返回结果为准。
+        """
+        if not self._lexical_enabled or not isinstance(add_result, dict):
+            return
+        now_iso = datetime.now(timezone.utc).isoformat()
+        for item in add_result.get("results", []):
+            memory_id = item.get("id")
+            if not memory_id:
+                continue
+            event = item.get("event", "ADD")
+            if event == "DELETE":
+                self._lexical.remove(memory_id)
+            elif event in ("ADD", "UPDATE"):
+                payload = self._lexical_payload(
+                    {"id": memory_id, "memory": item.get("memory", ""), "metadata": metadata, "created_at": now_iso},
+                    user_id,
+                )
+                self._lexical.upsert(user_id, memory_id, payload["memory"], payload)
+
+    def _ensure_lexical_scope(self, user_id: str):
+        """首次检索某个 scope 时，从 mem0 拉取全部记忆建立索引。"""
+        if self._lexical.has_scope(user_id):
+            return
+        try:
+            results = self.memory.get_all(user_id=user_id, limit=self._lexical_bootstrap_limit)
+        except Exception as e:
+            logger.warning(f"Failed to bootstrap lexical index for {user_id}: {e}")
+            return
+        items = results.get("results", []) if isinstance(results, dict) else results
+        docs = []
+        for item in items or []:
+            payload = self._lexical_payload(item, user_id)
+            if payload["id"]:
+                docs.append((payload["id"], payload["memory"], payload))
+        self._lexical.load_scope(user_id, docs)
+        logger.debug(f"Lexical index loaded for {user_id}: {len(docs)} memories")
 
     def _rerank_results(self, results: List[Dict], limit: int) -> List[Dict]:
         """
@@ -84,10 +220,13 @@ class MemoryManager:
         if not results:
             return []
             
-        from datetime import datetime, timezone
-        
         # Helper to parse time
         def get_timestamp(item):
+            # Prefer the numeric payload timestamp written by _add
+            ts_num = (item.get("metadata") or {}).get(PAYLOAD_TIMESTAMP_FIELD)
+            if isinstance(ts_num, (int, float)) and ts_num > 0:
+                return float(ts_num)
+
             # Try to find created_at in various places
             ts_str = item.get("created_at")
             if not ts_str and item.get("metadata"):
@@ -131,6 +270,25 @@ class MemoryManager:
         return results[:limit]
 
     def _search(self, query: str, user_id: str, category: str = None, limit: int = 5) -> List[Dict]:
+        """
+        带缓存的记忆检索。缓存键为 (规范化查询, category, limit)，按 user scope 版本号失效。
+        """
+        cache_key = (" ".join(query.lower().split()), category, limit)
+        version, epoch = self._search_cache.token(user_id)
+        hit, cached = self._search_cache.get(user_id, cache_key)
+        if hit:
+            logger.debug(f"Memory search cache hit for user {user_id}")
+            return [dict(item) for item in cached]
+
+        results = self._search_uncached(query, user_id, category=category, limit=limit)
+        self._search_cache.set(user_id, cache_key, [dict(item) for item in results], version=version, epoch=epoch)
+        return results
+
+    def search_cache_stats(self) -> Dict[str, Any]:
+        """检索缓存的命中/未命中等指标。"""
+        return self._search_cache.stats()
+
+    def _search_uncached(self, query: str, user_id: str, category: str = None, limit: int = 5) -> List[Dict]:
         # mem0 v1.0.3 search method signature: search(query, user_id=None, agent_id=None, run_id=None, limit=100, filters=None)
         filters = None
         if category:
@@ -140,8 +298,30 @@ class MemoryManager:
         
         # Fetch more candidates for reranking (e.g. 2x limit)
         fetch_limit = limit * 2
+
+        # 1. 词法预筛 (BM25)：点名具体人物/项目的查询通常在这里就能命中
+        lexical_list = []
+        if self._lexical_enabled:
+            self._ensure_lexical_scope(user_id)
+            hits, coverage = self._lexical.search(user_id, query, category=category, limit=fetch_limit)
+            if hits:
+                top_score = hits[0][0]
+                for score, payload in hits:
+                    item = dict(payload)
+                    item["score"] = score / top_score
+                    lexical_list.append(item)
+                # 最佳命中覆盖了查询中大部分信息量时，跳过远程 embedding + 向量检索
+                if coverage >= self._lexical_min_coverage:
+                    logger.debug(f"Lexical prefilter hit for user {user_id} (coverage={coverage:.2f}), skipping vector search")
+                    return self._rerank_results(lexical_list, limit)
+
+        # 2. 向量检索
         results = self.memory.search(query, user_id=user_id, limit=fetch_limit, filters=filters)
         results_list = results.get("results", [])
+
+        # 3. 词法结果较弱时与向量结果做 RRF 融合
+        if lexical_list:
+            results_list = reciprocal_rank_fusion([lexical_list, results_list])
         
         # Rerank
         return self._rerank_results(results_list, limit)
@@ -215,17 +395,25 @@ class MemoryManager:
             return results.get("results", [])
         return results
 
-    def delete_memory(self, memory_id: str):
+    def delete_memory(self, memory_id: str, user_id: str = None):
         """
         删除指定 ID 的记忆
+        :param user_id: 记忆所属 scope，用于精确失效检索缓存；未知时让全部缓存失效
         """
         self.memory.delete(memory_id)
+        scope = self._lexical.remove(memory_id) or user_id
+        if scope:
+            self._search_cache.bump(scope)
+        else:
+            self._search_cache.bump_all()
 
     def delete_all_memories(self, user_id: str):
         """
         删除用户的所有记忆
         """
         self.memory.delete_all(user_id=user_id)
+        self._search_cache.bump(user_id)
+        self._lexical.drop_scope(user_id)
 
     def add_insight_memory(self, user_id: str, content: str):
         """添加洞察记忆：长期模式、总结"""
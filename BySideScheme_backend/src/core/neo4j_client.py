@@ -1,14 +1,48 @@
+import asyncio
 import os
-from typing import Any, Dict, List, Optional
-from neo4j import GraphDatabase, Driver
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from neo4j import AsyncDriver, AsyncGraphDatabase, GraphDatabase, Driver
+from neo4j.exceptions import TransientError
+from neo4j.time import Date, DateTime, Time
+from src.core.graph_schema import VALID_RELATION_TYPES
 from src.core.logger import logger
 
+# (cypher, params)
+Statement = Tuple[str, Optional[Dict[str, Any]]]
+
+
+def _plain(value: Any) -> Any:
+    """
+    把结果中的 Neo4j 时间类型转换为 ISO 字符串。
+    时间戳在库中以原生 datetime 存储（可走范围索引），对上层仍保持 ISO 字符串接口。
+    """
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if isinstance(value, (DateTime, Date, Time)):
+        return value.to_native().isoformat()
+    return value
+
+
+def _plain_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [_plain(row) for row in rows]
+
 
 class Neo4jClient:
     """
     Neo4j 连接管理器（单例模式）
     从环境变量读取连接配置，提供 Cypher 查询执行方法，
     应用启动时自动初始化约束和索引。
+    - 同步接口：run_query / run_write / run_batch（供后台任务、迁移脚本使用）
+    - 异步接口：arun_query / arun_write / arun_batch（供 async 路由使用，不阻塞事件循环）
+      NEO4J_ASYNC=1（默认）时基于 AsyncGraphDatabase，首次调用时在当前事件循环中创建驱动；
+      设为 0 时退化为线程池中执行同步接口
+    读操作走 execute_read 事务（集群下路由到只读副本），写操作走 execute_write（驱动对瞬时错误自动重试）；
+    run_write_once 在显式事务中只执行一次，由调用方自行重试（图谱合并写入按自身的退避策略重试并计数）。
+    同步接口默认每次调用新开会话；在 session_scope 内则复用当前线程的同一个会话（写入队列每轮批处理使用）。
     """
 
     _instance: Optional["Neo4jClient"] = None
@@ -27,17 +61,29 @@ class Neo4jClient:
         self._user = os.getenv("NEO4J_USER", "neo4j")
         self._password = os.getenv("NEO4J_PASSWORD", "bysidescheme")
         self._database = os.getenv("NEO4J_DATABASE", "neo4j")
+        # 连接池：最大连接数与获取连接的等待超时（秒）
+        self._driver_config = {
+            "max_connection_pool_size": int(os.getenv("NEO4J_MAX_POOL_SIZE", "50")),
+            "connection_acquisition_timeout": float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "10")),
+            "max_connection_lifetime": float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+        }
+        self._async_enabled = os.getenv("NEO4J_ASYNC", "1") == "1"
+        self._async_driver: Optional[AsyncDriver] = None
+        self._local = threading.local()  # session_scope 绑定到当前线程的会话
 
         logger.info(f"Connecting to Neo4j at {self._uri} (db={self._database})")
         try:
             self._driver: Driver = GraphDatabase.driver(
-                self._uri, auth=(self._user, self._password)
+                self._uri, auth=(self._user, self._password), **self._driver_config
             )
             # Verify connectivity
             self._driver.verify_connectivity()
             logger.info("Neo4j connection established successfully.")
         except Exception as e:
             logger.error(f"Failed to connect to Neo4j: {e}", exc_info=True)
+            # 未完成初始化：关闭本次创建的驱动，下次实例化时重新连接
+            if getattr(self, "_driver", None) is not None:
+                self._driver.close()
             raise
 
         self._init_schema()
@@ -75,6 +121,18 @@ class Neo4jClient:
                 "CREATE CONSTRAINT constraint_org_unique IF NOT EXISTS "
                 "FOR (n:Organization) REQUIRE (n.user_id, n.name) IS UNIQUE",
             ),
+            # 图谱迁移记录
+            (
+                "constraint_schema_migration_unique",
+                "CREATE CONSTRAINT constraint_schema_migration_unique IF NOT EXISTS "
+                "FOR (m:SchemaMigration) REQUIRE m.name IS UNIQUE",
+            ),
+            # 每个用户一个变更日志计数节点
+            (
+                "constraint_change_log_unique",
+                "CREATE CONSTRAINT constraint_change_log_unique IF NOT EXISTS "
+                "FOR (l:GraphChangeLog) REQUIRE l.user_id IS UNIQUE",
+            ),
         ]
 
         indexes = [
@@ -99,7 +157,59 @@ class Neo4jClient:
                 "index_org_user",
                 "CREATE INDEX index_org_user IF NOT EXISTS FOR (n:Organization) ON (n.user_id)",
             ),
+            # 所有实体共享 Entity 标签，(user_id, name) 复合索引用于不区分类型的节点定位
+            (
+                "index_entity_user_name",
+                "CREATE INDEX index_entity_user_name IF NOT EXISTS FOR (n:Entity) ON (n.user_id, n.name)",
+            ),
+            # 变更日志：按序号增量读取 / 按时间窗口读取
+            (
+                "index_change_user_seq",
+                "CREATE INDEX index_change_user_seq IF NOT EXISTS FOR (c:GraphChange) ON (c.user_id, c.seq)",
+            ),
+            (
+                "index_change_user_time",
+                "CREATE INDEX index_change_user_time IF NOT EXISTS FOR (c:GraphChange) ON (c.user_id, c.timestamp)",
+            ),
+            # 关系证据历史：按 (user_id, source, rel_type, target) 定位某条关系的全部证据
+            (
+                "index_evidence_relation",
+                "CREATE INDEX index_evidence_relation IF NOT EXISTS "
+                "FOR (ev:Evidence) ON (ev.user_id, ev.source, ev.rel_type, ev.target)",
+            ),
+            # 时间点查询的物化检查点：按用户倒序取最近一个
+            (
+                "index_checkpoint_user_seq",
+                "CREATE INDEX index_checkpoint_user_seq IF NOT EXISTS "
+                "FOR (cp:GraphCheckpoint) ON (cp.user_id, cp.seq)",
+            ),
+            # 时间戳范围索引（原生 datetime）：按时间窗口筛选 / 按更新时间排序走索引
+            (
+                "index_entity_user_updated",
+                "CREATE RANGE INDEX index_entity_user_updated IF NOT EXISTS "
+                "FOR (n:Entity) ON (n.user_id, n.updated_at)",
+            ),
+            (
+                "index_event_user_updated",
+                "CREATE RANGE INDEX index_event_user_updated IF NOT EXISTS "
+                "FOR (n:Event) ON (n.user_id, n.updated_at)",
+            ),
+            (
+                "index_project_user_updated",
+                "CREATE RANGE INDEX index_project_user_updated IF NOT EXISTS "
+                "FOR (n:Project) ON (n.user_id, n.updated_at)",
+            ),
+            (
+                "index_evidence_created",
+                "CREATE RANGE INDEX index_evidence_created IF NOT EXISTS FOR (ev:Evidence) ON (ev.created_at)",
+            ),
         ]
+        # 关系属性索引必须指定关系类型：为每种合法关系类型建 updated_at 范围索引
+        for rel_type in sorted(VALID_RELATION_TYPES):
+            name = f"index_rel_{rel_type.lower()}_updated"
+            indexes.append(
+                (name, f"CREATE RANGE INDEX {name} IF NOT EXISTS FOR ()-[r:{rel_type}]-() ON (r.updated_at)")
+            )
 
         try:
             with self._driver.session(database=self._database) as session:
@@ -126,6 +236,32 @@ class Neo4jClient:
     # Query helpers
     # ------------------------------------------------------------------
 
+    @contextmanager
+    def session_scope(self):
+        """
+        在当前线程内让多次同步调用复用同一个会话（如写入队列一轮批处理中的分组写入与变更日志），
+        省去逐次创建会话的开销，且这些调用按 bookmark 因果有序。会话不跨线程共享，可嵌套。
+        """
+        if getattr(self._local, "session", None) is not None:
+            yield
+            return
+        with self._driver.session(database=self._database) as session:
+            self._local.session = session
+            try:
+                yield
+            finally:
+                self._local.session = None
+
+    @contextmanager
+    def _session(self):
+        """当前线程处于 session_scope 中时复用其会话，否则为本次调用新开一个。"""
+        session = getattr(self._local, "session", None)
+        if session is not None:
+            yield session
+            return
+        with self._driver.session(database=self._database) as session:
+            yield session
+
     def run_query(
         self, cypher: str, params: Dict[str, Any] = None
     ) -> List[Dict[str, Any]]:
@@ -135,9 +271,12 @@ class Neo4jClient:
         """
         params = params or {}
         try:
-            with self._driver.session(database=self._database) as session:
-                result = session.run(cypher, params)
-                return [record.data() for record in result]
+            with self._session() as session:
+
+                def _tx(tx):
+                    return _plain_rows(tx.run(cypher, params).data())
+
+                return session.execute_read(_tx)
         except Exception as e:
             logger.error(f"Neo4j query error: {e}\nCypher: {cypher}\nParams: {params}", exc_info=True)
             raise
@@ -150,19 +289,147 @@ class Neo4jClient:
         """
         params = params or {}
         try:
-            with self._driver.session(database=self._database) as session:
+            with self._session() as session:
 
                 def _tx(tx):
-                    result = tx.run(cypher, params)
-                    return [record.data() for record in result]
+                    return _plain_rows(tx.run(cypher, params).data())
 
                 return session.execute_write(_tx)
         except Exception as e:
             logger.error(f"Neo4j write error: {e}\nCypher: {cypher}\nParams: {params}", exc_info=True)
             raise
 
+    def run_write_once(
+        self, cypher: str, params: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        在显式（非托管）写事务中执行一次，不经驱动的自动重试。
+        瞬时错误（死锁等）原样抛出且不记错误日志，由调用方决定是否重试。
+        """
+        params = params or {}
+        try:
+            with self._session() as session:
+                with session.begin_transaction() as tx:
+                    rows = _plain_rows(tx.run(cypher, params).data())
+                    tx.commit()
+                    return rows
+        except TransientError:
+            raise
+        except Exception as e:
+            logger.error(f"Neo4j write error: {e}\nCypher: {cypher}\nParams: {params}", exc_info=True)
+            raise
+
+    def run_batch(self, statements: Sequence[Statement]) -> List[List[Dict[str, Any]]]:
+        """
+        在同一个写事务中依次执行多条语句，全部成功才提交。
+        返回与 statements 一一对应的结果列表。
+        """
+        try:
+            with self._session() as session:
+
+                def _tx(tx):
+                    return [_plain_rows(tx.run(cypher, params or {}).data()) for cypher, params in statements]
+
+                return session.execute_write(_tx)
+        except Exception as e:
+            logger.error(f"Neo4j batch write error ({len(statements)} statements): {e}", exc_info=True)
+            raise
+
+    def run_auto_commit(
+        self, cypher: str, params: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        在自动提交事务中执行语句。
+        CALL { ... } IN TRANSACTIONS 等需要自行分批提交的语句只能这样执行。
+        """
+        params = params or {}
+        try:
+            with self._session() as session:
+                result = session.run(cypher, params)
+                return [_plain(record.data()) for record in result]
+        except Exception as e:
+            logger.error(f"Neo4j auto-commit error: {e}\nCypher: {cypher}\nParams: {params}", exc_info=True)
+            raise
+
+    # ------------------------------------------------------------------
+    # 异步接口
+    # ------------------------------------------------------------------
+
+    def _get_async_driver(self) -> AsyncDriver:
+        if self._async_driver is None:
+            self._async_driver = AsyncGraphDatabase.driver(
+                self._uri, auth=(self._user, self._password), **self._driver_config
+            )
+            logger.info("Neo4j async driver created.")
+        return self._async_driver
+
+    async def arun_query(
+        self, cypher: str, params: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """run_query 的异步版本（读事务）。"""
+        if not self._async_enabled:
+            return await asyncio.to_thread(self.run_query, cypher, params)
+        params = params or {}
+        try:
+            async with self._get_async_driver().session(database=self._database) as session:
+
+                async def _tx(tx):
+                    result = await tx.run(cypher, params)
+                    return _plain_rows(await result.data())
+
+                return await session.execute_read(_tx)
+        except Exception as e:
+            logger.error(f"Neo4j async query error: {e}\nCypher: {cypher}\nParams: {params}", exc_info=True)
+            raise
+
+    async def arun_write(
+        self, cypher: str, params: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """run_write 的异步版本（写事务）。"""
+        if not self._async_enabled:
+            return await asyncio.to_thread(self.run_write, cypher, params)
+        params = params or {}
+        try:
+            async with self._get_async_driver().session(database=self._database) as session:
+
+                async def _tx(tx):
+                    result = await tx.run(cypher, params)
+                    return _plain_rows(await result.data())
+
+                return await session.execute_write(_tx)
+        except Exception as e:
+            logger.error(f"Neo4j async write error: {e}\nCypher: {cypher}\nParams: {params}", exc_info=True)
+            raise
+
+    async def arun_batch(self, statements: Sequence[Statement]) -> List[List[Dict[str, Any]]]:
+        """run_batch 的异步版本：多条语句在同一个写事务中执行。"""
+        if not self._async_enabled:
+            return await asyncio.to_thread(self.run_batch, statements)
+        try:
+            async with self._get_async_driver().session(database=self._database) as session:
+
+                async def _tx(tx):
+                    results = []
+                    for cypher, params in statements:
+                        result = await tx.run(cypher, params or {})
+                        results.append(_plain_rows(await result.data()))
+                    return results
+
+                return await session.execute_write(_tx)
+        except Exception as e:
+            logger.error(f"Neo4j async batch write error ({len(statements)} statements): {e}", exc_info=True)
+            raise
+
     def close(self):
         """关闭驱动连接。"""
         if self._driver:
             self._driver.close()
             logger.info("Neo4j driver closed.")
+
+    async def aclose(self):
+        """关闭异步驱动（须在创建它的事件循环中调用），再关闭同步驱动。"""
+        if self._async_driver is not None:
+            await self._async_driver.close()
+            self._async_driver = None
+            logger.info("Neo4j async driver closed.")
+        self.close()
@@ -0,0 +1,49 @@
+import re
+from typing import List
+
+# 句子切分：中英文句末标点（含紧随的引号/括号）、换行、英文句号后的空白
+_SENTENCE_RE = re.compile(r".+?(?:[。！？!?；;…]+[”’」』\"'）)]*|\n+|\.(?=\s)|$)", re.S)
+
+
+def split_sentences(text: str) -> List[str]:
+    """按句切分，保留句末标点与换行，各句拼接后等于原文。"""
+    return [s for s in _SENTENCE_RE.findall(text) if s]
+
+
+def chunk_text(text: str, max_chars: int = 2000, overlap_chars: int = 200) -> List[str]:
+    """
+    把长文本切成不超过 max_chars 的块，块边界落在句子之间。
+    相邻块之间重叠上一块末尾不超过 overlap_chars 的完整句子，避免跨句的关系被切断；
+    单句超过 max_chars 时按长度硬切。短文本原样返回单块。
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    sentences: List[str] = []
+    for sentence in split_sentences(text):
+        while len(sentence) > max_chars:
+            sentences.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        sentences.append(sentence)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for sentence in sentences:
+        if current and size + len(sentence) > max_chars:
+            chunks.append("".join(current).strip())
+            # 新块以上一块末尾的若干完整句子开头
+            overlap: List[str] = []
+            overlap_size = 0
+            for previous in reversed(current):
+                if overlap_size + len(previous) > overlap_chars or overlap_size + len(previous) + len(sentence) > max_chars:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += len(previous)
+            current, size = overlap, overlap_size
+        current.append(sentence)
+        size += len(sentence)
+    if current:
+        chunks.append("".join(current).strip())
+    return [c for c in chunks if c]
@@ -0,0 +1,112 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Hashable, List, Tuple
+
+
+class _KeyState:
+    def __init__(self):
+        self.pending: Deque[Tuple[Any, Future]] = deque()
+        self.active = False
+
+
+class KeyedWriteQueue:
+    """
+    按 key（如 user_id）串行化的写入队列，带组提交：
+    - 同一 key 同一时刻只有一个线程在执行写入，不同 key 之间互不阻塞
+    - 写入进行期间到达的同 key 写入先排队，当前批次完成后按到达顺序合并为一批（最多 max_batch 项）
+      交给 apply_batch 一次执行，apply_batch 按相同顺序返回每一项的结果（结果为异常实例时抛给对应调用方）
+    - 不启动后台线程：由调用方线程轮流执行批次，每个线程一次只执行一批，随后交出执行权；
+      自己的结果已就绪的调用方立即返回，不会被后续到达的写入拖住。
+      apply_batch 抛出的异常传给该批次中的每个调用方
+    - apply_batch 内不能向同一个 key 再提交写入（会等待自己而死锁），这种重入直接抛出 RuntimeError
+    """
+
+    def __init__(
+        self,
+        apply_batch: Callable[[Hashable, List[Any]], List[Any]],
+        max_batch: int = 32,
+        name: str = "write_queue",
+    ):
+        self.name = name
+        self.max_batch = max(1, max_batch)
+        self._apply_batch = apply_batch
+        self._keys: Dict[Hashable, _KeyState] = {}
+        self._lock = threading.Lock()
+        self._turn = threading.Condition(self._lock)
+        self._local = threading.local()
+        self._submitted = 0
+        self._batches = 0
+        self._coalesced = 0
+        self._largest_batch = 0
+        self._failed_batches = 0
+
+    def submit(self, key: Hashable, item: Any) -> Any:
+        """提交一项写入并等待其结果。"""
+        return self._submit(key, [item])[0].result()
+
+    def submit_many(self, key: Hashable, items: List[Any]) -> List[Any]:
+        """
+        按顺序提交多项写入（中间不会插入其它调用方的写入），等待全部完成。
+        返回与 items 一一对应的结果；某项失败时对应位置为异常实例。
+        """
+        return [future.exception() or future.result() for future in self._submit(key, items)]
+
+    def _submit(self, key: Hashable, items: List[Any]) -> List[Future]:
+        if key in getattr(self._local, "applying", ()):
+            raise RuntimeError(f"{self.name}: re-entrant submit for key {key!r} would deadlock")
+        futures: List[Future] = [Future() for _ in items]
+        with self._lock:
+            state = self._keys.setdefault(key, _KeyState())
+            state.pending.extend(zip(items, futures))
+            self._submitted += len(items)
+        while True:
+            with self._lock:
+                # 等到自己的结果就绪，或者轮到自己执行下一批
+                while state.active and not all(f.done() for f in futures):
+                    self._turn.wait()
+                if all(f.done() for f in futures):
+                    return futures
+                state.active = True
+            self._run_one_batch(key, state)
+
+    def _run_one_batch(self, key: Hashable, state: _KeyState):
+        with self._lock:
+            batch = [state.pending.popleft() for _ in range(min(len(state.pending), self.max_batch))]
+            self._batches += 1
+            self._coalesced += len(batch) - 1
+            self._largest_batch = max(self._largest_batch, len(batch))
+        applying = self._local.__dict__.setdefault("applying", set())
+        applying.add(key)
+        try:
+            results = self._apply_batch(key, [item for item, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except BaseException as e:
+            with self._lock:
+                self._failed_batches += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            applying.discard(key)
+            with self._lock:
+                state.active = False
+                if not state.pending and self._keys.get(key) is state:
+                    del self._keys[key]
+                self._turn.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "submitted": self._submitted,
+                "batches": self._batches,
+                "coalesced": self._coalesced,  # 与其它写入合并执行、未单独成批的项数
+                "largest_batch": self._largest_batch,
+                "failed_batches": self._failed_batches,
+                "pending": sum(len(s.pending) for s in self._keys.values()),
+            }
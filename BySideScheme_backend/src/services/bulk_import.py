@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from src.core.database import DatabaseManager
+from src.core.graph_engine import GraphEngine
+from src.core.graph_store import ENDPOINT_NOT_FOUND
+from src.core.logger import logger
+
+if TYPE_CHECKING:  # 仅用于类型标注，导入服务本身不依赖 mem0
+    from src.core.memory import MemoryManager
+
+# 同时处理的条目数（每条会调用记忆写入与图谱抽取的 LLM）
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "4"))
+# 单个作业最多条目数
+IMPORT_MAX_ITEMS = int(os.getenv("IMPORT_MAX_ITEMS", "20000"))
+
+# JSONL 每行中依次尝试的正文字段；date / timestamp 字段会作为前缀保留
+_JSONL_TEXT_FIELDS = ("text", "content", "fact", "note")
+
+_HEADING_RE = re.compile(r"^#{1,6}\s+(.*)$")
+_RULE_RE = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,})\s*$")
+
+
+def parse_jsonl(raw: str) -> List[str]:
+    """每行一个 JSON 对象（或字符串），取 text / content / fact / note 字段作为一条笔记。"""
+    items = []
+    for line_no, line in enumerate(raw.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"第 {line_no} 行不是合法的 JSON: {e}")
+        if isinstance(record, str):
+            text = record
+        elif isinstance(record, dict):
+            text = next((record[f] for f in _JSONL_TEXT_FIELDS if record.get(f)), None)
+            if text is None:
+                raise ValueError(f"第 {line_no} 行缺少正文字段（{' / '.join(_JSONL_TEXT_FIELDS)}）")
+            date = record.get("date") or record.get("timestamp")
+            if date:
+                text = f"[{date}] {text}"
+        else:
+            raise ValueError(f"第 {line_no} 行应为 JSON 对象或字符串")
+        text = str(text).strip()
+        if text:
+            items.append(text)
+    return items
+
+
+def parse_markdown(raw: str) -> List[str]:
+    """按标题或分隔线（---）切分，每段为一条笔记，所属标题（常为日期）保留在正文前。"""
+    items: List[str] = []
+    heading: Optional[str] = None
+    body: List[str] = []
+
+    def flush():
+        text = "\n".join(body).strip()
+        if text:
+            items.append(f"{heading}\n{text}" if heading else text)
+
+    for line in raw.splitlines():
+        match = _HEADING_RE.match(line)
+        if match:
+            flush()
+            heading, body = match.group(1).strip(), []
+        elif _RULE_RE.match(line):
+            flush()
+            body = []
+        else:
+            body.append(line)
+    flush()
+    return items
+
+
+class BulkImportService:
+    """
+    批量历史导入：把上传的笔记逐条写入记忆库并抽取到图谱。
+    - 作业与每条笔记的处理状态保存在 SQLite（import_jobs / import_items），每条完成即落盘
+    - 后台线程中以 IMPORT_CONCURRENCY 的并发度处理；进程重启后 resume_pending 从未完成的条目继续
+    - 图谱抽取（LLM 调用）失败或合并报告中有失败条目时该条记为 failed，start(retry_failed=True) 重新处理
+    - 崩溃时正在处理的条目会被重新处理一次（图谱合并幂等，证据按原文去重）；
+      每条先写图谱再写记忆，图谱失败的条目重试时不会重复写入记忆
+    - 状态中给出本次运行的吞吐量（条/秒）与预计剩余时间
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        memory_manager: Optional["MemoryManager"] = None,
+        graph_engine: Optional[GraphEngine] = None,
+        concurrency: Optional[int] = None,
+    ):
+        self.db = db
+        self.memory_manager = memory_manager
+        self.graph_engine = graph_engine
+        self.concurrency = max(1, concurrency or IMPORT_CONCURRENCY)
+        # 进程内运行状态：job_id -> {"thread", "cancel", "started", "processed"}
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        user_id: str,
+        items: List[str],
+        source_format: str,
+        memory: bool = True,
+        graph: bool = True,
+        situation_context: str = "",
+    ) -> str:
+        """创建作业并在后台开始处理，返回 job_id。"""
+        if not items:
+            raise ValueError("导入内容为空")
+        if len(items) > IMPORT_MAX_ITEMS:
+            raise ValueError(f"单次导入最多 {IMPORT_MAX_ITEMS} 条，当前 {len(items)} 条")
+        job_id = str(uuid.uuid4())
+        options = {"memory": memory, "graph": graph, "situation_context": situation_context}
+        self.db.create_import_job(job_id, user_id, items, source_format, options)
+        logger.info(f"Import job {job_id} created for user {user_id}: {len(items)} {source_format} items")
+        self.start(job_id)
+        return job_id
+
+    def start(self, job_id: str, retry_failed: bool = False) -> bool:
+        """启动（或继续）作业；retry_failed=True 时失败的条目一并重新处理。已在运行时返回 False。"""
+        with self._lock:
+            current = self._runs.get(job_id)
+            if current is not None and current["thread"].is_alive():
+                return False
+            if retry_failed:
+                self.db.reset_failed_import_items(job_id)
+            run = {"cancel": threading.Event(), "started": time.monotonic(), "processed": 0}
+            run["thread"] = threading.Thread(
+                target=self._run, args=(job_id, run), name=f"import-{job_id[:8]}", daemon=True
+            )
+            self._runs[job_id] = run
+        self.db.update_import_job(job_id, "pending")
+        run["thread"].start()
+        return True
+
+    def resume_pending(self) -> List[str]:
+        """服务启动时调用：继续上次进程退出时未完成的作业。"""
+        job_ids = self.db.list_import_jobs(statuses=["pending", "running"])
+        for job_id in job_ids:
+            self.start(job_id)
+        if job_ids:
+            logger.info(f"Resuming {len(job_ids)} unfinished import jobs")
+        return job_ids
+
+    def cancel(self, job_id: str) -> bool:
+        """停止领取新条目，已在处理的条目完成后作业置为 cancelled；可再次 start 继续。"""
+        with self._lock:
+            run = self._runs.get(job_id)
+        if run is not None and run["thread"].is_alive():
+            run["cancel"].set()
+            return True
+        job = self.db.get_import_job(job_id)
+        if job is not None and job["status"] in ("pending", "running"):
+            self.db.update_import_job(job_id, "cancelled")
+            return True
+        return False
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.db.get_import_job(job_id)
+        if job is None:
+            return None
+        remaining = job["total"] - job["completed"] - job["failed"]
+        throughput = eta = None
+        with self._lock:
+            run = self._runs.get(job_id)
+            processed = run["processed"] if run else 0
+            elapsed = time.monotonic() - run["started"] if run else 0.0
+        if processed and elapsed > 0:
+            throughput = processed / elapsed
+            if job["status"] == "running":
+                eta = round(remaining / throughput, 1)
+        return {
+            **job,
+            "remaining": remaining,
+            "throughput": round(throughput, 3) if throughput else None,
+            "eta_seconds": eta,
+            "errors": self.db.list_import_errors(job_id, limit=20),
+            "warnings": self.db.list_import_errors(job_id, limit=20, status="done"),
+        }
+
+    def _run(self, job_id: str, run: Dict[str, Any]):
+        job = self.db.get_import_job(job_id)
+        if job is None:
+            return
+        user_id, options = job["user_id"], job["options"]
+        pending = self.db.list_pending_import_items(job_id)
+        self.db.update_import_job(job_id, "running")
+        logger.info(
+            f"Import job {job_id} running for user {user_id}: "
+            f"{len(pending)}/{job['total']} items left, concurrency={self.concurrency}"
+        )
+
+        def _process(item):
+            seq, content = item
+            if run["cancel"].is_set():
+                return
+            try:
+                warning = self._ingest(user_id, content, options)
+                self.db.mark_import_item(job_id, seq, "done", warning)
+            except Exception as e:
+                logger.warning(f"Import job {job_id} item {seq} failed: {e}")
+                self.db.mark_import_item(job_id, seq, "failed", str(e))
+            with self._lock:
+                run["processed"] += 1
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"import-{job_id[:8]}") as pool:
+                list(pool.map(_process, pending))
+        except Exception as e:
+            logger.error(f"Import job {job_id} failed: {e}", exc_info=True)
+            self.db.update_import_job(job_id, "failed", str(e))
+            return
+
+        status = "cancelled" if run["cancel"].is_set() else "completed"
+        self.db.update_import_job(job_id, status)
+        elapsed = time.monotonic() - run["started"]
+        logger.info(
+            f"Import job {job_id} {status}: {run['processed']} items in {elapsed:.1f}s "
+            f"({run['processed'] / elapsed if elapsed > 0 else 0:.2f} items/s)"
+        )
+
+    def _ingest(self, user_id: str, content: str, options: Dict[str, Any]) -> Optional[str]:
+        """
+        先抽取到图谱、再写入记忆。LLM 调用失败或图谱写入失败时抛出（条目记为失败，不写入记忆）；
+        关系端点不存在只是抽取结果的遗漏，不影响条目成功，作为警告返回。
+        """
+        warning = None
+        if options.get("graph", True) and self.graph_engine is not None:
+            result = self.graph_engine.process_document(
+                user_id,
+                content,
+                situation_context=options.get("situation_context", ""),
+                strict=True,
+            )
+            errors = (result["report"] or {}).get("errors") or []
+            failures = [e for e in errors if e["error"] != ENDPOINT_NOT_FOUND]
+            if failures:
+                raise RuntimeError(
+                    f"图谱写入失败 {len(failures)} 项: "
+                    + "; ".join(f"{e['item']}: {e['error']}" for e in failures[:3])
+                )
+            if errors:
+                warning = f"关系端点不存在 {len(errors)} 项: " + "; ".join(e["item"] for e in errors[:3])
+        if options.get("memory", True) and self.memory_manager is not None:
+            self.memory_manager.add_narrative_memory(user_id, content, source="bulk_import")
+        return warning
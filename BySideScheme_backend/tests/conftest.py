@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from src.core.database import DatabaseManager
+from src.core.embedded_graph_store import EmbeddedGraphStore
+from src.core.llm_client import LLMClientFactory
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    """构造使用进程内图存储与临时 SQLite 的 GraphEngine；不调用 LLM 的测试不需要真实客户端。"""
+    from src.core.graph_engine import GraphEngine
+
+    monkeypatch.setattr(LLMClientFactory, "create_client", staticmethod(lambda name=None: (None, "test-model")))
+    engines = []
+
+    def _make(store=None):
+        db = DatabaseManager(os.path.join(tmp_path, "app.db"))
+        engine = GraphEngine(store or EmbeddedGraphStore(os.path.join(tmp_path, "graph.db")), db=db)
+        engines.append(engine)
+        return engine
+
+    yield _make
+    for engine in engines:
+        if engine._store is not None:
+            engine._store.close()
+
+
+@pytest.fixture
+def engine(make_engine):
+    return make_engine()
+
+
+def person(name, **props):
+    return {"name": name, "type": "Person", "properties": props}
+
+
+def relation(source, target, rel_type="TRUSTS", **props):
+    return {"source": source, "target": target, "type": rel_type, "properties": props}
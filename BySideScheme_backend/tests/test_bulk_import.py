@@ -0,0 +1,95 @@
+import os
+
+from src.core.database import DatabaseManager
+from src.core.graph_store import ENDPOINT_NOT_FOUND
+from src.services.bulk_import import BulkImportService, parse_jsonl, parse_markdown
+
+
+class FakeGraphEngine:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def process_document(self, user_id, text, situation_context="", strict=False):
+        self.calls.append((text, strict))
+        if text in self.failing:
+            if text.startswith("llm"):
+                raise TimeoutError("Request timed out.")
+            return {"report": {"errors": [{"kind": "entity", "item": text, "error": "write failed"}]}}
+        if text.startswith("noisy"):
+            miss = {"kind": "relation", "item": "甲-[TRUSTS]->乙", "error": ENDPOINT_NOT_FOUND}
+            return {"report": {"entities": 1, "relations": 0, "errors": [miss]}}
+        return {"report": {"entities": 1, "relations": 0, "errors": []}}
+
+
+class FakeMemory:
+    def __init__(self):
+        self.added = []
+
+    def add_narrative_memory(self, user_id, content, source=None):
+        self.added.append(content)
+
+
+def _wait(service, job_id):
+    service._runs[job_id]["thread"].join(timeout=10)
+    return service.status(job_id)
+
+
+def _service(tmp_path, graph, memory):
+    db = DatabaseManager(os.path.join(tmp_path, "app.db"))
+    return BulkImportService(db, memory_manager=memory, graph_engine=graph, concurrency=2)
+
+
+def test_parsers_keep_dates_and_headings():
+    assert parse_jsonl('{"date": "2026-01-02", "text": "开会"}\n"备注"\n') == ["[2026-01-02] 开会", "备注"]
+    assert parse_markdown("# 周一\n见客户\n---\n写周报\n") == ["周一\n见客户", "周一\n写周报"]
+
+
+def test_failed_extraction_marks_item_failed_and_resume_retries_it(tmp_path):
+    graph, memory = FakeGraphEngine(failing={"llm down", "partial"}), FakeMemory()
+    service = _service(tmp_path, graph, memory)
+
+    job_id = service.submit("u1", ["a", "llm down", "partial", "b"], "jsonl")
+    status = _wait(service, job_id)
+    assert status["status"] == "completed"
+    assert (status["completed"], status["failed"]) == (2, 2)
+    assert {e["seq"] for e in status["errors"]} == {1, 2}
+    # 图谱失败的条目不写入记忆，抽取以 strict 模式调用
+    assert sorted(memory.added) == ["a", "b"]
+    assert all(strict for _, strict in graph.calls)
+
+    graph.failing.clear()
+    assert service.start(job_id, retry_failed=True)
+    status = _wait(service, job_id)
+    assert (status["completed"], status["failed"]) == (4, 0)
+    assert sorted(memory.added) == ["a", "b", "llm down", "partial"]
+    assert [text for text, _ in graph.calls[4:]] == ["llm down", "partial"]
+
+
+def test_missing_relation_endpoint_is_a_warning_not_a_failure(tmp_path):
+    graph, memory = FakeGraphEngine(), FakeMemory()
+    service = _service(tmp_path, graph, memory)
+
+    status = _wait(service, service.submit("u1", ["noisy note", "b"], "jsonl"))
+    assert (status["completed"], status["failed"]) == (2, 0)
+    assert sorted(memory.added) == ["b", "noisy note"]
+    assert status["errors"] == []
+    assert [w["seq"] for w in status["warnings"]] == [0]
+    assert "甲-[TRUSTS]->乙" in status["warnings"][0]["error"]
+
+
+def test_resume_pending_skips_finished_items(tmp_path):
+    graph, memory = FakeGraphEngine(), FakeMemory()
+    service = _service(tmp_path, graph, memory)
+    db = service.db
+    db.create_import_job("job-1", "u1", ["a", "b", "c"], "markdown", {"memory": True, "graph": True})
+    db.update_import_job("job-1", "running")
+    db.mark_import_item("job-1", 0, "done")
+
+    # 模拟进程重启：新的服务实例从断点继续
+    restarted = _service(tmp_path, graph, memory)
+    assert restarted.resume_pending() == ["job-1"]
+    status = _wait(restarted, "job-1")
+    assert status["status"] == "completed"
+    assert status["completed"] == 3
+    assert [text for text, _ in graph.calls] == ["b", "c"]
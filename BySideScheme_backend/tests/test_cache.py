@@ -0,0 +1,71 @@
+from src.core.cache import VersionedLRUCache
+from tests.conftest import person
+
+
+def test_bump_invalidates_only_its_scope():
+    cache = VersionedLRUCache(max_entries=8)
+    cache.set("u1", "k", 1)
+    cache.set("u2", "k", 2)
+    cache.bump("u1")
+    assert cache.get("u1", "k") == (False, None)
+    assert cache.get("u2", "k") == (True, 2)
+
+
+def test_set_is_refused_when_scope_was_bumped_during_compute():
+    cache = VersionedLRUCache(max_entries=8)
+    version, epoch = cache.token("u1")
+    cache.bump("u1")
+    cache.set("u1", "k", "stale", version=version, epoch=epoch)
+    assert cache.get("u1", "k") == (False, None)
+
+
+def test_set_is_refused_when_bump_all_ran_during_compute():
+    cache = VersionedLRUCache(max_entries=8)
+    version, epoch = cache.token("u1")
+    cache.bump_all()
+    cache.set("u1", "k", "stale", version=version, epoch=epoch)
+    assert cache.get("u1", "k") == (False, None)
+
+    version, epoch = cache.token("u1")
+    cache.set("u1", "k", "fresh", version=version, epoch=epoch)
+    assert cache.get("u1", "k") == (True, "fresh")
+
+
+def test_versions_of_scopes_without_entries_are_pruned():
+    cache = VersionedLRUCache(max_entries=2)
+    cache.set("live", "k", 1, version=cache.version("live"))
+    for i in range(cache._max_scopes + 1):
+        cache.bump(f"u{i}")
+    assert cache.stats()["scopes"] <= cache._max_scopes
+    assert cache.get("live", "k") == (True, 1)
+
+
+def test_pruned_scope_does_not_accept_stale_token():
+    cache = VersionedLRUCache(max_entries=2)
+    cache.bump("u1")
+    version, epoch = cache.token("u1")
+    cache.bump("u1")
+    for i in range(cache._max_scopes + 1):
+        cache.bump(f"other{i}")
+    assert "u1" not in cache._versions
+    cache.set("u1", "k", "stale", version=version, epoch=epoch)
+    assert cache.get("u1", "k") == (False, None)
+
+
+def test_lru_and_weight_limits_evict_oldest_entries():
+    cache = VersionedLRUCache(max_entries=2, max_weight=5)
+    cache.set("u1", "a", "a", weight=2)
+    cache.set("u1", "b", "b", weight=2)
+    cache.get("u1", "a")
+    cache.set("u1", "c", "c", weight=2)
+    assert cache.get("u1", "b") == (False, None)
+    assert cache.get("u1", "a") == (True, "a")
+    cache.set("u1", "huge", "huge", weight=6)
+    assert cache.get("u1", "huge") == (False, None)
+
+
+def test_graph_reads_are_invalidated_by_writes(engine):
+    assert engine.get_graph_data("u1")["nodes"] == []
+    engine.merge_to_graph("u1", {"entities": [person("甲")], "relations": []})
+    names = [node["name"] for node in engine.get_graph_data("u1")["nodes"]]
+    assert names == ["甲"]
@@ -0,0 +1,179 @@
+import os
+
+import pytest
+
+from src.core.embedded_graph_store import EmbeddedGraphStore
+
+NOW = "2026-03-01T00:00:00+00:00"
+LATER = "2026-03-02T00:00:00+00:00"
+
+
+def _entity(idx, name, **props):
+    return {"idx": idx, "name": name, "props": {"name": name, **props}, "label": f"{name} (Person)"}
+
+
+def _relation(idx, source, target, evidence=(), weight=0.5):
+    return {
+        "idx": idx,
+        "source": source,
+        "target": target,
+        "weight": weight,
+        "sentiment": "neutral",
+        "confidence": 0.5,
+        "evidence": list(evidence),
+        "label": f"{source}-[TRUSTS]->{target}",
+    }
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return os.path.join(tmp_path, "graph.db")
+
+
+@pytest.fixture
+def store(db_path):
+    store = EmbeddedGraphStore(db_path)
+    yield store
+    store.close()
+
+
+def _names(store, user_id="u1"):
+    return sorted(node["name"] for node in store.fetch_nodes(user_id))
+
+
+def test_merge_is_idempotent_and_persisted(store, db_path):
+    errors = []
+    written = store.merge_entities("u1", "Person", [_entity(0, "陈总"), _entity(1, "李工")], NOW, errors)
+    assert [written[i]["created"] for i in (0, 1)] == [True, True]
+    again = store.merge_entities("u1", "Person", [_entity(0, "陈总", role="VP")], LATER, errors)
+    assert again[0] == {"created": False, "id": written[0]["id"]}
+    assert errors == []
+
+    reopened = EmbeddedGraphStore(db_path)
+    try:
+        node = reopened.fetch_nodes("u1", ["陈总"])[0]
+        assert node["properties"]["role"] == "VP"
+        assert node["properties"]["created_at"] == NOW
+    finally:
+        reopened.close()
+
+
+def test_relation_evidence_is_deduplicated_and_paged_newest_first(store):
+    store.merge_entities("u1", "Person", [_entity(0, "陈总"), _entity(1, "李工")], NOW, [])
+    first = store.merge_relations("u1", "TRUSTS", "Person", "Person", [_relation(0, "陈总", "李工", ["a", "b"])], NOW, [])
+    assert first[0]["created"] and first[0]["before"] is None
+    second = store.merge_relations(
+        "u1", "TRUSTS", "Person", "Person", [_relation(0, "陈总", "李工", ["b", "c"], weight=0.9)], LATER, []
+    )
+    assert second[0]["created"] is False
+    assert second[0]["before"]["weight"] == 0.5
+
+    edge = store.fetch_edges("u1")[0]
+    assert edge["evidence_count"] == 3
+    assert edge["weight"] == 0.9
+    page = store.edge_evidence("u1", edge["id"], limit=2)
+    assert page["total"] == 3
+    assert [item["text"] for item in page["items"]] == ["c", "b"]
+
+
+def test_relation_with_missing_endpoint_is_reported(store):
+    errors = []
+    written = store.merge_relations("u1", "TRUSTS", "Entity", "Entity", [_relation(0, "甲", "乙")], NOW, errors)
+    assert written == {}
+    assert errors == [{"kind": "relation", "item": "甲-[TRUSTS]->乙", "error": "endpoint entity not found"}]
+
+
+def test_failed_entity_merge_rolls_back_partial_rows(store, db_path, monkeypatch):
+    original = store._save_node
+    calls = []
+
+    def _flaky(user_id, name, node):
+        calls.append(name)
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        original(user_id, name, node)
+
+    monkeypatch.setattr(store, "_save_node", _flaky)
+    errors = []
+    assert store.merge_entities("u1", "Person", [_entity(0, "甲"), _entity(1, "乙")], NOW, errors) == {}
+    assert [e["item"] for e in errors] == ["甲 (Person)", "乙 (Person)"]
+    monkeypatch.setattr(store, "_save_node", original)
+
+    # 下一次写操作提交时不能把失败批次中已执行的语句一并提交
+    store.merge_entities("u1", "Person", [_entity(0, "丙")], NOW, [])
+    assert _names(store) == ["丙"]
+    reopened = EmbeddedGraphStore(db_path)
+    try:
+        assert _names(reopened) == ["丙"]
+    finally:
+        reopened.close()
+
+
+def test_failed_relation_merge_rolls_back_evidence(store, db_path, monkeypatch):
+    store.merge_entities("u1", "Person", [_entity(0, "甲"), _entity(1, "乙")], NOW, [])
+
+    def _broken(user_id, key, edge):
+        raise RuntimeError("disk full")
+
+    original = store._save_edge
+    monkeypatch.setattr(store, "_save_edge", _broken)
+    errors = []
+    store.merge_relations("u1", "TRUSTS", "Person", "Person", [_relation(0, "甲", "乙", ["证据"])], NOW, errors)
+    assert len(errors) == 1
+    monkeypatch.setattr(store, "_save_edge", original)
+
+    store.append_changes("u1", [{"change_type": "new_entity", "name": "甲"}], NOW)
+    reopened = EmbeddedGraphStore(db_path)
+    try:
+        assert reopened.fetch_edges("u1") == []
+        count = reopened._conn.execute("SELECT count(*) FROM graph_evidence").fetchone()[0]
+        assert count == 0
+    finally:
+        reopened.close()
+
+
+def test_merge_entity_into_rewires_relations_and_drops_self_loops(store):
+    store.merge_entities("u1", "Person", [_entity(0, "陈总"), _entity(1, "Chen总"), _entity(2, "李工")], NOW, [])
+    rows = [_relation(0, "Chen总", "李工", ["x"]), _relation(1, "Chen总", "陈总", ["y"])]
+    store.merge_relations("u1", "TRUSTS", "Person", "Person", rows, NOW, [])
+
+    result = store.merge_entity_into("u1", "Chen总", "陈总")
+    assert result["relations"] == 2
+    assert _names(store) == ["李工", "陈总"]
+    edges = store.fetch_edges("u1", [{"source": "陈总", "rel_type": "TRUSTS", "target": "李工"}])
+    assert len(edges) == 1 and edges[0]["evidence"] == ["x"]
+    assert len(store.fetch_edges("u1")) == 1
+
+
+def test_merge_entity_into_rejects_missing_or_mistyped_endpoints(store):
+    store.merge_entities("u1", "Person", [_entity(0, "陈总"), _entity(1, "Chen总")], NOW, [])
+    assert store.merge_entity_into("u1", "不存在", "陈总") is None
+    assert store.merge_entity_into("u1", "Chen总", "陈总", etype="Organization") is None
+    assert _names(store) == ["Chen总", "陈总"]
+    assert store.merge_entity_into("u1", "Chen总", "陈总", etype="Person")["relations"] == 0
+
+
+def test_clear_batch_removes_everything_in_bounded_steps(store):
+    store.merge_entities("u1", "Person", [_entity(i, f"人{i}") for i in range(5)], NOW, [])
+    rows = [_relation(i, f"人{i}", f"人{i + 1}", [f"e{i}"]) for i in range(4)]
+    store.merge_relations("u1", "TRUSTS", "Person", "Person", rows, NOW, [])
+    store.merge_entities("u2", "Person", [_entity(0, "别人")], NOW, [])
+
+    steps = 0
+    while True:
+        counts = store.clear_batch("u1", batch_size=2)
+        steps += 1
+        if not any(counts.values()):
+            break
+    assert steps > 2
+    assert store.fetch_nodes("u1") == [] and store.fetch_edges("u1") == []
+    assert _names(store, "u2") == ["别人"]
+
+
+def test_read_changes_filters_by_seq_and_time(store):
+    store.append_changes("u1", [{"change_type": "new_entity", "name": "甲"}], NOW)
+    store.append_changes("u1", [{"change_type": "new_entity", "name": "乙"}], LATER)
+    assert store.change_seq("u1") == 2
+    assert [c["name"] for c in store.read_changes("u1", since_seq=1)] == ["乙"]
+    assert [c["name"] for c in store.read_changes("u1", until_iso=NOW)] == ["甲"]
+    assert [c["name"] for c in store.read_changes("u1", latest_first=True, limit=1)] == ["乙"]
@@ -0,0 +1,106 @@
+import pytest
+
+from src.core.entity_aliases import AliasIndex, alias_key, normalize_name
+
+
+def _index(*entities, aliases=()):
+    index = AliasIndex()
+    index.load_user("u1", [{"name": n, "type": t} for n, t in entities], list(aliases))
+    return index
+
+
+def test_normalize_name_folds_width_case_and_punctuation():
+    assert normalize_name("ＶＰ　Chen") == "vpchen"
+    assert normalize_name("Project-Phoenix") == "projectphoenix"
+
+
+def test_alias_key_keeps_title_but_folds_equivalent_titles():
+    assert alias_key("VP Chen", "Person") == alias_key("Chen总", "Person") == "chen|总"
+    assert alias_key("张工", "Person") != alias_key("张总", "Person")
+    assert alias_key("老张", "Person") == "张|老"
+    # 称谓本身就是全名时保留原名
+    assert alias_key("总", "Person") == "总|"
+
+
+def test_resolve_links_latin_and_chinese_forms():
+    index = _index(("陈总", "Person"))
+    assert index.resolve("u1", "Chen总", "Person") == "陈总"
+    assert index.resolve("u1", "VP Chen", "Person") == "陈总"
+
+    index = _index(("Chen总", "Person"))
+    assert index.resolve("u1", "陈总", "Person") == "Chen总"
+
+
+@pytest.mark.parametrize(
+    "existing, surface",
+    [
+        ("张总", "章总"),  # 同音不同字
+        ("王经理", "汪总"),  # 同音且称谓不同
+        ("张总", "张工"),  # 同一个姓、不同称谓
+        ("王总", "汪总"),
+    ],
+)
+def test_resolve_never_merges_different_chinese_names(existing, surface):
+    index = _index((existing, "Person"))
+    assert index.resolve("u1", surface, "Person") is None
+    # 关系端点没有类型，同样不能合并
+    assert index.resolve("u1", surface) is None
+
+
+def test_resolve_latin_form_is_ambiguous_between_homophones():
+    index = _index(("张总", "Person"), ("章总", "Person"))
+    assert index.resolve("u1", "Zhang总", "Person") is None
+
+
+def test_resolve_endpoint_uses_plain_key_for_non_person_entities():
+    index = _index(("凤凰项目", "Project"), ("张工", "Person"))
+    assert index.resolve("u1", "凤凰 项目") == "凤凰项目"
+    # 非人物实体不去称谓：“张工程”不是“张工”
+    assert index.resolve("u1", "张工程") is None
+
+
+def test_resolve_fuzzy_latin_names_only():
+    index = _index(("Jennifer", "Person"), ("Project 1", "Project"))
+    assert index.resolve("u1", "Jenifer", "Person") == "Jennifer"
+    assert index.resolve("u1", "Project 2", "Project") is None
+    # 称谓不同时不做拼写纠错
+    assert index.resolve("u1", "Jenifer工", "Person") is None
+
+
+@pytest.mark.parametrize(
+    "existing, surface, etype",
+    [
+        ("Jason", "Mason", "Person"),
+        ("Maria", "Marie", "Person"),
+        ("Project Alpha", "Project Alpho", "Project"),
+        ("Adrian", "drian", "Person"),  # 首字母缺失
+    ],
+)
+def test_resolve_does_not_merge_substitutions_or_first_letter_edits(existing, surface, etype):
+    index = _index((existing, etype))
+    assert index.resolve("u1", surface, etype) is None
+
+
+def test_resolve_uses_recorded_aliases_and_respects_type():
+    index = _index(("陈总", "Person"), aliases=[{"alias": "老板", "canonical_name": "陈总"}])
+    assert index.resolve("u1", "老板") == "陈总"
+    assert index.resolve("u1", "陈总", "Project") is None
+
+
+def test_duplicate_groups_follow_resolve_rules():
+    index = _index(
+        ("陈总", "Person"),
+        ("Chen总", "Person"),
+        ("VP Chen", "Person"),
+        ("张总", "Person"),
+        ("章总", "Person"),
+        ("张工", "Person"),
+        ("王经理", "Person"),
+        ("汪总", "Person"),
+    )
+    assert index.duplicate_groups("u1") == [("Person", ["Chen总", "VP Chen", "陈总"])]
+
+
+def test_duplicate_groups_skip_latin_form_with_ambiguous_chinese_match():
+    index = _index(("张总", "Person"), ("章总", "Person"), ("Zhang总", "Person"))
+    assert index.duplicate_groups("u1") == []
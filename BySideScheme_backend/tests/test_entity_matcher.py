@@ -0,0 +1,48 @@
+from src.core.entity_matcher import AhoCorasick, EntityIndex
+
+
+def test_automaton_finds_overlapping_patterns_in_order():
+    automaton = AhoCorasick(["陈总", "陈总监", "总监"])
+    assert automaton.find("找陈总监签字") == [(1, "陈总"), (1, "陈总监"), (2, "总监")]
+
+
+def test_latin_patterns_require_word_boundaries():
+    automaton = AhoCorasick(["Alex"])
+    assert automaton.find("alexander met ALEX.") == [(14, "Alex")]
+    assert AhoCorasick(["天网"]).find("天网项目") == [(0, "天网")]
+
+
+def _index():
+    index = EntityIndex()
+    index.load_user(
+        "u1",
+        [
+            {"name": "陈总", "type": "Person", "neighbors": ["天网项目"], "aliases": ["VP Chen"]},
+            {"name": "天网项目", "type": "Project", "neighbors": ["陈总"]},
+            {"name": "我", "type": "Person"},
+        ],
+    )
+    return index
+
+
+def test_match_resolves_aliases_and_skips_single_char_names():
+    index = _index()
+    assert index.match("u1", "我昨天跟 vp chen 聊了天网项目，陈总说再等等") == ["陈总", "天网项目"]
+    assert index.match("u2", "陈总") == []
+
+
+def test_incremental_updates_rebuild_automaton():
+    index = _index()
+    assert index.match("u1", "李工来了") == []
+    index.add_entities("u1", [("李工", "Person")])
+    index.add_aliases("u1", [("小李", "李工")])
+    assert index.match("u1", "小李和李工") == ["李工"]
+    index.invalidate("u1")
+    assert not index.has_user("u1")
+
+
+def test_expand_adds_neighbors_within_limit():
+    index = _index()
+    index.add_edges("u1", [("陈总", "李工")])
+    assert index.expand("u1", ["陈总"]) == [("陈总", "Person"), ("天网项目", "Project"), ("李工", "Unknown")]
+    assert index.expand("u1", ["陈总"], limit=1) == [("陈总", "Person")]
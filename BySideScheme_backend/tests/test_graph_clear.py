@@ -0,0 +1,96 @@
+import threading
+import time
+
+from tests.conftest import person, relation
+
+
+def _wait_outbox_drained(engine, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if engine.outbox_stats()["pending"] == 0 and not engine.outbox_stats()["users"]:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _names(engine, user_id="u1"):
+    return sorted(n["name"] for n in engine.get_graph_data(user_id)["nodes"])
+
+
+def test_delta_and_etag_version_reset_after_clear(engine):
+    engine.merge_to_graph(
+        "u1", {"entities": [person("甲"), person("乙")], "relations": [relation("甲", "乙", evidence="x")]}
+    )
+    version = engine.get_change_seq("u1")
+    assert engine.get_graph_delta("u1", version)["reset"] is False
+
+    status = engine.clear_graph("u1", wait=True)
+    assert status["status"] == "completed"
+    assert (status["entities"], status["relations"]) == (2, 1)
+
+    # ETag 取变更序号：清空后必然变化，旧版本号的增量请求返回 reset + 空图
+    assert engine.get_change_seq("u1") > version
+    delta = engine.get_graph_delta("u1", version)
+    assert delta["reset"] is True
+    assert delta["nodes"] == [] and delta["edges"] == []
+    assert engine.detect_changes("u1", latest_first=True)[0]["change_type"] == "cleared"
+
+
+def test_merges_during_clear_are_replayed_after_it(engine):
+    engine.merge_to_graph("u1", {"entities": [person("旧")], "relations": []})
+    entered, release = threading.Event(), threading.Event()
+    original = engine.store.clear_batch
+
+    def _slow_clear(*args, **kwargs):
+        entered.set()
+        release.wait(5)
+        return original(*args, **kwargs)
+
+    engine.store.clear_batch = _slow_clear
+    engine.clear_graph("u1")
+    assert entered.wait(5)
+
+    reports = [engine.merge_to_graph("u1", {"entities": [person(name)], "relations": []}) for name in ("新1", "新2")]
+    assert all(report["queued"] for report in reports)
+    assert engine.outbox_stats()["pending"] == 2
+
+    release.set()
+    engine._clear_jobs["u1"]["thread"].join(5)
+    assert engine.get_clear_status("u1")["status"] == "completed"
+    assert _wait_outbox_drained(engine)
+
+    assert _names(engine) == ["新1", "新2"]
+    changes = [c["description"] for c in engine.detect_changes("u1")]
+    assert changes[-3:] == ["清空图谱", "新增Person: 新1", "新增Person: 新2"]
+
+
+def test_outbox_records_from_before_the_clear_are_discarded(engine):
+    # 清空前已暂存、尚未回放的写入（例如图存储刚恢复、回放尚未轮到该用户）
+    engine.db.enqueue_graph_outbox("u1", {"entities": [person("过期")], "relations": []})
+    engine.clear_graph("u1", wait=True)
+    assert engine.db.count_graph_outbox().get("pending", 0) == 0
+    assert _wait_outbox_drained(engine)
+    assert _names(engine) == []
+
+
+def test_cancelled_clear_records_partial_change(engine):
+    engine.merge_to_graph("u1", {"entities": [person(f"人{i}") for i in range(5)], "relations": []})
+    engine.clear_batch_size = 1
+    entered, release = threading.Event(), threading.Event()
+    original = engine.store.clear_batch
+
+    def _slow_clear(*args, **kwargs):
+        entered.set()
+        release.wait(5)
+        return original(*args, **kwargs)
+
+    engine.store.clear_batch = _slow_clear
+    engine.clear_graph("u1")
+    assert entered.wait(5)
+    assert engine.cancel_clear("u1")
+    release.set()
+    engine._clear_jobs["u1"]["thread"].join(5)
+
+    assert engine.get_clear_status("u1")["status"] == "cancelled"
+    assert engine.detect_changes("u1", latest_first=True)[0]["change_type"] == "partially_cleared"
+    assert len(_names(engine)) == 4
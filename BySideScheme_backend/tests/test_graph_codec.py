@@ -0,0 +1,34 @@
+import json
+
+from src.core.graph_codec import dumps, encode_compact, iter_json
+
+
+def _graph():
+    nodes = [
+        {"id": "1", "name": "甲", "type": "Person", "properties": {"name": "甲", "role": "经理"}},
+        {"id": "2", "name": "乙", "type": "Person", "properties": {"name": "乙"}},
+    ]
+    edges = [
+        {"id": "9", "source": "1", "target": "2", "type": "TRUSTS", "weight": 0.8, "sentiment": "positive",
+         "confidence": 0.6, "evidence": ["a", "b"]},
+    ]
+    return {"version": 3, "nodes": nodes, "edges": edges}
+
+
+def test_compact_format_interns_strings_and_drops_evidence_text():
+    compact = encode_compact(_graph())
+    strings = compact["strings"]
+    assert compact["format"] == "compact" and compact["version"] == 3
+    assert [strings[i] for i in compact["nodes"]["name"]] == ["甲", "乙"]
+    assert [strings[i] for i in compact["nodes"]["type"]] == ["Person", "Person"]
+    assert strings.count("Person") == 1
+    assert compact["nodes"]["properties"] == [{"role": "经理"}, {}]
+    assert [strings[i] for i in compact["edges"]["source"]] == ["1"]
+    assert compact["edges"]["evidence_count"] == [2]
+    assert "evidence" not in compact["edges"]
+
+
+def test_streamed_json_matches_single_shot_encoding():
+    data = {"version": 1, "items": list(range(25)), "nested": {"names": ["甲"] * 7}}
+    streamed = b"".join(iter_json(data, chunk_items=4, buffer_bytes=8))
+    assert json.loads(streamed) == json.loads(dumps(data)) == data
@@ -0,0 +1,70 @@
+import time
+from datetime import datetime, timezone
+
+from src.core.graph_history import GraphState, relation_delta
+from tests.conftest import person, relation
+
+
+def _replay(changes):
+    state = GraphState()
+    for change in changes:
+        state.apply(change)
+    return state
+
+
+def _new_entity(name):
+    return {"change_type": "new_entity", "name": name, "entity_type": "Person", "props": '{"name": "%s"}' % name}
+
+
+def _new_relation(source, target, **delta):
+    return {"change_type": "new_relation", "source": source, "rel_type": "TRUSTS", "target": target, "delta": delta}
+
+
+def test_relation_delta_keeps_only_changed_fields():
+    current = {"weight": 0.8, "sentiment": "neutral", "confidence": 0.5}
+    assert relation_delta(current, None) == current
+    assert relation_delta(current, {"weight": 0.3, "sentiment": "neutral", "confidence": 0.5}) == {"weight": 0.8}
+
+
+def test_replay_applies_updates_merges_and_clears():
+    state = _replay(
+        [
+            _new_entity("陈总"),
+            _new_entity("VP Chen"),
+            _new_entity("李工"),
+            _new_relation("李工", "VP Chen", weight=0.4),
+            {"change_type": "updated_relation", "source": "李工", "rel_type": "TRUSTS", "target": "VP Chen",
+             "delta": {"weight": 0.9}},
+            {"change_type": "merged_entity", "name": "VP Chen", "into": "陈总"},
+        ]
+    )
+    assert sorted(state.nodes) == ["李工", "陈总"]
+    assert state.edges[("李工", "TRUSTS", "陈总")]["weight"] == 0.9
+
+    state.apply({"change_type": "cleared"})
+    assert state.to_graph_data() == {"nodes": [], "edges": []}
+
+
+def test_checkpoint_encoding_round_trips():
+    state = _replay([_new_entity("甲"), _new_entity("乙"), _new_relation("甲", "乙", weight=0.7)])
+    decoded = GraphState.decode(state.encode())
+    assert decoded.to_graph_data() == state.to_graph_data()
+
+
+def test_graph_as_of_replays_changes_up_to_the_timestamp(engine):
+    engine.checkpoint_interval = 1
+    engine.merge_to_graph("u1", {"entities": [person("甲"), person("乙")], "relations": [relation("甲", "乙")]})
+    time.sleep(0.01)
+    before_delete = datetime.now(timezone.utc).isoformat()
+    time.sleep(0.01)
+    engine.delete_entity("u1", "乙")
+    engine.merge_to_graph("u1", {"entities": [person("丙")], "relations": []})
+
+    assert engine.store.load_checkpoint("u1", before_delete) is not None
+    past = engine.get_graph_as_of("u1", before_delete)
+    assert sorted(n["name"] for n in past["nodes"]) == ["乙", "甲"]
+    assert len(past["edges"]) == 1
+
+    now = engine.get_graph_as_of("u1", datetime.now(timezone.utc).isoformat())
+    assert sorted(n["name"] for n in now["nodes"]) == ["丙", "甲"]
+    assert now["edges"] == []
@@ -0,0 +1,58 @@
+import numpy as np
+
+from src.core.graph_metrics import (
+    CentralityCalculator,
+    GraphSnapshot,
+    sampled_betweenness,
+    signed_influence,
+    weighted_pagerank,
+)
+
+
+def _snapshot(edges, names="abcd"):
+    nodes = [{"id": str(i), "name": name, "type": "Person"} for i, name in enumerate(names)]
+    ids = {name: str(i) for i, name in enumerate(names)}
+    return GraphSnapshot(
+        nodes,
+        [
+            {"source": ids[s], "target": ids[t], "type": rel_type, "weight": 1.0, "confidence": 1.0}
+            for s, t, rel_type in edges
+        ],
+    )
+
+
+def test_betweenness_matches_exact_values_on_a_path():
+    # a-b-c-d：b 位于 (a,c)、(a,d) 的最短路径上，共 3 对其余节点
+    snapshot = _snapshot([("a", "b", "TRUSTS"), ("b", "c", "TRUSTS"), ("c", "d", "TRUSTS")])
+    assert np.allclose(sampled_betweenness(snapshot), [0.0, 2 / 3, 2 / 3, 0.0])
+    # 分批计算与一次性计算一致
+    assert np.allclose(sampled_betweenness(snapshot, batch_size=1), [0.0, 2 / 3, 2 / 3, 0.0])
+
+
+def test_pagerank_sums_to_one_and_favors_the_hub():
+    snapshot = _snapshot([("a", "b", "TRUSTS"), ("a", "c", "TRUSTS"), ("a", "d", "TRUSTS")])
+    scores, iterations = weighted_pagerank(snapshot)
+    assert abs(scores.sum() - 1.0) < 1e-6
+    assert scores.argmax() == 0 and np.allclose(scores[1:], scores[1])
+    warm, warm_iterations = weighted_pagerank(snapshot, start=scores)
+    assert np.allclose(warm, scores) and warm_iterations < iterations
+
+
+def test_signed_influence_follows_relation_sentiment():
+    snapshot = _snapshot([("b", "a", "TRUSTS"), ("c", "d", "COMPETES_WITH")])
+    influence = signed_influence(snapshot, weighted_pagerank(snapshot)[0])
+    assert influence[0] > 0 and influence[3] < 0
+
+
+def test_calculator_reuses_betweenness_for_weight_only_changes():
+    calculator = CentralityCalculator()
+    snapshot = _snapshot([("a", "b", "TRUSTS"), ("b", "c", "TRUSTS")], names="abc")
+    first = calculator.compute("u1", 1, snapshot)
+    assert not first["incremental"]
+
+    updated = calculator.compute("u1", 2, snapshot, changes=[{"change_type": "updated_relation"}])
+    assert updated["incremental"]
+    assert np.array_equal(updated["betweenness"], first["betweenness"])
+
+    cleared = calculator.compute("u1", 3, snapshot, changes=[{"change_type": "cleared"}])
+    assert not cleared["incremental"]
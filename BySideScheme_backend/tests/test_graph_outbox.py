@@ -0,0 +1,45 @@
+import os
+import time
+
+from neo4j.exceptions import ServiceUnavailable
+
+from src.core.embedded_graph_store import EmbeddedGraphStore
+from tests.conftest import person, relation
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_writes_while_disconnected_go_to_outbox_and_replay_in_order(make_engine, tmp_path, monkeypatch):
+    monkeypatch.setenv("GRAPH_RECONNECT_BACKOFF", "0.05")
+    state = {"up": False}
+
+    def factory():
+        if not state["up"]:
+            raise ServiceUnavailable("down")
+        return EmbeddedGraphStore(os.path.join(tmp_path, "graph.db"))
+
+    engine = make_engine(factory)
+    people = [person("甲"), person("乙")]
+    for weight in (0.3, 0.6, 0.9):
+        report = engine.merge_to_graph("u1", {"entities": people, "relations": [relation("甲", "乙", weight=weight)]})
+        assert report["queued"] is True
+    # 断连期间不经写入队列执行任何批次
+    assert engine.write_stats()["submitted"] == 0
+    assert engine.outbox_stats()["pending"] == 3
+
+    state["up"] = True
+    assert _wait_until(lambda: engine.outbox_stats()["pending"] == 0 and not engine.outbox_stats()["reconnecting"])
+
+    edges = engine.get_graph_data("u1")["edges"]
+    assert [edge["weight"] for edge in edges] == [0.9]
+    descriptions = [c["description"] for c in engine.detect_changes("u1")]
+    assert descriptions[:2] == ["新增Person: 甲", "新增Person: 乙"]
+    assert not any(d.startswith("新增Person") for d in descriptions[2:])
+    assert engine.outbox_stats()["replayed"] == 3
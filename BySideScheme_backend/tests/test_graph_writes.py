@@ -0,0 +1,193 @@
+import threading
+
+from neo4j.exceptions import TransientError
+
+from src.core import graph_store
+from src.core.graph_store import Neo4jGraphStore
+from tests.conftest import person, relation
+
+
+class FlakyNeo4j:
+    """只实现 run_write_once：前 failures 次抛出瞬时错误。"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def run_write_once(self, cypher, params):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise TransientError("deadlock")
+        return [{"idx": row["idx"], "created": True, "id": "1"} for row in params.get("rows", [])]
+
+    def run_write(self, cypher, params):
+        raise AssertionError("merge writes must not use the driver's managed retries")
+
+
+class UnwindNeo4j:
+    """模拟 UNWIND + MERGE：同一语句里新建的对象对后面的行同样表现为新建；source 为 "缺失" 的关系找不到端点。"""
+
+    def __init__(self):
+        self.nodes = {}
+        self.relations = {}
+        self.batches = []
+
+    def run_write_once(self, cypher, params):
+        rows = params["rows"]
+        self.batches.append(rows)
+        created_now, result = set(), []
+        for row in rows:
+            if "row.source" not in cypher:
+                if row["name"] not in self.nodes:
+                    created_now.add(row["name"])
+                self.nodes.setdefault(row["name"], {}).update(row["props"])
+                result.append({"idx": row["idx"], "created": row["name"] in created_now, "id": row["name"]})
+                continue
+            if row["source"] == "缺失":
+                continue
+            key = (row["source"], row["target"])
+            before = self.relations.get(key)
+            if before is None:
+                created_now.add(key)
+            self.relations[key] = {k: row[k] for k in ("weight", "sentiment", "confidence")}
+            created = key in created_now
+            result.append({"idx": row["idx"], "created": created, "id": "r", "before": None if created else before})
+        return result
+
+
+def test_duplicate_entity_in_one_batch_is_created_once():
+    client = UnwindNeo4j()
+    store = Neo4jGraphStore(client)
+    rows = [
+        {"idx": 0, "name": "甲", "props": {"role": "经理"}, "label": "甲 (Person)"},
+        {"idx": 1, "name": "甲", "props": {"role": "总监"}, "label": "甲 (Person)"},
+    ]
+    written = store.merge_entities("u1", "Person", rows, "2026-01-01T00:00:00+00:00", [])
+    assert [written[0]["created"], written[1]["created"]] == [True, False]
+    assert len(client.batches[0]) == 1
+    assert client.nodes["甲"] == {"role": "总监"}
+
+
+def test_duplicate_relation_in_one_batch_reports_previous_row_as_before():
+    client = UnwindNeo4j()
+    store = Neo4jGraphStore(client)
+    rows = [
+        {"idx": i, "source": "甲", "target": "乙", "weight": w, "sentiment": "neutral", "confidence": 0.5,
+         "evidence": evidence, "label": "甲-[TRUSTS]->乙"}
+        for i, (w, evidence) in enumerate([(0.3, ["a"]), (0.8, ["a", "b"])])
+    ]
+    written = store.merge_relations("u1", "TRUSTS", "Person", "Person", rows, "2026-01-01T00:00:00+00:00", [])
+    assert written[0]["created"] is True and written[1]["created"] is False
+    assert written[1]["before"]["weight"] == 0.3
+    assert client.batches[0][0]["evidence"] == ["a", "b"]
+    assert client.relations[("甲", "乙")]["weight"] == 0.8
+
+
+def test_duplicates_of_failed_relation_report_errors():
+    store = Neo4jGraphStore(UnwindNeo4j())
+    errors = []
+    rows = [
+        {"idx": i, "source": "缺失", "target": "乙", "weight": 0.5, "sentiment": "neutral", "confidence": 0.5,
+         "evidence": [], "label": "缺失-[TRUSTS]->乙"}
+        for i in range(2)
+    ]
+    assert store.merge_relations("u1", "TRUSTS", "Person", "Person", rows, "2026-01-01T00:00:00+00:00", errors) == {}
+    assert [e["error"] for e in errors] == ["endpoint entity not found"] * 2
+
+
+def test_transient_errors_are_retried_once_per_attempt_and_counted(monkeypatch):
+    monkeypatch.setattr(graph_store, "GRAPH_WRITE_BACKOFF", 0)
+    client = FlakyNeo4j(failures=2)
+    store = Neo4jGraphStore(client)
+    errors = []
+    row = {"idx": 0, "name": "甲", "props": {}, "label": "甲 (Person)"}
+    written = store.merge_entities("u1", "Person", [row], "2026-01-01T00:00:00+00:00", errors)
+    assert written == {0: {"created": True, "id": "1"}}
+    assert client.calls == 3
+    assert store.write_retries == 2
+    assert errors == []
+
+
+def test_exhausted_retries_report_item_errors(monkeypatch):
+    monkeypatch.setattr(graph_store, "GRAPH_WRITE_BACKOFF", 0)
+    client = FlakyNeo4j(failures=100)
+    store = Neo4jGraphStore(client)
+    errors = []
+    row = {"idx": 0, "name": "甲", "props": {}, "label": "甲 (Person)"}
+    assert store.merge_entities("u1", "Person", [row], "2026-01-01T00:00:00+00:00", errors) == {}
+    assert [e["item"] for e in errors] == ["甲 (Person)"]
+    # 整批 + 逐条各 GRAPH_WRITE_RETRIES + 1 次
+    assert client.calls == 2 * (graph_store.GRAPH_WRITE_RETRIES + 1)
+
+
+def test_delete_and_consolidate_run_through_the_write_queue(engine):
+    engine.merge_to_graph("u1", {"entities": [person("陈总"), person("李工"), person("王经理")], "relations": []})
+    # 别名解析之前写入的重复实体（直接写存储，绕过解析）
+    row = {"idx": 0, "name": "VP Chen", "props": {"name": "VP Chen"}, "label": "VP Chen (Person)"}
+    engine.store.merge_entities("u1", "Person", [row], "2026-01-01T00:00:00+00:00", [])
+    submitted = engine.write_stats()["submitted"]
+
+    result = engine.consolidate_duplicates("u1")
+    assert result["merged"] == 1
+    engine.delete_entity("u1", "王经理")
+    assert engine.write_stats()["submitted"] == submitted + 2
+
+    names = sorted(n["name"] for n in engine.get_graph_data("u1")["nodes"])
+    assert len(names) == 2 and "李工" in names and "王经理" not in names
+    changes = [c["change_type"] for c in engine.detect_changes("u1")]
+    assert "merged_entity" in changes and "deleted_entity" in changes
+
+
+def test_queued_operation_waits_for_in_flight_merge(engine):
+    """删除实体在同一用户的合并写入完成之后才执行。"""
+    entered, release = threading.Event(), threading.Event()
+    original = engine.store.merge_entities
+
+    def _slow_merge(*args, **kwargs):
+        entered.set()
+        release.wait(5)
+        return original(*args, **kwargs)
+
+    engine.store.merge_entities = _slow_merge
+    writer = threading.Thread(target=engine.merge_to_graph, args=("u1", {"entities": [person("甲")], "relations": []}))
+    writer.start()
+    assert entered.wait(5)
+    deleter = threading.Thread(target=engine.delete_entity, args=("u1", "甲"))
+    deleter.start()
+    deleter.join(0.2)
+    assert deleter.is_alive()
+    release.set()
+    writer.join(5)
+    deleter.join(5)
+    assert engine.get_graph_data("u1")["nodes"] == []
+
+
+class GuardNeo4j:
+    """只响应 merge_entity_into 的存在性检查；记录收到的语句。"""
+
+    def __init__(self, dup, canon):
+        self.counts = {"dup": dup, "canon": canon}
+        self.queries = []
+
+    def run_query(self, cypher, params):
+        self.queries.append(cypher)
+        return [dict(self.counts)]
+
+    def run_write(self, cypher, params):
+        raise AssertionError("guard must stop the merge before any write")
+
+
+def test_merge_entity_into_requires_both_endpoints_with_matching_label():
+    # 只剩规范实体（同名查询曾被计为 2 条）、或同名节点不唯一时都不合并
+    for dup, canon in [(0, 2), (2, 1), (1, 0)]:
+        client = GuardNeo4j(dup, canon)
+        assert Neo4jGraphStore(client).merge_entity_into("u1", "VP Chen", "陈总", etype="Person") is None
+        assert ":Person {user_id: $user_id, name: $dup}" in client.queries[0]
+        assert ":Person {user_id: $user_id, name: $canon}" in client.queries[0]
+    assert Neo4jGraphStore(GuardNeo4j(1, 1)).merge_entity_into("u1", "甲", "甲") is None
+
+
+def test_merge_does_not_mutate_caller_properties(engine):
+    props = {"role": "VP"}
+    engine.merge_to_graph("u1", {"entities": [{"name": "陈总", "type": "Person", "properties": props}], "relations": []})
+    assert props == {"role": "VP"}
@@ -0,0 +1,56 @@
+from src.core.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+def _payload(doc_id, category="work"):
+    return {"id": doc_id, "metadata": {"category": category}}
+
+
+def _index():
+    index = LexicalIndex()
+    index.load_scope(
+        "u1",
+        [
+            ("m1", "天网项目延期，陈总很不满", _payload("m1")),
+            ("m2", "周五和李工讨论 v2.0 发布计划", _payload("m2")),
+            ("m3", "午饭和同事聊天", _payload("m3", category="life")),
+        ],
+    )
+    return index
+
+
+def test_tokenize_mixes_latin_words_and_cjk_bigrams():
+    assert tokenize("天网项目 v2.0") == ["v2.0", "天网", "网项", "项目"]
+    assert tokenize("甲") == ["甲"]
+    assert tokenize("") == []
+
+
+def test_search_ranks_matching_document_first_with_full_coverage():
+    hits, coverage = _index().search("u1", "天网项目")
+    assert hits[0][1]["id"] == "m1"
+    assert coverage == 1.0
+
+
+def test_unknown_terms_lower_coverage_and_category_filters_hits():
+    index = _index()
+    _, coverage = index.search("u1", "天网 预算审批")
+    assert 0.0 < coverage < 1.0
+    hits, _ = index.search("u1", "和李工 和同事", category="life")
+    assert [payload["id"] for _, payload in hits] == ["m3"]
+
+
+def test_upsert_and_remove_keep_postings_in_sync():
+    index = _index()
+    index.upsert("u1", "m1", "季度预算", _payload("m1"))
+    assert index.search("u1", "天网项目")[0] == []
+    assert index.search("u1", "预算")[0][0][1]["id"] == "m1"
+    assert index.remove("m1") == "u1"
+    assert index.search("u1", "预算") == ([], 0.0)
+    # 未加载的 scope 不接受增量写入
+    index.upsert("u2", "x", "预算", _payload("x"))
+    assert not index.has_scope("u2")
+
+
+def test_rrf_rewards_items_ranked_by_both_lists():
+    merged = reciprocal_rank_fusion([[{"id": "a"}, {"id": "b"}], [{"id": "b"}, {"id": "c"}]])
+    assert [item["id"] for item in merged] == ["b", "a", "c"]
+    assert reciprocal_rank_fusion([[{"id": "a"}], [{"id": "a"}]])[0]["score"] == 1.0
@@ -0,0 +1,148 @@
+import itertools
+
+import pytest
+
+pytest.importorskip("mem0")
+
+from src.core import memory as memory_module  # noqa: E402
+from src.core.memory import PAYLOAD_TIMESTAMP_FIELD, MemoryManager  # noqa: E402
+
+
+class FakeQdrantClient:
+    def __init__(self):
+        self.payload_indexes = []
+        self.collection_updates = []
+
+    def create_payload_index(self, collection_name, field_name, field_schema):
+        self.payload_indexes.append((collection_name, field_name, field_schema))
+
+    def update_collection(self, collection_name, quantization_config):
+        self.collection_updates.append((collection_name, quantization_config))
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.client = FakeQdrantClient()
+        self.collection_name = "mem0"
+
+
+class FakeMem0:
+    """只实现 MemoryManager 用到的 mem0 接口：记录写入，向量检索返回该用户同类别的全部记忆。"""
+
+    def __init__(self):
+        self.vector_store = FakeVectorStore()
+        self.items = {}
+        self.searches = []
+        self._ids = itertools.count(1)
+
+    def add(self, content, user_id=None, metadata=None):
+        memory_id = f"m{next(self._ids)}"
+        self.items[memory_id] = {"id": memory_id, "memory": content, "metadata": metadata, "user_id": user_id}
+        return {"results": [{"id": memory_id, "memory": content, "event": "ADD"}]}
+
+    def search(self, query, user_id=None, limit=100, filters=None):
+        self.searches.append(query)
+        category = (filters or {}).get("category")
+        results = [
+            {**item, "score": 0.5}
+            for item in self.items.values()
+            if item["user_id"] == user_id and (category is None or item["metadata"]["category"] == category)
+        ]
+        return {"results": results[:limit]}
+
+    def get_all(self, user_id=None, limit=100):
+        return {"results": [item for item in self.items.values() if item["user_id"] == user_id][:limit]}
+
+    def delete(self, memory_id):
+        self.items.pop(memory_id, None)
+
+    def delete_all(self, user_id=None):
+        for memory_id in [k for k, v in self.items.items() if v["user_id"] == user_id]:
+            del self.items[memory_id]
+
+
+@pytest.fixture
+def make_manager(monkeypatch):
+    """构造使用 FakeMem0 的 MemoryManager（绕过单例，每次新建）。"""
+
+    def _make(**env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        fake = FakeMem0()
+        monkeypatch.setattr(memory_module.Memory, "from_config", staticmethod(lambda config: fake))
+        monkeypatch.setattr(MemoryManager, "_instance", None)
+        monkeypatch.setattr(MemoryManager, "_initialized", False)
+        return MemoryManager(config={}), fake
+
+    return _make
+
+
+def test_collection_tuning_creates_payload_indexes_and_quantization(make_manager):
+    pytest.importorskip("qdrant_client")
+    _, fake = make_manager(MEMORY_VECTOR_QUANTIZATION="int8")
+    client = fake.vector_store.client
+    assert [field for _, field, _ in client.payload_indexes] == ["user_id", "category", PAYLOAD_TIMESTAMP_FIELD]
+    assert len(client.collection_updates) == 1
+
+
+def test_collection_tuning_skips_quantization_by_default(make_manager):
+    pytest.importorskip("qdrant_client")
+    _, fake = make_manager(MEMORY_VECTOR_QUANTIZATION="")
+    assert fake.vector_store.client.collection_updates == []
+
+
+def _seeded(make_manager, **env):
+    manager, fake = make_manager(**env)
+    manager.add_narrative_memory("u1", "天网项目延期，陈总很不满")
+    manager.add_narrative_memory("u1", "周五部门团建")
+    return manager, fake
+
+
+def test_lexical_prefilter_skips_vector_search_when_coverage_is_high(make_manager):
+    manager, fake = _seeded(make_manager)
+    results = manager._search("天网项目", "u1", category="narrative")
+    assert results[0]["memory"] == "天网项目延期，陈总很不满"
+    assert fake.searches == []
+
+
+def test_weak_lexical_hits_fall_back_to_vector_search_and_fuse(make_manager):
+    manager, fake = _seeded(make_manager)
+    results = manager._search("天网 预算审批流程", "u1", category="narrative")
+    assert fake.searches == ["天网 预算审批流程"]
+    # RRF 融合：两路都命中的记忆排在前面
+    assert results[0]["memory"] == "天网项目延期，陈总很不满"
+    assert len(results) == 2
+
+
+def test_disabled_prefilter_always_uses_vector_search(make_manager):
+    manager, fake = _seeded(make_manager, MEMORY_LEXICAL_PREFILTER="0")
+    manager._search("天网项目", "u1", category="narrative")
+    assert fake.searches == ["天网项目"]
+
+
+def test_search_cache_hits_until_add_or_delete(make_manager):
+    manager, fake = _seeded(make_manager, MEMORY_LEXICAL_PREFILTER="0")
+    manager._search("团建", "u1")
+    manager._search(" 团建 ", "u1")
+    assert fake.searches == ["团建"]
+
+    manager.add_narrative_memory("u1", "下周团建改期")
+    assert len(manager._search("团建", "u1")) == 3
+    memory_id = next(iter(fake.items))
+    manager.delete_memory(memory_id, user_id="u1")
+    assert len(manager._search("团建", "u1")) == 2
+    manager.delete_all_memories("u1")
+    assert manager._search("团建", "u1") == []
+    assert len(fake.searches) == 4
+
+
+def test_delete_without_known_scope_invalidates_every_user(make_manager):
+    manager, fake = make_manager(MEMORY_LEXICAL_PREFILTER="0")
+    manager.add_narrative_memory("u1", "甲")
+    manager.add_narrative_memory("u2", "乙")
+    manager._search("q", "u1")
+    manager._search("q", "u2")
+    manager.delete_memory("m1")
+    assert manager._search("q", "u1") == []
+    manager._search("q", "u2")
+    assert len(fake.searches) == 4
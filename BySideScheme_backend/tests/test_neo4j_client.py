@@ -0,0 +1,66 @@
+import threading
+
+from src.core.neo4j_client import Neo4jClient
+
+
+class FakeTx:
+    def run(self, cypher, params):
+        return self
+
+    def data(self):
+        return [{"ok": 1}]
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        self.driver.opened += 1
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, fn):
+        return fn(FakeTx())
+
+    execute_read = execute_write
+
+
+class FakeDriver:
+    def __init__(self):
+        self.opened = 0
+
+    def session(self, database=None):
+        return FakeSession(self)
+
+
+def _client():
+    # 绕过单例与真实连接，只测试会话管理
+    client = object.__new__(Neo4jClient)
+    client._driver = FakeDriver()
+    client._database = "neo4j"
+    client._local = threading.local()
+    return client
+
+
+def test_calls_outside_a_scope_open_their_own_session():
+    client = _client()
+    client.run_write("RETURN 1")
+    client.run_query("RETURN 1")
+    assert client._driver.opened == 2
+
+
+def test_session_scope_reuses_one_session_per_thread():
+    client = _client()
+    with client.session_scope():
+        with client.session_scope():
+            client.run_write("RETURN 1")
+        client.run_batch([("RETURN 1", None), ("RETURN 2", None)])
+        other = threading.Thread(target=client.run_query, args=("RETURN 1",))
+        other.start()
+        other.join()
+    assert client._driver.opened == 2  # 作用域一个 + 其它线程一个
+    client.run_write("RETURN 1")
+    assert client._driver.opened == 3
@@ -0,0 +1,30 @@
+from src.core.text_chunker import chunk_text, split_sentences
+
+
+def test_split_sentences_round_trips_the_text():
+    text = "陈总说：“下周上线。”李工没回应！Then he left. 完"
+    sentences = split_sentences(text)
+    assert "".join(sentences) == text
+    assert sentences[0] == "陈总说：“下周上线。”"
+
+
+def test_short_text_is_a_single_chunk():
+    assert chunk_text("  一句话。 ") == ["一句话。"]
+    assert chunk_text("   ") == []
+
+
+def test_chunks_respect_limit_and_overlap_on_sentence_boundaries():
+    sentences = [f"第{i}句话内容。" for i in range(40)]
+    chunks = chunk_text("".join(sentences), max_chars=60, overlap_chars=20)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # 下一块以上一块末尾不超过 overlap_chars 的完整句子开头
+        first = split_sentences(chunk)[0]
+        assert first in previous[-20:]
+    assert all(sentence in "".join(chunks) for sentence in sentences)
+
+
+def test_overlong_sentence_is_hard_split():
+    chunks = chunk_text("字" * 250, max_chars=100, overlap_chars=0)
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
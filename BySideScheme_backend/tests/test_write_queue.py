@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from src.core.write_queue import KeyedWriteQueue
+
+
+def test_submit_returns_item_result():
+    queue = KeyedWriteQueue(lambda key, items: [f"{key}:{item}" for item in items])
+    assert queue.submit("u1", "a") == "u1:a"
+    assert queue.stats()["pending"] == 0
+
+
+def test_concurrent_writes_are_coalesced_in_arrival_order():
+    started, release = threading.Event(), threading.Event()
+    batches = []
+
+    def apply(key, items):
+        batches.append(list(items))
+        if items == ["first"]:
+            started.set()
+            release.wait(5)
+        return [item.upper() for item in items]
+
+    queue = KeyedWriteQueue(apply, max_batch=10)
+    results = {}
+
+    def _submit(item):
+        results[item] = queue.submit("u1", item)
+
+    leader = threading.Thread(target=_submit, args=("first",))
+    leader.start()
+    assert started.wait(5)
+    followers = []
+    for item in ("a", "b", "c"):
+        thread = threading.Thread(target=_submit, args=(item,))
+        thread.start()
+        followers.append(thread)
+        # 保证到达顺序确定
+        while queue.stats()["pending"] < len(followers):
+            time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert batches == [["first"], ["a", "b", "c"]]
+    assert results == {"first": "FIRST", "a": "A", "b": "B", "c": "C"}
+    stats = queue.stats()
+    assert (stats["submitted"], stats["batches"], stats["coalesced"], stats["largest_batch"]) == (4, 2, 2, 3)
+
+
+def test_different_keys_do_not_block_each_other():
+    blocked, release = threading.Event(), threading.Event()
+
+    def apply(key, items):
+        if key == "slow":
+            blocked.set()
+            release.wait(5)
+        return items
+
+    queue = KeyedWriteQueue(apply)
+    thread = threading.Thread(target=queue.submit, args=("slow", 1))
+    thread.start()
+    assert blocked.wait(5)
+    assert queue.submit("fast", 2) == 2
+    release.set()
+    thread.join(5)
+
+
+def test_max_batch_splits_pending_items():
+    queue = KeyedWriteQueue(lambda key, items: [len(items)] * len(items), max_batch=2)
+    assert queue.submit_many("u1", [1, 2, 3, 4, 5]) == [2, 2, 2, 2, 1]
+
+
+def test_item_exception_only_fails_its_caller():
+    def apply(key, items):
+        return [ValueError(item) if item == "bad" else item for item in items]
+
+    queue = KeyedWriteQueue(apply)
+    results = queue.submit_many("u1", ["ok", "bad", "ok2"])
+    assert results[0] == "ok" and results[2] == "ok2"
+    assert isinstance(results[1], ValueError)
+    with pytest.raises(ValueError):
+        queue.submit("u1", "bad")
+
+
+def test_batch_exception_fails_every_item_and_queue_recovers():
+    calls = []
+
+    def apply(key, items):
+        calls.append(items)
+        if len(calls) == 1:
+            raise RuntimeError("store down")
+        return items
+
+    queue = KeyedWriteQueue(apply)
+    assert all(isinstance(r, RuntimeError) for r in queue.submit_many("u1", [1, 2]))
+    assert queue.stats()["failed_batches"] == 1
+    assert queue.submit("u1", 3) == 3
+
+
+def test_leader_returns_once_its_own_batch_is_done():
+    """先到达的调用方执行完自己的批次即返回，后续到达的写入由其它调用方执行。"""
+    gates = {"first": threading.Event(), "later": threading.Event()}
+    entered = {"first": threading.Event(), "later": threading.Event()}
+
+    def apply(key, items):
+        for item in items:
+            entered[item].set()
+            gates[item].wait(5)
+        return items
+
+    queue = KeyedWriteQueue(apply)
+    leader = threading.Thread(target=queue.submit, args=("u1", "first"))
+    leader.start()
+    assert entered["first"].wait(5)
+    follower = threading.Thread(target=queue.submit, args=("u1", "later"))
+    follower.start()
+    while queue.stats()["pending"] < 1:
+        time.sleep(0.001)
+    gates["first"].set()
+    assert entered["later"].wait(5)
+    leader.join(5)
+    assert not leader.is_alive()
+    assert follower.is_alive()
+    gates["later"].set()
+    follower.join(5)
+    assert queue.stats()["pending"] == 0
+
+
+def test_reentrant_submit_for_same_key_raises_instead_of_deadlocking():
+    queue = None
+
+    def apply(key, items):
+        if items == ["outer"]:
+            with pytest.raises(RuntimeError):
+                queue.submit(key, "inner")
+            return [queue.submit("other", "nested")]
+        return items
+
+    queue = KeyedWriteQueue(apply)
+    assert queue.submit("u1", "outer") == "nested"
@@ -1,9 +1,19 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import { X, User, Calendar, Briefcase, Box, Building } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
-import { GraphNode, GraphEdge } from '../types';
+import { GraphNode, GraphEdge, EvidenceItem } from '../types';
+import { getEdgeEvidence } from '../services/api';
+
+const EVIDENCE_PAGE_SIZE = 20;
+
+interface EvidenceState {
+  items: EvidenceItem[];
+  total: number;
+  loading: boolean;
+}
 
 interface EntityDetailPanelProps {
+  userId: string;
   entity: GraphNode | null;
   edges: GraphEdge[];
   allNodes: GraphNode[];
@@ -26,14 +36,53 @@ const SENTIMENT_LABELS: Record<string, { text: string; color: string }> = {
 };
 
 const EntityDetailPanel: React.FC<EntityDetailPanelProps> = ({
+  userId,
   entity,
   edges,
   allNodes,
   onClose,
   onNavigate,
 }) => {
+  // 展开的关系 id -> 已加载的证据历史（按需分页获取）
+  const [evidence, setEvidence] = useState<Record<string, EvidenceState>>({});
+
+  useEffect(() => {
+    setEvidence({});
+  }, [entity?.id]);
+
   if (!entity) return null;
 
+  const loadEvidence = async (edgeId: string) => {
+    const current = evidence[edgeId];
+    const offset = current ? current.items.length : 0;
+    setEvidence((prev) => ({
+      ...prev,
+      [edgeId]: { items: current?.items || [], total: current?.total || 0, loading: true },
+    }));
+    try {
+      const page = await getEdgeEvidence(userId, edgeId, offset, EVIDENCE_PAGE_SIZE);
+      setEvidence((prev) => ({
+        ...prev,
+        [edgeId]: { items: [...(prev[edgeId]?.items || []), ...page.items], total: page.total, loading: false },
+      }));
+    } catch (error) {
+      console.error('Failed to load evidence:', error);
+      setEvidence((prev) => ({ ...prev, [edgeId]: { ...prev[edgeId], loading: false } }));
+    }
+  };
+
+  const toggleEvidence = (edgeId: string) => {
+    if (evidence[edgeId]) {
+      setEvidence((prev) => {
+        const next = { ...prev };
+        delete next[edgeId];
+        return next;
+      });
+    } else {
+      loadEvidence(edgeId);
+    }
+  };
+
   const config = NODE_TYPE_CONFIG[entity.type] || NODE_TYPE_CONFIG.Person;
   const Icon = config.icon;
 
@@ -161,11 +210,46 @@ const EntityDetailPanel: React.FC<EntityDetailPanelProps> = ({
                         <span>强度: {(edge.weight * 100).toFixed(0)}%</span>
                         <span>信心: {(edge.confidence * 100).toFixed(0)}%</span>
                       </div>
-                      {edge.evidence && edge.evidence.length > 0 && edge.evidence[0] && (
+                      {edge.evidence && edge.evidence.length > 0 && edge.evidence[edge.evidence.length - 1] && (
                         <p className="text-xs text-gray-600 mt-1.5 italic truncate">
-                          "{edge.evidence[0]}"
+                          "{edge.evidence[edge.evidence.length - 1]}"
                         </p>
                       )}
+                      {edge.id && (edge.evidence_count ?? edge.evidence.length) > 0 && (
+                        <button
+                          className="text-xs text-primary/70 hover:text-primary mt-1"
+                          onClick={(e) => {
+                            e.stopPropagation();
+                            toggleEvidence(edge.id!);
+                          }}
+                        >
+                          {evidence[edge.id] ? '收起证据' : `全部证据 (${edge.evidence_count ?? edge.evidence.length})`}
+                        </button>
+                      )}
+                      {edge.id && evidence[edge.id] && (
+                        <div className="mt-1.5 space-y-1" onClick={(e) => e.stopPropagation()}>
+                          {evidence[edge.id].items.map((item, i) => (
+                            <div key={i} className="text-xs text-gray-400 border-l border-white/10 pl-2">
+                              <p className="italic">"{item.text}"</p>
+                              {item.created_at && (
+                                <p className="text-gray-600">{new Date(item.created_at).toLocaleString('zh-CN')}</p>
+                              )}
+                            </div>
+                          ))}
+                          {evidence[edge.id].loading ? (
+                            <p className="text-xs text-gray-600">加载中...</p>
+                          ) : (
+                            evidence[edge.id].items.length < evidence[edge.id].total && (
+                              <button
+                                className="text-xs text-primary/70 hover:text-primary"
+                                onClick={() => loadEvidence(edge.id!)}
+                              >
+                                加载更多
+                              </button>
+                            )
+                          )}
+                        </div>
+                      )}
                     </div>
                   );
                 })}
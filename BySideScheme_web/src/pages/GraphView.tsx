@@ -463,7 +463,12 @@ const GraphView: React.FC = () => {
                     onClick={() => handleNavigateToEntity(p.name)}
                   >
                     <span>{p.name}</span>
-                    <span className="text-gray-500">连接度 {p.centrality}</span>
+                    <span
+                      className={p.influence < 0 ? 'text-red-400' : 'text-gray-500'}
+                      title={`PageRank ${p.pagerank} · 介数 ${p.betweenness} · 影响力 ${p.influence} · 连接度 ${p.degree}`}
+                    >
+                      重要度 {p.centrality.toFixed(2)}
+                    </span>
                   </div>
                 ))
               ) : (
@@ -547,6 +552,7 @@ const GraphView: React.FC = () => {
         {/* Entity Detail Panel */}
         {selectedEntity && graphData && (
           <EntityDetailPanel
+            userId={userId}
             entity={selectedEntity}
             edges={edgesForPanel}
             allNodes={graphData.nodes}
@@ -136,20 +136,73 @@ export const rollbackPersona = async (userId: string, personName: string, versio
 // Graph API
 import {
   GraphData,
+  GraphDelta,
+  EntityNeighborhood,
+  EdgeEvidencePage,
   GraphChange,
   GraphInsights,
   GraphExtractRequest,
   GraphExtractResponse,
 } from '../types';
 
+// 按用户缓存最近一次同步的图谱，刷新时只拉取增量（版本未变时后端返回 304）
+const graphCache = new Map<string, GraphData>();
+
+const edgeKey = (e: { source: string; type: string; target: string }) => `${e.source}|${e.type}|${e.target}`;
+
+const applyGraphDelta = (base: GraphData, delta: GraphDelta): GraphData => {
+  const removed = new Set(delta.removed_nodes);
+  const nodes = new Map(base.nodes.filter((n) => !removed.has(n.id)).map((n) => [n.id, n]));
+  delta.nodes.forEach((n) => nodes.set(n.id, n));
+
+  const edges = new Map(
+    base.edges
+      .filter((e) => !removed.has(e.source) && !removed.has(e.target))
+      .map((e) => [edgeKey(e), e])
+  );
+  delta.edges.forEach((e) => edges.set(edgeKey(e), e));
+
+  return { version: delta.version, nodes: Array.from(nodes.values()), edges: Array.from(edges.values()) };
+};
+
 export const getGraph = async (userId: string) => {
-  const response = await api.get<GraphData>(`/graph/${userId}`);
+  const cached = graphCache.get(userId);
+  if (!cached || cached.version === undefined) {
+    const response = await api.get<GraphData>(`/graph/${userId}`);
+    graphCache.set(userId, response.data);
+    return response.data;
+  }
+
+  const response = await api.get<GraphDelta>(`/graph/${userId}`, {
+    params: { since: cached.version },
+    headers: { 'If-None-Match': `"${cached.version}"` },
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+  if (response.status === 304) {
+    return cached;
+  }
+  const data = response.data.reset
+    ? { version: response.data.version, nodes: response.data.nodes, edges: response.data.edges }
+    : applyGraphDelta(cached, response.data);
+  graphCache.set(userId, data);
+  return data;
+};
+
+export const getEntityDetail = async (
+  userId: string,
+  entityName: string,
+  depth: number = 2,
+  limits: { max_nodes?: number; max_edges?: number } = {}
+) => {
+  const response = await api.get<EntityNeighborhood>(`/graph/${userId}/entity/${encodeURIComponent(entityName)}`, {
+    params: { depth, ...limits },
+  });
   return response.data;
 };
 
-export const getEntityDetail = async (userId: string, entityName: string, depth: number = 2) => {
-  const response = await api.get<GraphData>(`/graph/${userId}/entity/${encodeURIComponent(entityName)}`, {
-    params: { depth },
+export const getEdgeEvidence = async (userId: string, edgeId: string, offset: number = 0, limit: number = 20) => {
+  const response = await api.get<EdgeEvidencePage>(`/graph/${userId}/edge/${edgeId}/evidence`, {
+    params: { offset, limit },
   });
   return response.data;
 };
@@ -172,6 +225,7 @@ export const getGraphInsights = async (userId: string) => {
 };
 
 export const clearGraph = async (userId: string) => {
+  graphCache.delete(userId);
   const response = await api.delete(`/graph/${userId}`);
   return response.data;
 };
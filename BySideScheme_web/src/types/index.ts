@@ -221,21 +221,51 @@ export interface GraphNode {
 }
 
 export interface GraphEdge {
+  id?: string;
   source: string;
   target: string;
   type: string;
   weight: number;
   sentiment: 'positive' | 'negative' | 'neutral';
   confidence: number;
-  evidence: string[];
+  evidence: string[]; // 最近几条证据
+  evidence_count?: number; // 证据总数
+}
+
+export interface EvidenceItem {
+  text: string;
+  created_at: string;
+}
+
+export interface EdgeEvidencePage {
+  edge_id: string;
+  total: number;
+  offset: number;
+  limit: number;
+  items: EvidenceItem[];
 }
 
 export interface GraphData {
+  version?: number;
   nodes: GraphNode[];
   edges: GraphEdge[];
 }
 
+export interface EntityNeighborhood {
+  nodes: GraphNode[];
+  edges: GraphEdge[];
+  depth: number; // 实际使用的跳数（受服务端上限约束）
+  truncated: boolean; // 达到节点/关系上限，子图不完整
+}
+
+export interface GraphDelta extends GraphData {
+  since: number;
+  reset: boolean;
+  removed_nodes: string[];
+}
+
 export interface GraphChange {
+  seq: number;
   change_type: string;
   description: string;
   timestamp: string;
@@ -243,7 +273,11 @@ export interface GraphChange {
 
 export interface KeyPlayer {
   name: string;
-  centrality: number;
+  centrality: number; // PageRank 相对值，排名第一为 1
+  pagerank: number;
+  betweenness: number;
+  influence: number; // 带符号影响力 [-1, 1]
+  degree: number;
 }
 
 export interface GraphInsights {
@@ -263,4 +297,6 @@ export interface GraphExtractResponse {
     entities: { name: string; type: string; properties: Record<string, any> }[];
     relations: { source: string; target: string; type: string; properties: Record<string, any> }[];
   };
+  chunks?: number;
+  elapsed?: number;
 }